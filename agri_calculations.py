@@ -3,9 +3,11 @@ Modulo Calcoli Agricoli - Parametri agrivoltaico (microclima rimosso)
 Analizza l'impatto dei pannelli FV sulle colture sottostanti tramite DLI
 """
 # sito enea per DLI mensile italiano: https://www.solaritaly.enea.it/DLI/DLIMappeEn.php#:~:text=Maps%20of%20Daily%20Light%20Integral%20in%20Italy.,moles%20per%20square%20meter%20per%20day:%20mol/(m%C2%B2%C2%B7d).
+import numpy as np
 import pandas as pd
-import math
 from config import HECTARE_M2
+from results import AgriResults, time_step_hours
+from calculations import is_tracker
 
 # ==================== COSTANTI AGRONOMICHE ====================
 
@@ -39,68 +41,61 @@ DLI_REQUIREMENTS = {
 def calculate_shadow_projection(lato_maggiore: float, lato_minore: float,
                                 tilt: float, azimuth_panel: float,
                                 sun_elevation: pd.Series, sun_azimuth: pd.Series,
-                                altezza_suolo: float) -> pd.DataFrame:
-
-    tilt_rad = math.radians(tilt)
-    area_pannello = lato_maggiore * lato_minore
-    H = altezza_suolo + lato_minore * math.sin(tilt_rad)
-
-    shadow_length, shadow_width, shadow_area = [], [], []
-
-    for elev, azim in zip(sun_elevation, sun_azimuth):
-        if elev <= 0:
-            shadow_length.append(0)
-            shadow_width.append(0)
-            shadow_area.append(0)
-            continue
+                                altezza_suolo: float) -> dict:
+    """
+    Lunghezza, larghezza e area dell'ombra di un pannello per ogni istante.
 
-        elev_rad = math.radians(elev)
-        delta_azimuth = abs(azim - azimuth_panel)
-        if delta_azimuth > 180:
-            delta_azimuth = 360 - delta_azimuth
+    Vettorizzata con broadcasting numpy: dict di array (n_tempi,) con
+    serie 1-D, o di matrici (n_scenari, n_tempi) passando parametri come
+    array colonna (n_scenari, 1).
+    """
+    elev = np.asarray(sun_elevation, dtype=float)
+    tilt_rad = np.radians(np.asarray(tilt, dtype=float))
+    area_pannello = np.asarray(lato_maggiore, dtype=float) * lato_minore
+    H = altezza_suolo + lato_minore * np.sin(tilt_rad)
 
-        L_shadow = H / math.tan(elev_rad)
-        W_shadow = (area_pannello * math.cos(tilt_rad)) / max(L_shadow, 1e-6)
-        W_shadow *= abs(math.cos(math.radians(delta_azimuth)))
-        A_shadow = L_shadow * W_shadow
+    delta_azimuth = np.abs(np.asarray(sun_azimuth, dtype=float) - azimuth_panel)
+    delta_azimuth = np.where(delta_azimuth > 180, 360 - delta_azimuth, delta_azimuth)
 
-        shadow_length.append(L_shadow)
-        shadow_width.append(W_shadow)
-        shadow_area.append(A_shadow)
+    sun_up = elev > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        L_shadow = np.where(sun_up, H / np.tan(np.radians(elev)), 0.0)
+        W_shadow = (area_pannello * np.cos(tilt_rad)) / np.maximum(L_shadow, 1e-6)
+        W_shadow = np.where(sun_up, W_shadow * np.abs(np.cos(np.radians(delta_azimuth))), 0.0)
+    A_shadow = L_shadow * W_shadow
 
-    return pd.DataFrame({
-        'shadow_length_m': shadow_length,
-        'shadow_width_m': shadow_width,
-        'shadow_area_m2': shadow_area
-    }, index=sun_elevation.index)
+    return {
+        'shadow_length_m': L_shadow,
+        'shadow_width_m': W_shadow,
+        'shadow_area_m2': A_shadow
+    }
 
 
-def calculate_shaded_fraction(shadow_df: pd.DataFrame, num_panels: int, superficie_campo: float, pitch: float) -> pd.Series:
+def calculate_shaded_fraction(shadow: dict, num_panels: int, superficie_campo: float, pitch: float) -> np.ndarray:
+    """
+    Frazione del campo in ombra (vettorizzata sugli array di
+    calculate_shadow_projection, stessa forma in uscita)
+    """
+    L_shadow = np.asarray(shadow['shadow_length_m'], dtype=float)
+    A_shadow = np.asarray(shadow['shadow_area_m2'], dtype=float)
 
-    effective_shadow_area = []
+    # Riduzione proporzionale per sovrapposizione quando l'ombra supera il pitch
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overlap_factor = np.where((L_shadow <= pitch) | (L_shadow == 0), 1.0, pitch / L_shadow)
+    effective_shadow_area = A_shadow * num_panels * overlap_factor
 
-    for L_shadow, A_shadow in zip(shadow_df['shadow_length_m'], shadow_df['shadow_area_m2']):
-        if L_shadow <= pitch or L_shadow == 0:
-            # Nessuna sovrapposizione
-            A_eff = A_shadow * num_panels
-        else:
-            # Riduzione proporzionale per sovrapposizione
-            overlap_factor = pitch / L_shadow
-            A_eff = A_shadow * num_panels * overlap_factor
-        
-        effective_shadow_area.append(A_eff)
-    
-    shaded_fraction = pd.Series(effective_shadow_area, index=shadow_df.index) / superficie_campo
-    return shaded_fraction.clip(upper=1.0)
+    return np.minimum(effective_shadow_area / superficie_campo, 1.0)
 
 
 # ==================== DLI ====================
 
-def calculate_dli(ghi: pd.Series, shaded_fraction: pd.Series,
-                  transmission_under: float = TRANSMISSION_COEFF["under_panel"]) -> pd.Series:
+def calculate_par_contributions(ghi: pd.Series, shaded_fraction: pd.Series,
+                                transmission_under: float = TRANSMISSION_COEFF["under_panel"]) -> pd.Series:
     """
-    Calcola il DLI giornaliero in mol/m²/d considerando la frazione di ombra
+    PAR ricevuto in ogni passo temporale [mol/m²] considerando la frazione di ombra
     """
+    step_hours = time_step_hours(ghi.index)
+
     # PAR disponibile
     par_total = ghi * PAR_FRACTION
     par_weighted = par_total * (shaded_fraction * transmission_under + (1 - shaded_fraction) * 1.0)
@@ -108,25 +103,61 @@ def calculate_dli(ghi: pd.Series, shaded_fraction: pd.Series,
     # Conversione da W/m² a µmol/m²/s: fattore medio 4.6
     par_umol = par_weighted * 4.6
 
-    # DLI giornaliero (µmol/m²/s → mol/m²/d)
-    dli_mol = (par_umol.sum() * 3600) / 1e6
+    # µmol/m²/s integrati sul passo → mol/m²
+    return par_umol * 3600 * step_hours / 1e6
+
+
+def calculate_dli(ghi: pd.Series, shaded_fraction: pd.Series,
+                  transmission_under: float = TRANSMISSION_COEFF["under_panel"]) -> float:
+    """
+    Calcola il DLI giornaliero in mol/m²/d considerando la frazione di ombra
+    (su periodi di più giorni: media dei giorni simulati)
+    """
+    par_mol = calculate_par_contributions(ghi, shaded_fraction, transmission_under)
+    n_days = max(len(ghi) * time_step_hours(ghi.index) / 24, 1.0)
+
+    # DLI giornaliero (mol/m²/d)
+    dli_mol = par_mol.sum() / n_days
 
     return dli_mol
 
+# Classi di idoneità: (soglia % del DLI ottimale, stato, colore), dalla migliore
+SUITABILITY_LEVELS = (
+    (100, "Ottimale", "green"),
+    (80, "Adeguato", "orange"),
+    (60, "Marginale", "darkorange"),
+    (-np.inf, "Insufficiente", "red"),
+)
+
+
+def crop_requirement(crop_name: str):
+    """Requisiti DLI della coltura (None se non presente in DLI_REQUIREMENTS)"""
+    for crops in DLI_REQUIREMENTS.values():
+        if crop_name in crops:
+            return crops[crop_name]
+    return None
+
+
+def suitability_level(percentage):
+    """Indice in SUITABILITY_LEVELS per percentuali del DLI ottimale (scalari o array)"""
+    thresholds = np.array([level[0] for level in SUITABILITY_LEVELS[:-1]])
+    return np.sum(~(np.asarray(percentage, dtype=float)[..., None] >= thresholds), axis=-1)
+
+
 def evaluate_crop_suitability(dli_value: float, crop_name: str) -> dict:
     """
     Valuta lo stato della coltura in base al DLI giornaliero
+
+    Nessun output a schermo: l'eventuale avviso (coltura sconosciuta) è in
+    "warning" e viene mostrato in visualizzazione, anche quando il risultato
+    arriva da una cache.
     """
     # Recupero requisiti coltura
-    requirement_data = None
-    for category, crops in DLI_REQUIREMENTS.items():
-        if crop_name in crops:
-            requirement_data = crops[crop_name]
-            break
+    requirement_data = crop_requirement(crop_name)
 
+    warning = None
     if requirement_data is None:
-        import streamlit as st
-        st.warning(f"⚠️ Crop '{crop_name}' non trovato in DLI_REQUIREMENTS. Uso valori di default.")
+        warning = f"⚠️ Crop '{crop_name}' non trovato in DLI_REQUIREMENTS. Uso valori di default."
         DLI_min, DLI_opt = 80, 100
         unit = "mol/m²/d"
     else:
@@ -136,14 +167,7 @@ def evaluate_crop_suitability(dli_value: float, crop_name: str) -> dict:
 
     # Stato coltura
     percentage = (dli_value / DLI_opt) * 100
-    if percentage >= 100:
-        status, color = "Ottimale", "green"
-    elif percentage >= 80:
-        status, color = "Adeguato", "orange"
-    elif percentage >= 60:
-        status, color = "Marginale", "darkorange"
-    else:
-        status, color = "Insufficiente", "red"
+    _, status, color = SUITABILITY_LEVELS[int(suitability_level(percentage))]
 
     return {
         "DLI": dli_value,
@@ -152,53 +176,86 @@ def evaluate_crop_suitability(dli_value: float, crop_name: str) -> dict:
         "color": color,
         "DLI_min": DLI_min,
         "DLI_opt": DLI_opt,
-        "unit": unit
+        "unit": unit,
+        "warning": warning
     }
 
 # ==================== FUNZIONE PRINCIPALE ====================
 
-def calculate_all_agri(params: dict, pv_results: dict) -> dict:
+def calculate_agri_shading(params: dict, solpos: pd.DataFrame, orientation: pd.DataFrame = None) -> tuple:
+    """
+    Calcola proiezione d'ombra e frazione ombreggiata del campo
+    (con inseguitore: tilt e azimut della superficie per istante da orientation)
 
-    ghi = pv_results['GHI_Wm2']
+    Returns:
+        (DataFrame ombre, Serie frazione ombreggiata)
+    """
     superficie_campo = params['hectares'] * HECTARE_M2
-    solpos = pv_results["solpos"]
 
-    shadow_df = calculate_shadow_projection(
+    shadow = calculate_shadow_projection(
         lato_maggiore=params['lato_maggiore'],
         lato_minore=params['lato_minore'],
-        tilt=params['tilt_pannello'],
-        azimuth_panel=params['azimuth_pannello'],
+        tilt=params['tilt_pannello'] if orientation is None else orientation['surface_tilt'].to_numpy(),
+        azimuth_panel=params['azimuth_pannello'] if orientation is None else orientation['surface_azimuth'].to_numpy(),
         sun_elevation=solpos['elevation'],
         sun_azimuth=solpos['azimuth'],
         altezza_suolo=params['altezza_suolo']
     )
 
     shaded_fraction = calculate_shaded_fraction(
-        shadow_df, 
-        params['num_panels_total'], 
+        shadow,
+        params['num_panels_total'],
         superficie_campo,
         params.get('pitch_laterale', 1.0)  # usa il pitch definito nel sidebar
     )
 
-    # Calcolo DLI giornaliero
-    dli_value = calculate_dli(ghi, shaded_fraction)
+    return pd.DataFrame(shadow, index=solpos.index), pd.Series(shaded_fraction, index=solpos.index)
 
-    # Valutazione coltura
-    crop_eval = evaluate_crop_suitability(dli_value, params.get("crops", "Cereali"))
 
-    return {
-        "times": pv_results['times'],
+def assemble_agri_results(times: pd.DatetimeIndex, shadow_df: pd.DataFrame,
+                          shaded_fraction: pd.Series, crop_eval: dict) -> AgriResults:
+    """Assembla i risultati agronomici nel contenitore compatto"""
+    series = {
         "shaded_fraction": shaded_fraction,
         "shadow_length_m": shadow_df['shadow_length_m'],
         "shadow_area_m2": shadow_df['shadow_area_m2'],
-        "shaded_fraction_avg": shaded_fraction.mean(),
-        "shadow_area_max_m2": shadow_df['shadow_area_m2'].max(),
-        "shadow_length_max_m": shadow_df['shadow_length_m'].max(),
-        "DLI_mol_m2_day": crop_eval["DLI"],
-        "crop_status": crop_eval["status"],
-        "crop_status_color": crop_eval["color"],
-        "crop_light_adequacy_pct": crop_eval["percentage"],
-        "DLI_min": crop_eval["DLI_min"],
-        "DLI_opt": crop_eval["DLI_opt"],
-        "unit": crop_eval["unit"]
     }
+    return AgriResults(
+        times, series,
+        DLI_mol_m2_day=crop_eval["DLI"],
+        crop_status=crop_eval["status"],
+        crop_status_color=crop_eval["color"],
+        crop_light_adequacy_pct=crop_eval["percentage"],
+        DLI_min=crop_eval["DLI_min"],
+        DLI_opt=crop_eval["DLI_opt"],
+        unit=crop_eval["unit"],
+        crop_warning=crop_eval.get("warning")
+    )
+
+
+def calculate_all_agri(params: dict, pv_results, orientation: pd.DataFrame = None) -> AgriResults:
+    """
+    Risultati agronomici da risultati PV già calcolati
+
+    Args:
+        orientation: orientamento dei moduli usato per i risultati PV (output
+            della fase "orientation" della pipeline), necessario per l'inseguitore:
+            non viene ricalcolato qui insieme alla posizione solare
+
+    Raises:
+        ValueError: inseguitore senza orientamento
+    """
+    if is_tracker(params) and orientation is None:
+        raise ValueError("Inseguitore: serve l'orientamento della fase 'orientation' (Pipeline.run_stages)")
+
+    ghi = pv_results['GHI_Wm2']
+
+    shadow_df, shaded_fraction = calculate_agri_shading(params, pv_results["solpos"], orientation)
+
+    # Calcolo DLI giornaliero
+    dli_value = calculate_dli(ghi, shaded_fraction)
+
+    # Valutazione coltura
+    crop_eval = evaluate_crop_suitability(dli_value, params.get("crops", "Cereali"))
+
+    return assemble_agri_results(pv_results['times'], shadow_df, shaded_fraction, crop_eval)
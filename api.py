@@ -0,0 +1,168 @@
+"""
+Modulo API - Simulazione senza interfaccia Streamlit
+Converte richieste JSON in parametri completi (stesse chiavi della
+sidebar), esegue la pipeline e restituisce risultati serializzabili.
+Usato dal servizio HTTP (server.py) e utilizzabile da script esterni.
+"""
+
+from datetime import date
+
+from config import DEFAULT_PARAMS, TIMEZONE_OBJ, TEMPERATURE_MODELS, HECTARE_M2
+from agri_calculations import DLI_REQUIREMENTS
+from layout import parse_field_geojson, field_area_m2
+from pipeline import Pipeline, run_cached
+
+
+# ==================== PARAMETRI ====================
+
+# Nome nella richiesta -> nome interno (dove diverso)
+PARAM_ALIASES = {
+    "tilt": "tilt_pannello",
+    "azimuth": "azimuth_pannello",
+}
+
+NUMERIC_PARAMS = (
+    "lat", "lon", "num_panels_per_row", "num_rows", "lato_minore", "lato_maggiore",
+    "carreggiata", "pitch_laterale", "altezza_suolo", "tilt_pannello", "azimuth_pannello",
+    "eff", "noct", "temp_coeff", "losses", "albedo", "hectares", "setback",
+    "risoluzione_min", "wind_speed", "thermal_tau_min",
+    "max_angle", "steer_window_h", "steer_fraction",
+)
+
+CROPS = {crop for crops in DLI_REQUIREMENTS.values() for crop in crops}
+
+
+def build_params(payload: dict) -> dict:
+    """
+    Parametri completi di simulazione da una richiesta JSON
+    (valori mancanti dai DEFAULT_PARAMS, derivati come nella sidebar)
+
+    Raises:
+        ValueError: parametro sconosciuto o non valido
+    """
+    params = {PARAM_ALIASES.get(k, k): v for k, v in DEFAULT_PARAMS.items()}
+    params.update({"altezza_suolo": 1.0, "crops": "Cereali", "data": date.today().isoformat()})
+
+    for key, value in payload.items():
+        name = PARAM_ALIASES.get(key, key)
+        if name not in params and name not in ("field_polygon", "num_panels_total"):
+            raise ValueError(f"Parametro sconosciuto: '{key}'")
+        params[name] = value
+
+    for name in NUMERIC_PARAMS:
+        try:
+            params[name] = float(params[name])
+        except (TypeError, ValueError):
+            raise ValueError(f"Parametro '{name}' non numerico: {params[name]!r}")
+
+    try:
+        params["data"] = date.fromisoformat(str(params["data"]))
+    except ValueError:
+        raise ValueError(f"Data non valida (atteso AAAA-MM-GG): {params['data']!r}")
+
+    if params["periodo"] not in ("Giorno", "Anno"):
+        raise ValueError("periodo deve essere 'Giorno' o 'Anno'")
+    if params["risoluzione_min"] not in (60, 30, 15):
+        raise ValueError("risoluzione_min deve essere 60, 30 o 15")
+    if params["temp_model"] not in TEMPERATURE_MODELS:
+        raise ValueError(f"temp_model deve essere uno tra {list(TEMPERATURE_MODELS)}")
+    if params["mount"] not in ("Fisso", "Monoassiale"):
+        raise ValueError("mount deve essere 'Fisso' o 'Monoassiale'")
+    if params["crops"] not in CROPS:
+        raise ValueError(f"Coltura sconosciuta: '{params['crops']}'")
+    if not (-90 <= params["lat"] <= 90 and -180 <= params["lon"] <= 180):
+        raise ValueError("Coordinate fuori intervallo")
+
+    # Derivati (come nella sidebar)
+    params["num_panels_per_row"] = int(params["num_panels_per_row"])
+    params["num_rows"] = int(params["num_rows"])
+    params["backtrack"] = bool(params["backtrack"])
+    if params["mount"] == "Monoassiale":
+        params["tilt_pannello"] = 0.0  # ingombri con moduli in piano (come nella sidebar)
+    params["risoluzione_min"] = int(params["risoluzione_min"])
+    params["num_panels_total"] = int(payload.get("num_panels_total",
+                                                 params["num_panels_per_row"] * params["num_rows"]))
+    params["area_pannello"] = params["lato_maggiore"] * params["lato_minore"]
+    params["timezone"] = TIMEZONE_OBJ
+    params["location"] = None
+    params["field_polygon"] = (parse_field_geojson(params["field_polygon"])
+                               if params.get("field_polygon") else None)
+    if params["field_polygon"] is not None and "hectares" not in payload:
+        params["hectares"] = field_area_m2(params["field_polygon"]) / HECTARE_M2  # ettari dal poligono
+    return params
+
+
+# ==================== RISULTATI ====================
+
+def _json_value(value):
+    """Scalari numpy -> tipi Python nativi"""
+    return value.item() if hasattr(value, "item") else value
+
+
+def summarize(results, include_series: bool = False) -> dict:
+    """
+    Risultati serializzabili in JSON: scalari e aggregati PV e agronomici,
+    più (opzionale) le serie temporali come liste
+    """
+    agri = results["agri_results"]
+    pv_scalars = {k: v for k, v in results.scalars().items() if k != "agri_results"}
+    out = {
+        "pv": {k: _json_value(v) for k, v in pv_scalars.items()},
+        "agri": {k: _json_value(v) for k, v in agri.scalars().items()},
+    }
+    if include_series:
+        out["series"] = {
+            "times": [t.isoformat() for t in results["times"]],
+            **{name: results.values(name).tolist() for name in results.SERIES},
+            **{name: agri.values(name).tolist() for name in agri.SERIES},
+        }
+    return out
+
+
+# ==================== OPERAZIONI ====================
+
+_pipeline = None
+
+
+def get_pipeline() -> Pipeline:
+    """Pipeline del processo (fasi memorizzate tra richieste successive)"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = Pipeline()
+    return _pipeline
+
+
+def simulate(payload: dict) -> dict:
+    """Singola simulazione: {"params": {...}, "include_series": bool}"""
+    params = build_params(payload.get("params", {}))
+    results = run_cached(get_pipeline(), params)
+    return summarize(results, bool(payload.get("include_series", False)))
+
+
+def sweep(payload: dict) -> dict:
+    """
+    Variazione di un parametro: {"params": {...}, "param": nome, "values": [...]}
+    Le fasi non influenzate dal parametro vengono calcolate una sola volta.
+    """
+    if "param" not in payload or not isinstance(payload.get("values"), list):
+        raise ValueError("sweep richiede 'param' e una lista 'values'")
+    base = payload.get("params", {})
+    runs = []
+    for value in payload["values"]:
+        params = build_params({**base, payload["param"]: value})
+        runs.append({"value": value, **summarize(run_cached(get_pipeline(), params))})
+    return {"param": payload["param"], "runs": runs}
+
+
+def batch(payload: dict) -> dict:
+    """Più simulazioni indipendenti: {"runs": [{"params": {...}}, ...]}"""
+    if not isinstance(payload.get("runs"), list):
+        raise ValueError("batch richiede una lista 'runs'")
+    return {"runs": [simulate(run) for run in payload["runs"]]}
+
+
+OPERATIONS = {
+    "simulate": simulate,
+    "sweep": sweep,
+    "batch": batch,
+}
@@ -1,38 +1,77 @@
 import streamlit as st
-from config import CSS, PAGE_CONFIG
+from config import CSS, PAGE_CONFIG, PARALLEL_CONFIG
 from sidebar import sidebar_inputs
-from calculations import calculate_all_pv
+from pipeline import Pipeline, run_cached
+from cache import get_result_cache
+from scenarios import scenario_sidebar, archive_sidebar, display_scenario_comparison
 from metrics import display_metrics
+from charts import display_charts
 from maps import display_map_section
 from guida import show_pv_guide
-from agri_calculations import calculate_all_agri
+from export import display_export_section
+from uncertainty import display_uncertainty_section
+from sensitivity import display_sensitivity_section
+from tracking import display_tracker_section
+from economics import display_economics_section
+from storage import display_storage_section
 
 def setup_page():
     """Configura la pagina Streamlit e applica CSS globale"""
     st.set_page_config(**PAGE_CONFIG)
     st.markdown(CSS, unsafe_allow_html=True)
 
+def get_pipeline() -> Pipeline:
+    """Pipeline incrementale della sessione (output delle fasi memorizzati tra i rerun)"""
+    if "pipeline" not in st.session_state:
+        st.session_state["pipeline"] = Pipeline(workers=PARALLEL_CONFIG["app_workers"])
+    return st.session_state["pipeline"]
+
+def run_simulation(params: dict):
+    """
+    Risultati dalla cache condivisa tra sessioni; in caso di miss si usa
+    la pipeline incrementale della sessione
+    """
+    results = run_cached(get_pipeline(), params)
+
+    stats = get_result_cache().stats()
+    st.sidebar.caption(
+        f"Cache condivisa: {stats['entries']} scenari, "
+        f"{stats['bytes'] / 2**20:.1f}/{stats['max_bytes'] / 2**20:.0f} MB, "
+        f"hit rate {stats['hit_rate'] * 100:.0f}%, "
+        f"{stats['in_flight']} simulazioni in corso, {stats['coalesced']} condivise (totale)"
+    )
+    return results
+
 def main():
     """Funzione principale dell'applicazione"""
     setup_page()
 
     # --- Collect user inputs ---
     params = sidebar_inputs()
+    scenario_sidebar(params)
     
     show_pv_guide()
     
-    # --- PV calculations ---
-    results = calculate_all_pv(params)
-
-    # --- Agricultural calculations (requires PV results) ---
-    agri_results = calculate_all_agri(params, results)
-    
-    # Merge agricultural results into PV results
-    results["agri_results"] = agri_results
+    # --- PV + agricultural calculations (only stages downstream of changed inputs rerun) ---
+    results = run_simulation(params)
+    archive_sidebar(params)
     
     # --- Map and metrics ---
     display_map_section(params)
     display_metrics(results, params)
+    display_charts(results)
+    if params.get("economics"):
+        display_economics_section(results, params)
+    if params.get("storage"):
+        display_storage_section(results, params)
+    if params.get("monte_carlo"):
+        display_uncertainty_section(params, get_pipeline().run_stages(params))
+    if params.get("sensitivity"):
+        display_sensitivity_section(params, get_pipeline().run_stages(params))
+    if params.get("mount") == "Monoassiale":
+        display_tracker_section(params, get_pipeline().run_stages(params))
+    display_scenario_comparison(get_pipeline(), results, params)
+    display_export_section(results, params)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,360 @@
+"""
+Modulo Batch - Simulazioni multi-sito con risultati memory-mapped su disco
+Per migliaia di siti × 8760 ore le serie non stanno in memoria: ogni serie
+è un array .npy (siti × tempi, float32) preallocato su disco, in cui i
+worker scrivono direttamente il proprio blocco di siti. Un piccolo indice
+(meta.json, coordinate, aggregati per sito, blocchi completati) permette
+di rileggere tutto senza copie con np.load(mmap_mode="r").
+
+Layout della cartella:
+    meta.json        periodo, serie, aggregati, parametri, dimensione blocchi
+    sites.npy        (n_siti, 3) lat, lon, quota
+    <serie>.npy      (n_siti, n_tempi) float32
+    aggregates.npy   (n_siti, n_aggregati) float64
+    done.npy         (n_blocchi,) 1 = blocco scritto (checkpoint per la ripresa)
+"""
+
+import hashlib
+import json
+import os
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from cache import params_hash
+from config import BATCH_CONFIG, PARALLEL_CONFIG, HECTARE_M2, TIMEZONE_OBJ, MODEL_VERSION
+from calculations import (
+    build_time_index,
+    _site_altitudes,
+    calculate_solar_position_batch,
+    calculate_clearsky_batch,
+    calculate_row_shaded_fraction,
+    calculate_array_shaded_fraction,
+    estimate_ambient_temperature,
+    calculate_cell_temperature,
+    is_tracker,
+)
+from agri_calculations import (
+    calculate_shadow_projection,
+    calculate_shaded_fraction,
+    TRANSMISSION_COEFF,
+    PAR_FRACTION,
+)
+from results import time_step_hours
+
+
+AGGREGATES = (
+    "energy_total_Wh", "GHI_Whm2", "POA_Whm2",
+    "T_cell_avg", "shaded_fraction_avg", "DLI_mol_m2_day",
+)
+
+
+# ==================== MODELLO VETTORIALE PER SITI ====================
+
+def simulate_sites(params: dict, times: pd.DatetimeIndex, lats, lons, altitude=None) -> tuple:
+    """
+    Simulazione PV e agronomica di un blocco di siti (impianto fisso):
+    stessi modelli della pipeline su array (n_siti, n_tempi)
+
+    Returns:
+        (serie: dict nome -> (n_siti, n_tempi), aggregati: dict nome -> (n_siti,))
+    """
+    if is_tracker(params):
+        raise ValueError("Batch multi-sito disponibile solo per impianto fisso")
+
+    lats = np.asarray(lats, dtype=float).ravel()
+    step_hours = time_step_hours(times)
+    n_days = max(len(times) * step_hours / 24, 1.0)
+
+    solpos = calculate_solar_position_batch(times, lats, lons, altitude)
+    clearsky = calculate_clearsky_batch(times, lats, lons, solpos, altitude)
+    import pvlib
+
+    # Irradianza sul piano con ombreggiamento tra file
+    poa = pvlib.irradiance.get_total_irradiance(
+        params["tilt_pannello"], params["azimuth_pannello"], solpos["zenith"], solpos["azimuth"],
+        clearsky["dni"], clearsky["ghi"], clearsky["dhi"], albedo=params["albedo"]
+    )
+    row_fraction = calculate_row_shaded_fraction(
+        solpos["elevation"], solpos["azimuth"], params["tilt_pannello"], params["azimuth_pannello"],
+        params["lato_minore"], params["carreggiata"]
+    )
+    beam_factor = 1 - calculate_array_shaded_fraction(row_fraction, params["num_rows"])
+    poa_global = np.nan_to_num(poa["poa_direct"] * beam_factor + poa["poa_diffuse"])
+
+    # Temperatura ambiente: lineare nella latitudine (T a 40° + pendenza per grado)
+    T_40 = estimate_ambient_temperature(times, 40.0).to_numpy()
+    slope = estimate_ambient_temperature(times, 41.0).to_numpy() - T_40
+    T_amb = T_40 + (lats[:, None] - 40.0) * slope
+
+    T_cell = calculate_cell_temperature(params, poa_global, T_amb, step_hours)
+    eff_corr = params["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
+    power_total = poa_global * params["area_pannello"] * eff_corr * (1 - params["losses"]) * params["num_panels_total"]
+
+    # Ombra a terra e DLI
+    shadow = calculate_shadow_projection(
+        params["lato_maggiore"], params["lato_minore"], params["tilt_pannello"],
+        params["azimuth_pannello"], solpos["elevation"], solpos["azimuth"], params["altezza_suolo"]
+    )
+    shaded_fraction = calculate_shaded_fraction(
+        shadow, params["num_panels_total"], params["hectares"] * HECTARE_M2, params["pitch_laterale"]
+    )
+    transmission = shaded_fraction * TRANSMISSION_COEFF["under_panel"] + (1 - shaded_fraction)
+    dli = PAR_FRACTION * 4.6 * 3600 * step_hours / 1e6 / n_days * (clearsky["ghi"] * transmission).sum(axis=1)
+
+    series = {
+        "GHI_Wm2": clearsky["ghi"],
+        "DNI_Wm2": clearsky["dni"],
+        "DHI_Wm2": clearsky["dhi"],
+        "POA_Wm2": poa_global,
+        "T_amb": T_amb,
+        "T_cell": T_cell,
+        "power_total_W": power_total,
+        "shaded_fraction": shaded_fraction,
+        "sun_elevation": solpos["elevation"],
+    }
+    aggregates = {
+        "energy_total_Wh": power_total.sum(axis=1) * step_hours,
+        "GHI_Whm2": clearsky["ghi"].sum(axis=1) * step_hours,
+        "POA_Whm2": poa_global.sum(axis=1) * step_hours,
+        "T_cell_avg": T_cell.mean(axis=1),
+        "shaded_fraction_avg": shaded_fraction.mean(axis=1),
+        "DLI_mol_m2_day": dli,
+    }
+    return series, aggregates
+
+
+# ==================== ARCHIVIO MEMORY-MAPPED ====================
+
+def _json_default(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _site_table(lats, lons, altitude=None) -> np.ndarray:
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    return np.column_stack([lats, lons, _site_altitudes(lats, lons, altitude)])
+
+
+def batch_key(params: dict, sites: np.ndarray, series: tuple, chunk_sites: int) -> str:
+    """Impronta del batch: parametri, siti, serie e blocchi (per la ripresa)"""
+    return params_hash({
+        "params": params_hash(params),
+        "model_version": MODEL_VERSION,
+        "sites": hashlib.sha256(np.ascontiguousarray(sites).tobytes()).hexdigest(),
+        "series": list(series),
+        "chunk_sites": chunk_sites,
+    })
+
+
+def create_batch(path: str, params: dict, lats, lons, series: tuple = None,
+                 chunk_sites: int = None, altitude=None) -> "BatchResults":
+    """
+    Prepara la cartella del batch: indice e array su disco preallocati
+    (file sparsi: lo spazio viene occupato man mano che i blocchi sono scritti).
+    Con series=() si salvano solo gli aggregati per sito.
+    """
+    series = tuple(BATCH_CONFIG["series"] if series is None else series)
+    chunk_sites = int(chunk_sites or BATCH_CONFIG["chunk_sites"])
+    sites = _site_table(lats, lons, altitude)
+    times = build_time_index(params)
+    n_chunks = -(-len(sites) // chunk_sites)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "sites.npy"), sites)
+    for name in series:
+        np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+",
+                                  dtype=np.float32, shape=(len(sites), len(times))).flush()
+    np.lib.format.open_memmap(os.path.join(path, "aggregates.npy"), mode="w+",
+                              dtype=np.float64, shape=(len(sites), len(AGGREGATES))).flush()
+    np.save(os.path.join(path, "done.npy"), np.zeros(n_chunks, dtype=np.uint8))
+
+    meta = {
+        "n_sites": len(sites),
+        "n_steps": len(times),
+        "start_utc": times[0].tz_convert("UTC").isoformat(),
+        "step_min": int(params.get("risoluzione_min", 60)),
+        "timezone": str(times.tz),
+        "series": list(series),
+        "aggregates": list(AGGREGATES),
+        "chunk_sites": chunk_sites,
+        "key": batch_key(params, sites, series, chunk_sites),
+        "params": {k: v for k, v in params.items() if k != "location"},
+    }
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, default=_json_default, ensure_ascii=False, indent=1)
+    return BatchResults(path)
+
+
+def _write_chunk(path: str, params: dict, chunk: int):
+    """
+    Worker: calcola un blocco di siti e lo scrive direttamente negli array
+    su disco. Il blocco (unità di checkpoint) è simulato a sotto-blocchi di
+    BATCH_CONFIG["chunk_sites"] siti: la memoria delle matrici (siti, tempi)
+    non cresce con blocchi grandi come quelli del job regionale.
+    """
+    batch = BatchResults(path)
+    start, stop = batch.chunk_bounds(chunk)
+    series_out = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r+")
+                  for name in batch.series_names}
+    aggregates_out = np.load(os.path.join(path, "aggregates.npy"), mmap_mode="r+")
+
+    step = int(BATCH_CONFIG["chunk_sites"])
+    for lo in range(start, stop, step):
+        hi = min(lo + step, stop)
+        series, aggregates = simulate_sites(params, batch.times, batch.lat[lo:hi], batch.lon[lo:hi],
+                                            batch.altitude[lo:hi])
+        for name, out in series_out.items():
+            out[lo:hi] = series[name]
+        aggregates_out[lo:hi] = np.column_stack([aggregates[name] for name in AGGREGATES])
+
+    for out in (*series_out.values(), aggregates_out):
+        out.flush()
+
+    # Blocco segnato come completo solo dopo la scrittura dei dati
+    done = np.load(os.path.join(path, "done.npy"), mmap_mode="r+")
+    done[chunk] = 1
+    done.flush()
+
+
+def run_sites_batch(params: dict, lats, lons, path: str, series: tuple = None,
+                    chunk_sites: int = None, workers: int = None, altitude=None,
+                    resume: bool = False, progress=None) -> "BatchResults":
+    """
+    Simula tutti i siti scrivendo le serie orarie su disco a blocchi di
+    siti, in parallelo sul pool di processi (nessun risultato passa dal
+    processo principale). Restituisce il batch aperto in sola lettura.
+
+    Args:
+        resume: riprende un batch interrotto nella stessa cartella (stessi
+            parametri e siti), calcolando solo i blocchi non completati
+        progress: callback(blocchi_completati, blocchi_totali)
+    """
+    from pipeline import PIPELINE_PARAMS, get_process_pool
+
+    stage_params = {name: params[name] for name in PIPELINE_PARAMS if name in params}
+    series = tuple(BATCH_CONFIG["series"] if series is None else series)
+    chunk_sites = int(chunk_sites or BATCH_CONFIG["chunk_sites"])
+    workers = PARALLEL_CONFIG["workers"] if workers is None else workers
+
+    batch = open_batch(path) if resume and os.path.exists(os.path.join(path, "meta.json")) else None
+    if batch is None or batch.meta.get("key") != batch_key(
+            params, _site_table(lats, lons, altitude), series, chunk_sites):
+        batch = create_batch(path, params, lats, lons, series, chunk_sites, altitude)
+
+    pending = np.flatnonzero(np.asarray(batch.done) == 0).tolist()
+    completed = batch.n_chunks - len(pending)
+    if workers > 1 and len(pending) > 1:
+        results = get_process_pool(workers).map(_write_chunk, repeat(path), repeat(stage_params), pending)
+    else:
+        results = (_write_chunk(path, stage_params, chunk) for chunk in pending)
+    for _ in results:
+        completed += 1
+        if progress is not None:
+            progress(completed, batch.n_chunks)
+    return BatchResults(path)
+
+
+# ==================== LETTURA ====================
+
+class BatchResults:
+    """
+    Batch su disco in sola lettura: le serie sono memmap (nessuna copia),
+    le viste per sito si costruiscono su richiesta
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.sites = np.load(os.path.join(path, "sites.npy"), mmap_mode="r")
+        self.series_names = tuple(self.meta["series"])
+        tz = self.meta["timezone"]
+        self.times = pd.date_range(
+            start=pd.Timestamp(self.meta["start_utc"]), periods=self.meta["n_steps"],
+            freq=pd.Timedelta(minutes=self.meta["step_min"])
+        ).tz_convert(TIMEZONE_OBJ if tz == str(TIMEZONE_OBJ) else tz)
+        self._arrays = {}  # memmap aperti una sola volta per file
+
+    def _array(self, name: str) -> np.memmap:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    @property
+    def n_sites(self) -> int:
+        return self.meta["n_sites"]
+
+    @property
+    def n_chunks(self) -> int:
+        return -(-self.n_sites // self.meta["chunk_sites"])
+
+    def chunk_bounds(self, chunk: int) -> tuple:
+        start = chunk * self.meta["chunk_sites"]
+        return start, min(start + self.meta["chunk_sites"], self.n_sites)
+
+    @property
+    def lat(self) -> np.ndarray:
+        return self.sites[:, 0]
+
+    @property
+    def lon(self) -> np.ndarray:
+        return self.sites[:, 1]
+
+    @property
+    def altitude(self) -> np.ndarray:
+        return self.sites[:, 2]
+
+    @property
+    def done(self) -> np.ndarray:
+        """Blocchi completati (1 = scritto)"""
+        return np.load(os.path.join(self.path, "done.npy"), mmap_mode="r")
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.done.all())
+
+    def values(self, name: str) -> np.memmap:
+        """Serie (n_siti, n_tempi) come memmap in sola lettura"""
+        if name not in self.series_names:
+            raise KeyError(name)
+        return self._array(name)
+
+    def site_series(self, site: int, name: str) -> pd.Series:
+        """Serie di un sito come vista sul file (nessuna copia)"""
+        return pd.Series(self.values(name)[site], index=self.times, name=name, copy=False)
+
+    def aggregates(self) -> pd.DataFrame:
+        """Aggregati per sito (una riga per sito, con lat e lon)"""
+        frame = pd.DataFrame(np.asarray(self._array("aggregates")), columns=self.meta["aggregates"])
+        frame.insert(0, "lat", np.asarray(self.lat))
+        frame.insert(1, "lon", np.asarray(self.lon))
+        return frame
+
+    def site(self, site: int) -> dict:
+        """
+        Risultati di un sito nel formato dei risultati di simulazione (per
+        l'export): serie come viste sul file e riga degli aggregati letta
+        direttamente dal memmap, senza costruire la tabella di tutti i siti
+        """
+        row = self._array("aggregates")[site]
+        return {
+            "times": self.times,
+            **{name: self.site_series(site, name) for name in self.series_names},
+            "lat": float(self.lat[site]),
+            "lon": float(self.lon[site]),
+            **dict(zip(self.meta["aggregates"], row.tolist())),
+        }
+
+
+def open_batch(path: str) -> BatchResults:
+    return BatchResults(path)
+
+
+def export_batch(batch: BatchResults, path: str, fmt: str = None) -> int:
+    """Export a blocchi di tutti i siti (serie orarie + riepilogo per sito)"""
+    from export import stream_results
+
+    runs = ((f"{batch.lat[i]:.4f},{batch.lon[i]:.4f}", batch.site(i), None) for i in range(batch.n_sites))
+    return stream_results(runs, path, fmt, label_key="sito")
@@ -0,0 +1,203 @@
+"""
+Modulo Cache - Cache dei risultati condivisa tra tutte le sessioni del processo
+Chiave = hash canonico degli input di simulazione; eviction LRU con tetto
+di memoria in byte, statistiche di hit rate e coalescenza (single-flight)
+delle simulazioni identiche richieste in contemporanea.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, datetime
+from numbers import Number
+
+from config import CACHE_CONFIG
+
+
+# ==================== CHIAVE CANONICA ====================
+
+def _canonical(value):
+    """Valore normalizzato: 5 e 5.0 coincidono, date in ISO, oggetti come stringa"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, Number):
+        return round(float(value), 9)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    return str(value)
+
+
+def params_hash(params: dict, keys=None) -> str:
+    """
+    Hash canonico (sha256) degli input di simulazione
+
+    Args:
+        params: parametri di simulazione
+        keys: chiavi da considerare (default: tutte tranne gli oggetti non serializzabili)
+    """
+    keys = sorted(keys) if keys is not None else sorted(k for k in params if k != "location")
+    payload = {k: _canonical(params.get(k)) for k in keys}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# ==================== SINGLE-FLIGHT ====================
+
+class SingleFlight:
+    """
+    Coalescenza delle richieste concorrenti: chiamate con la stessa chiave
+    mentre un calcolo è in corso attendono quel calcolo e ne condividono
+    il risultato (o l'eccezione) invece di ripeterlo.
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> Future del calcolo in corso
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, compute):
+        """Risultato di compute(), eseguito una sola volta per chiave in volo"""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        """Calcoli eseguiti e richieste servite da un calcolo già in corso"""
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+                "dedup_rate": self.coalesced / calls if calls else 0.0,
+            }
+
+
+# ==================== CACHE LRU CON TETTO DI MEMORIA ====================
+
+class ResultCache:
+    """
+    Cache LRU thread-safe limitata in byte (non in numero di elementi):
+    risultati annuali grandi occupano più budget di quelli giornalieri.
+    I valori devono esporre .nbytes (es. PVResults) oppure si passa nbytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (valore, nbytes)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._flight = SingleFlight()
+
+    def get(self, key: str):
+        """Valore in cache (None se assente), aggiornando l'ordine LRU"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value, nbytes: int = None) -> bool:
+        """Inserisce un valore; False se da solo supera il tetto di memoria"""
+        nbytes = nbytes if nbytes is not None else getattr(value, "nbytes", 0)
+        if nbytes > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            while self._entries and self.current_bytes + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+        return True
+
+    def get_or_compute(self, key: str, compute):
+        """
+        Restituisce il valore in cache o lo calcola con compute() e lo memorizza.
+        Miss concorrenti sulla stessa chiave condividono un solo calcolo.
+        """
+        value = self.get(key)
+        if value is None:
+            value = self._flight.do(key, lambda: self._compute_and_put(key, compute))
+        return value
+
+    def _compute_and_put(self, key: str, compute):
+        # Un altro leader può aver completato lo stesso calcolo nel frattempo
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry[0]
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        """Statistiche di utilizzo (hit rate in [0, 1])"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                **self._flight.stats(),
+            }
+
+
+# ==================== ISTANZA CONDIVISA ====================
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Cache di processo condivisa da tutte le sessioni Streamlit"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(int(CACHE_CONFIG["max_mb"] * 1024 * 1024))
+        return _result_cache
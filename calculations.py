@@ -2,10 +2,16 @@
 Modulo Calcoli - Gestisce tutti i calcoli geometrici, solari ed elettrici
 """
 
+import os
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 import pvlib
 import math
-from config import HECTARE_M2
+from config import HECTARE_M2, CLEARSKY_CONFIG, TEMPERATURE_MODELS
+from results import PVResults, time_step_hours
+from layout import pack_field, row_pitch
 
 
 # ==================== CALCOLI GEOMETRICI ====================
@@ -17,6 +23,19 @@ def calculate_ground_projection(area: float, tilt: float) -> float:
     return area * math.cos(math.radians(tilt))
 
 def calculate_max_panels(params: dict) -> dict:
+    # Poligono reale del campo: impaccamento con shapely
+    if params.get("field_polygon"):
+        packing = pack_field(params)
+        lato_campo = math.sqrt(packing["field_area_m2"])
+        return {
+            "lato_campo_stimato_m": lato_campo,
+            "max_panels_per_row": packing["max_panels_per_row"],
+            "max_rows": packing["max_rows"],
+            "total_panels": packing["total_panels"],
+            "spazio_laterale_libero_m": 0.0,
+            "spazio_longitudinale_libero_m": 0.0
+        }
+
     # Calcola lato del campo (approssimazione quadrato)
     campo_m2 = params["hectares"] * HECTARE_M2
     lato_campo = math.sqrt(campo_m2)
@@ -26,7 +45,7 @@ def calculate_max_panels(params: dict) -> dict:
     spazio_laterale_libero = lato_campo - max_panels_per_row * params["pitch_laterale"]
 
     # Numero massimo di file (verticale/longitudinale)
-    spazio_per_fila = params["lato_minore"] + params["carreggiata"]
+    spazio_per_fila = row_pitch(params["lato_minore"], params["carreggiata"])
     max_rows = int(lato_campo / spazio_per_fila)
     spazio_longitudinale_libero = lato_campo - max_rows * spazio_per_fila
 
@@ -93,18 +112,176 @@ def calculate_solar_position(times: pd.DatetimeIndex, lat: float, lon: float) ->
     return pvlib.solarposition.get_solarposition(times, lat, lon)
 
 
-def calculate_clearsky_irradiance(times: pd.DatetimeIndex, lat: float, lon: float, tz: str) -> pd.DataFrame:
-    """Calcola irradianza cielo sereno"""
-    site = pvlib.location.Location(lat, lon, tz=tz)
-    return site.get_clearsky(times, model="ineichen")
+def calculate_clearsky_irradiance(times: pd.DatetimeIndex, lat: float, lon: float, tz: str,
+                                  solpos: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Calcola irradianza cielo sereno (Ineichen)
 
+    Torbidità di Linke e quota arrivano dalle tabelle precaricate (nessun
+    accesso ai file HDF5 per richiesta); se fornita, solpos evita di
+    ricalcolare la posizione solare.
+    """
+    site = pvlib.location.Location(lat, lon, tz=tz, altitude=lookup_site_altitude(lat, lon))
+    return site.get_clearsky(
+        times, model="ineichen",
+        solar_position=solpos,
+        linke_turbidity=lookup_linke_turbidity(times, lat, lon)
+    )
 
-def calculate_poa_global(clearsky: pd.DataFrame, solpos: pd.DataFrame, 
-                         tilt: float, azimuth: float, albedo: float) -> pd.Series:
+
+# ==================== TORBIDITÀ DI LINKE ====================
+
+@lru_cache(maxsize=None)
+def load_pvlib_grid(filename: str, dataset: str) -> np.ndarray:
     """
-    Calcola POA (Plane of Array) globale
+    Griglia globale a 5' distribuita con pvlib (es. LinkeTurbidities.h5,
+    Altitude.h5) aperta in memory-map
+
+    Al primo uso il dataset HDF5 viene convertito in .npy: i worker dello
+    stesso host condividono le pagine tramite la page cache del sistema
+    operativo, senza copie in RAM né accessi HDF5 per richiesta.
+    """
+    path = os.path.join(CLEARSKY_CONFIG["cache_dir"], f"{os.path.splitext(filename)[0]}.npy")
+    if not os.path.exists(path):
+        import h5py
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        source = os.path.join(os.path.dirname(pvlib.clearsky.__file__), "data", filename)
+        with h5py.File(source, "r") as h5:
+            table = h5[dataset][:]
+
+        # Scrittura atomica: altri processi vedono solo il file completo
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp_path, path)
+
+    return np.load(path, mmap_mode="r")
+
+
+def load_linke_turbidity_table() -> np.ndarray:
+    """Climatologia mensile di torbidità (2160 × 4320 × 12, uint8 = 20·TL)"""
+    return load_pvlib_grid("LinkeTurbidities.h5", "LinkeTurbidity")
+
+
+def linke_grid_index(lat, lon) -> tuple:
+    """Indici (riga, colonna) della griglia a 5' per lat/lon (scalari o array)"""
+    lat_idx = np.rint((90 - 1 / 24 - np.asarray(lat, dtype=float)) * 12)
+    lon_idx = np.rint((np.asarray(lon, dtype=float) + 180 - 1 / 24) * 12)
+    return (np.clip(lat_idx, 0, 2159).astype(int),
+            np.clip(lon_idx, 0, 4319).astype(int))
+
+
+def lookup_site_altitude(lat, lon):
+    """
+    Quota del sito [m] dalla mappa a bassa risoluzione di pvlib (stessa
+    codifica di pvlib.location.lookup_altitude), scalari o array
+    """
+    lat_idx, lon_idx = linke_grid_index(lat, lon)
+    raw = np.asarray(load_pvlib_grid("Altitude.h5", "Altitude")[lat_idx, lon_idx], dtype=float)
+    altitude = np.where(raw == 255, 0.0, raw * 28 - 450)
+    return float(altitude) if altitude.ndim == 0 else altitude
+
+
+def lookup_land_mask(lat, lon) -> np.ndarray:
+    """Terraferma secondo la mappa delle quote di pvlib (griglia a 5', mare = 255)"""
+    lat_idx, lon_idx = linke_grid_index(lat, lon)
+    return np.asarray(load_pvlib_grid("Altitude.h5", "Altitude")[lat_idx, lon_idx]) != 255
+
+
+@lru_cache(maxsize=4096)
+def _monthly_linke_turbidity(lat_idx: int, lon_idx: int) -> np.ndarray:
+    values = np.asarray(load_linke_turbidity_table()[lat_idx, lon_idx], dtype=float) / 20.0
+    values.flags.writeable = False
+    return values
+
+
+def monthly_linke_turbidity(lat: float, lon: float) -> np.ndarray:
+    """12 valori mensili di TL per il sito (cache per cella di griglia)"""
+    lat_idx, lon_idx = linke_grid_index(lat, lon)
+    return _monthly_linke_turbidity(int(lat_idx), int(lon_idx))
+
+
+def interpolate_linke_turbidity(monthly: np.ndarray, times: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Interpola i valori mensili (riferiti a metà mese) sul giorno dell'anno UTC,
+    come pvlib.clearsky.lookup_linke_turbidity. monthly può essere (12,) o
+    (n_siti, 12): in tal caso il risultato è (n_siti, n_tempi).
+    """
+    times_utc = times.tz_convert("UTC") if times.tz is not None else times
+    dayofyear = np.asarray(times_utc.dayofyear, dtype=float)
+    isleap = np.asarray(times_utc.is_leap_year)
+
+    single_site = np.ndim(monthly) == 1
+    monthly = np.atleast_2d(monthly)
+    padded = np.concatenate([monthly[:, -1:], monthly, monthly[:, :1]], axis=1)
+
+    result = np.empty((monthly.shape[0], len(times)))
+    for leap, year in ((False, 2015), (True, 2016)):
+        mask = isleap == leap
+        if not mask.any():
+            continue
+        mdays = np.array([31, 29 if leap else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+        middles = np.concatenate([[-15.5], np.cumsum(mdays) - mdays / 2, [mdays.sum() + 15.5]])
+        # Interpolazione lineare vettoriale su tutti i siti
+        pos = np.clip(np.searchsorted(middles, dayofyear[mask], side="right") - 1, 0, len(middles) - 2)
+        w = (dayofyear[mask] - middles[pos]) / (middles[pos + 1] - middles[pos])
+        result[:, mask] = padded[:, pos] * (1 - w) + padded[:, pos + 1] * w
+
+    return result[0] if single_site else result
+
+
+def lookup_linke_turbidity(times: pd.DatetimeIndex, lat: float, lon: float) -> pd.Series:
+    """Torbidità di Linke giornaliera interpolata (solo aritmetica dopo il primo uso)"""
+    return pd.Series(interpolate_linke_turbidity(monthly_linke_turbidity(lat, lon), times), index=times)
+
+
+def calculate_row_shaded_fraction(sun_elevation, sun_azimuth, tilt, azimuth,
+                                  lato_minore, carreggiata):
+    """
+    Calcola la frazione ombreggiata (in altezza) di una fila di moduli
+    causata dalla fila antistante, per ogni istante.
+
+    Modello 2D sul piano perpendicolare alle file: angolo di profilo del sole
+    e interasse file = row_pitch (lato minore + carreggiata, come nel layout).
+    Tutti gli argomenti sono vettorizzati con broadcasting numpy: passando
+    tilt/azimuth/lato_minore/carreggiata come array colonna (n_layout, 1)
+    si ottiene una matrice (n_layout, n_tempi) per gli sweep di layout.
+    """
+    elev = np.radians(np.asarray(sun_elevation, dtype=float))
+    delta_az = np.radians(np.asarray(sun_azimuth, dtype=float) - np.asarray(azimuth, dtype=float))
+    tilt_rad = np.radians(np.asarray(tilt, dtype=float))
+    lato_minore = np.asarray(lato_minore, dtype=float)
+    pitch = row_pitch(lato_minore, np.asarray(carreggiata, dtype=float))
+
+    # Angolo di profilo (0-180°) nel piano perpendicolare alle file
+    profile = np.arctan2(np.tan(np.clip(elev, 0, None)), np.cos(delta_az))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = 1 - (pitch * np.sin(profile)) / (lato_minore * np.sin(profile + tilt_rad))
+
+    # Nessuna ombra con sole sotto l'orizzonte o alle spalle dei moduli
+    fraction = np.where((elev > 0) & (np.cos(delta_az) > 0), fraction, 0.0)
+    fraction = np.clip(np.nan_to_num(fraction, nan=0.0), 0.0, 1.0)
+
+    if isinstance(sun_elevation, pd.Series) and fraction.ndim == 1:
+        return pd.Series(fraction, index=sun_elevation.index)
+    return fraction
+
+
+def calculate_array_shaded_fraction(row_fraction, num_rows):
+    """
+    Frazione ombreggiata media dell'intero campo: la prima fila non è mai
+    ombreggiata, le altre (num_rows - 1) ricevono row_fraction.
     """
-    poa = pvlib.irradiance.get_total_irradiance(
+    num_rows = np.asarray(num_rows, dtype=float)
+    return row_fraction * np.maximum(num_rows - 1, 0) / np.maximum(num_rows, 1)
+
+
+def calculate_poa_components(clearsky: pd.DataFrame, solpos: pd.DataFrame,
+                             tilt: float, azimuth: float, albedo: float) -> pd.DataFrame:
+    """Calcola le componenti POA (globale, diretta, diffusa) sul piano pannelli"""
+    return pvlib.irradiance.get_total_irradiance(
         surface_tilt=tilt,
         surface_azimuth=azimuth,
         dni=clearsky['dni'],
@@ -114,53 +291,313 @@ def calculate_poa_global(clearsky: pd.DataFrame, solpos: pd.DataFrame,
         solar_azimuth=solpos['azimuth'],
         albedo=albedo
     )
+
+
+def apply_beam_shading(poa: pd.DataFrame, beam_shaded_fraction) -> pd.Series:
+    """
+    POA globale con la sola componente diretta ridotta dalla frazione
+    ombreggiata (la diffusa resta invariata)
+    """
+    return poa['poa_direct'] * (1 - beam_shaded_fraction) + poa['poa_diffuse']
+
+
+def calculate_poa_global(clearsky: pd.DataFrame, solpos: pd.DataFrame, 
+                         tilt: float, azimuth: float, albedo: float,
+                         beam_shaded_fraction: pd.Series = None) -> pd.Series:
+    """
+    Calcola POA (Plane of Array) globale
+    """
+    poa = calculate_poa_components(clearsky, solpos, tilt, azimuth, albedo)
+    if beam_shaded_fraction is not None:
+        return apply_beam_shading(poa, beam_shaded_fraction).round(0).astype(int)
     return poa['poa_global'].round(0).astype(int)
 
 def estimate_ambient_temperature(times: pd.DatetimeIndex, lat: float) -> pd.Series:
     """
     Stima temperatura ambiente oraria con modello sinusoidale
+    (stagione valutata per ogni istante: valida anche su periodi annuali)
     """
-    month = times[0].month
-    
-    # Stima temperatura media stagionale
-    if month in [12, 1, 2]:  # Inverno
-        T_media = 8 - (lat - 40) * 0.5
-        escursione = 6
-    elif month in [3, 4, 5]:  # Primavera
-        T_media = 15 - (lat - 40) * 0.3
-        escursione = 8
-    elif month in [6, 7, 8]:  # Estate
-        T_media = 26 - (lat - 40) * 0.4
-        escursione = 10
-    else:  # Autunno
-        T_media = 16 - (lat - 40) * 0.3
-        escursione = 7
-    
+    # Stima temperatura media stagionale: (T base, coeff. latitudine, escursione)
+    seasons = {
+        (12, 1, 2): (8, 0.5, 6),  # Inverno
+        (3, 4, 5): (15, 0.3, 8),  # Primavera
+        (6, 7, 8): (26, 0.4, 10),  # Estate
+        (9, 10, 11): (16, 0.3, 7),  # Autunno
+    }
+    T_media_mese = np.empty(13)
+    escursione_mese = np.empty(13)
+    for months, (T_base, coeff, escursione) in seasons.items():
+        T_media_mese[list(months)] = T_base - (lat - 40) * coeff
+        escursione_mese[list(months)] = escursione
+
+    month = times.month.to_numpy()
+
     # Temperatura oraria sinusoidale (min h6, max h14)
-    hours = times.hour
-    T_amb = T_media + escursione * pd.Series(
-        [math.sin(math.pi * (h - 6) / 12) for h in hours],
+    hours = times.hour.to_numpy() + times.minute.to_numpy() / 60
+    T_amb = pd.Series(
+        T_media_mese[month] + escursione_mese[month] * np.sin(np.pi * (hours - 6) / 12),
         index=times
     )
     
     return T_amb
 
 
+# ==================== INSEGUITORE MONOASSIALE ====================
+
+def is_tracker(params: dict) -> bool:
+    return params.get("mount", "Fisso") == "Monoassiale"
+
+
+def tracker_pitch(params: dict) -> float:
+    """Interasse tra gli assi [m]: row_pitch, come per le file fisse e nel layout"""
+    return row_pitch(params["lato_minore"], params["carreggiata"])
+
+
+def solar_hour(times: pd.DatetimeIndex, lon: float) -> np.ndarray:
+    """Ora solare vera [h, 0-24] di ogni istante"""
+    eot = pvlib.solarposition.equation_of_time_spencer71(times.dayofyear)
+    return (12 + np.asarray(pvlib.solarposition.hour_angle(times, lon, eot)) / 15) % 24
+
+
+def steering_schedule(window_h, fraction) -> np.ndarray:
+    """
+    Deviazione oraria (24 valori per ora solare): fraction nelle ore entro
+    window_h/2 dal mezzogiorno solare, 0 altrove. Con argomenti array
+    (n_strategie,) restituisce una matrice (n_strategie, 24).
+    """
+    hours = np.arange(24) + 0.5
+    window_h, fraction = np.asarray(window_h, dtype=float), np.asarray(fraction, dtype=float)
+    inside = np.abs(hours - 12) < window_h[..., None] / 2
+    return np.where(inside, fraction[..., None], 0.0)
+
+
+def steer_rotation(theta_track, theta_true, deviation, max_angle: float) -> np.ndarray:
+    """
+    Rotazione deviata verso il taglio: deviation = 0 segue l'inseguimento
+    (con backtracking), 1 porta il modulo parallelo ai raggi (limitato a
+    ±max_angle) lasciando passare più luce alle colture. Broadcasting numpy.
+    """
+    theta_true = np.asarray(theta_true, dtype=float)
+    edge = np.clip(theta_true + np.where(theta_true >= 0, 90.0, -90.0), -max_angle, max_angle)
+    return theta_track + deviation * (edge - theta_track)
+
+
+def calculate_tracker_rotation(solpos: pd.DataFrame, params: dict) -> pd.DataFrame:
+    """
+    Rotazioni dell'inseguitore (asse orizzontale, azimut = azimuth_pannello):
+    inseguimento puro e con backtracking (GCR del layout), 0 di notte
+    """
+    common = dict(
+        apparent_zenith=solpos["apparent_zenith"], solar_azimuth=solpos["azimuth"],
+        axis_tilt=0, axis_azimuth=params["azimuth_pannello"], max_angle=params["max_angle"],
+        gcr=params["lato_minore"] / tracker_pitch(params),
+    )
+    true = pvlib.tracking.singleaxis(backtrack=False, **common)
+    tracked = pvlib.tracking.singleaxis(backtrack=bool(params.get("backtrack", True)), **common)
+    return pd.DataFrame({
+        "theta_true": true["tracker_theta"].fillna(0.0),
+        "theta_track": tracked["tracker_theta"].fillna(0.0),
+    }, index=solpos.index)
+
+
+def calculate_orientation(params: dict, times: pd.DatetimeIndex, solpos: pd.DataFrame):
+    """
+    Orientamento dei moduli per istante (solo inseguitore, None per impianto fisso):
+    rotazione con la deviazione di params (steer_window_h, steer_fraction),
+    tilt e azimut della superficie, più le grandezze per la ricerca di strategie
+    """
+    if not is_tracker(params):
+        return None
+
+    rotation = calculate_tracker_rotation(solpos, params)
+    hour_index = np.floor(solar_hour(times, params["lon"])).astype(int) % 24
+    deviation = steering_schedule(params["steer_window_h"], params["steer_fraction"])[hour_index]
+    theta = steer_rotation(rotation["theta_track"].to_numpy(), rotation["theta_true"].to_numpy(),
+                           deviation, params["max_angle"])
+    surface = pvlib.tracking.calc_surface_orientation(theta, axis_tilt=0,
+                                                      axis_azimuth=params["azimuth_pannello"])
+    return rotation.assign(
+        hour_index=hour_index,
+        tracker_theta=theta,
+        surface_tilt=surface["surface_tilt"],
+        surface_azimuth=surface["surface_azimuth"],
+    )
+
+
+def calculate_tracker_shaded_fraction(solpos: pd.DataFrame, theta, axis_azimuth: float,
+                                      collector_width, pitch):
+    """
+    Frazione ombreggiata delle file interne di inseguitori (modello 1D di
+    pvlib, file parallele alla stessa rotazione). Broadcasting su theta e pitch.
+    """
+    fraction = pvlib.shading.shaded_fraction1d(
+        solpos["zenith"].to_numpy(), solpos["azimuth"].to_numpy(), axis_azimuth, theta,
+        collector_width=collector_width, pitch=pitch
+    )
+    return np.where(solpos["elevation"].to_numpy() > 0, np.nan_to_num(fraction), 0.0)
+
+
+# ==================== CALCOLI MULTI-SITO ====================
+
+def _site_altitudes(lats: np.ndarray, lons: np.ndarray, altitude) -> np.ndarray:
+    """Quote per sito: quelle fornite o, se None, dalla mappa di pvlib"""
+    if altitude is None:
+        return np.atleast_1d(lookup_site_altitude(lats, lons))
+    return np.broadcast_to(np.asarray(altitude, dtype=float), lats.shape).astype(float)
+
+
+def calculate_solar_position_batch(times: pd.DatetimeIndex, lats, lons, altitude=None) -> dict:
+    """
+    Posizione solare per n_siti × n_tempi in un solo passaggio (NREL SPA numpy
+    di pvlib con broadcasting): i termini che dipendono solo dal tempo vengono
+    calcolati una volta, quelli locali come array (n_siti, n_tempi).
+
+    Returns:
+        dict con zenith, apparent_zenith, elevation, azimuth: array (n_siti, n_tempi)
+    """
+    from pvlib import spa
+
+    lats = np.asarray(lats, dtype=float).reshape(-1, 1)
+    lons = np.asarray(lons, dtype=float).reshape(-1, 1)
+    altitude = _site_altitudes(lats.ravel(), lons.ravel(), altitude).reshape(-1, 1)
+    unixtime = np.asarray(times.tz_convert("UTC").asi8 if times.tz is not None else times.asi8) / 1e9
+    pressure = pvlib.atmosphere.alt2pres(altitude) / 100  # hPa
+
+    app_zenith, zenith, _, elevation, azimuth, _ = spa.solar_position_numpy(
+        unixtime, lats, lons, altitude, pressure, 12, 67.0, 0.5667, 1
+    )
+    return {
+        "zenith": zenith,
+        "apparent_zenith": app_zenith,
+        "elevation": elevation,
+        "azimuth": azimuth,
+    }
+
+
+def calculate_clearsky_batch(times: pd.DatetimeIndex, lats, lons, solpos: dict,
+                             altitude=None) -> dict:
+    """
+    Irradianza Ineichen per n_siti × n_tempi: torbidità di Linke dalla tabella
+    precaricata (indicizzazione vettoriale), airmass e modello come array.
+
+    Returns:
+        dict con ghi, dni, dhi: array (n_siti, n_tempi)
+    """
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    altitude = _site_altitudes(lats, lons, altitude).reshape(-1, 1)
+
+    lat_idx, lon_idx = linke_grid_index(lats, lons)
+    monthly = np.asarray(load_linke_turbidity_table()[lat_idx, lon_idx], dtype=float) / 20.0
+    linke = interpolate_linke_turbidity(monthly, times)
+
+    airmass_relative = pvlib.atmosphere.get_relative_airmass(solpos["apparent_zenith"])
+    airmass_absolute = pvlib.atmosphere.get_absolute_airmass(
+        airmass_relative, pvlib.atmosphere.alt2pres(altitude)
+    )
+    dni_extra = np.asarray(pvlib.irradiance.get_extra_radiation(times))
+
+    cs = pvlib.clearsky.ineichen(
+        solpos["apparent_zenith"], airmass_absolute, linke,
+        altitude=altitude, dni_extra=dni_extra
+    )
+    return {key: np.nan_to_num(np.asarray(cs[key]), nan=0.0) for key in ("ghi", "dni", "dhi")}
+
+
+def calculate_sites_batch(times: pd.DatetimeIndex, lats, lons, altitude=None,
+                          chunk_sites: int = 500) -> dict:
+    """
+    Posizione solare e cielo sereno per molti siti su un indice temporale comune
+
+    I siti sono elaborati a blocchi di chunk_sites (memoria intermedia limitata)
+    e scritti in array float32 preallocati (n_siti, n_tempi).
+
+    Returns:
+        dict con times, lat, lon e array zenith, azimuth, elevation, ghi, dni, dhi
+    """
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    altitude = _site_altitudes(lats, lons, altitude)
+
+    keys = ("zenith", "azimuth", "elevation", "ghi", "dni", "dhi")
+    out = {key: np.empty((len(lats), len(times)), dtype=np.float32) for key in keys}
+
+    for start in range(0, len(lats), chunk_sites):
+        sl = slice(start, start + chunk_sites)
+        solpos = calculate_solar_position_batch(times, lats[sl], lons[sl], altitude[sl])
+        clearsky = calculate_clearsky_batch(times, lats[sl], lons[sl], solpos, altitude[sl])
+        for key in keys:
+            out[key][sl] = solpos[key] if key in solpos else clearsky[key]
+
+    return {"times": times, "lat": lats, "lon": lons, **out}
+
+
 # ==================== CALCOLI PRODUZIONE ELETTRICA ====================
 
+def _float_array(values) -> np.ndarray:
+    """Array float: float32 conservato (valutazioni Monte Carlo), altrimenti float64"""
+    values = np.asarray(values)
+    return values if values.dtype == np.float32 else values.astype(float, copy=False)
+
+
+def apply_thermal_lag(T_steady, tau_min: float, step_hours: float) -> np.ndarray:
+    """
+    Inerzia termica del modulo: filtro del primo ordine sull'ultimo asse
+        T[k] = T[k-1] + α·(T_ss[k] − T[k-1]),  α = 1 − exp(−Δt/τ)
+    applicato come unico filtro ricorsivo (lineare nel numero di passi)
+    """
+    from scipy.signal import lfilter
+
+    T_steady = _float_array(T_steady)
+    if tau_min <= 0:
+        return T_steady
+
+    alpha = 1 - math.exp(-step_hours * 60 / tau_min)
+    b, a = np.array([alpha], T_steady.dtype), np.array([1, alpha - 1], T_steady.dtype)
+    # Stato iniziale: modulo già a regime sul primo valore
+    zi = (1 - alpha) * T_steady[..., :1]
+    T_cell, _ = lfilter(b, a, T_steady, axis=-1, zi=zi)
+    return T_cell
+
+
+def calculate_cell_temperature(params: dict, poa_global, T_amb, step_hours: float = 1.0) -> np.ndarray:
+    """
+    Temperatura celle [°C] secondo params["temp_model"] (NOCT, Faiman, SAPM),
+    con vento costante e inerzia termica opzionale. Opera su array numpy
+    con broadcasting (es. campioni × tempo).
+    """
+    model = params.get("temp_model", "NOCT")
+    coeffs = TEMPERATURE_MODELS[model]
+    wind_speed = params.get("wind_speed", 1.0)
+    poa_global, T_amb = _float_array(poa_global), _float_array(T_amb)
+
+    if model == "Faiman":
+        T_steady = pvlib.temperature.faiman(poa_global, T_amb, wind_speed, coeffs["u0"], coeffs["u1"])
+    elif model == "SAPM":
+        T_steady = pvlib.temperature.sapm_cell(poa_global, T_amb, wind_speed,
+                                               coeffs["a"], coeffs["b"], coeffs["deltaT"])
+    else:
+        T_steady = T_amb + (poa_global / 800) * (params["noct"] - 20)
+
+    T_steady = T_steady.astype(np.result_type(poa_global, T_amb), copy=False)
+    return apply_thermal_lag(T_steady, params.get("thermal_tau_min", 0.0), step_hours)
+
+
 def calculate_pv_production(params: dict, poa_global: pd.Series, T_amb: pd.Series) -> dict:
     """
     Calcola produzione elettrica
     """
     # Temperatura celle
-    T_cell = T_amb + (poa_global / 800) * (params["noct"] - 20)
+    T_cell = pd.Series(
+        calculate_cell_temperature(params, poa_global, T_amb, time_step_hours(poa_global.index)),
+        index=poa_global.index
+    )
     
     # Efficienza corretta per temperatura
     eff_corr = params["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
     
     # Potenza istantanea singolo pannello [W]
-    power_single = (
-        poa_global * params["area_pannello"] * eff_corr * (1 - params["losses"])).round(0).astype(int)
+    power_single = poa_global * params["area_pannello"] * eff_corr * (1 - params["losses"])
 
     # Potenza totale [W]
     power_total = power_single * params["num_panels_total"]
@@ -178,61 +615,130 @@ def calculate_pv_production(params: dict, poa_global: pd.Series, T_amb: pd.Serie
         "energy_single_Wh": energy_single,
         "energy_total_Wh": energy_total,
         "energy_total_Wh_m2": energy_total_m2,
+        "T_cell": T_cell,
         "T_cell_avg": T_cell.mean()
     }
 
 
 # ==================== FUNZIONE PRINCIPALE ====================
 
-def calculate_all_pv(params: dict) -> dict:
+def build_time_index(params: dict) -> pd.DatetimeIndex:
+    """
+    Serie temporale del periodo simulato: la giornata selezionata o l'intero
+    anno della data, con passo risoluzione_min (default orario)
+    """
+    step = pd.Timedelta(minutes=int(params.get("risoluzione_min", 60)))
+    start = pd.Timestamp(params["data"])
+    if params.get("periodo", "Giorno") == "Anno":
+        start = pd.Timestamp(year=start.year, month=1, day=1)
+        end = pd.Timestamp(year=start.year + 1, month=1, day=1)
+    else:
+        end = start + pd.Timedelta(days=1)
+
+    return pd.date_range(start=start, end=end - step, freq=step, tz=params["timezone"])
+
+
+def calculate_geometry(params: dict) -> dict:
+    """Raccoglie tutte le metriche geometriche (ingombri, GCR, dimensionamento)"""
+    panel_metrics = calculate_panel_metrics(params)
+    max_panels_info = calculate_max_panels(params)
+    occupied_space = calculate_occupied_space(params, panel_metrics)
+
+    return {
+        **panel_metrics,
+        **occupied_space,
+        **max_panels_info
+    }
+
+
+def calculate_row_shading(params: dict, solpos: pd.DataFrame, orientation: pd.DataFrame = None) -> pd.Series:
+    """Frazione ombreggiata oraria delle file interne per il layout corrente"""
+    if orientation is not None:
+        return pd.Series(calculate_tracker_shaded_fraction(
+            solpos, orientation["tracker_theta"].to_numpy(), params["azimuth_pannello"],
+            params["lato_minore"], tracker_pitch(params)
+        ), index=solpos.index)
+    return calculate_row_shaded_fraction(
+        solpos['elevation'], solpos['azimuth'],
+        params["tilt_pannello"], params["azimuth_pannello"],
+        params["lato_minore"], params["carreggiata"]
+    )
+
+
+def calculate_shaded_poa(params: dict, clearsky: pd.DataFrame, solpos: pd.DataFrame,
+                         row_shaded_fraction: pd.Series, orientation: pd.DataFrame = None) -> tuple:
+    """
+    Calcola componenti POA e POA globale con ombreggiamento tra file
+    (con inseguitore: tilt e azimut variabili da orientation)
+
+    Returns:
+        (componenti POA senza ombra, POA globale ombreggiata)
+    """
+    array_shaded_fraction = calculate_array_shaded_fraction(row_shaded_fraction, params["num_rows"])
+
+    if orientation is not None:
+        tilt, azimuth = orientation["surface_tilt"], orientation["surface_azimuth"]
+    else:
+        tilt, azimuth = params["tilt_pannello"], params["azimuth_pannello"]
+    poa = calculate_poa_components(clearsky, solpos, tilt, azimuth, params["albedo"])
+    return poa, apply_beam_shading(poa, array_shaded_fraction)
+
+
+def assemble_pv_results(times: pd.DatetimeIndex, solpos: pd.DataFrame, clearsky: pd.DataFrame,
+                        poa: pd.DataFrame, poa_global: pd.Series, row_shaded_fraction: pd.Series,
+                        T_amb: pd.Series, geometry: dict, production: dict,
+                        area_pannello: float, num_panels_total: int) -> PVResults:
+    """
+    Assembla i risultati PV in un contenitore compatto: serie in un unico
+    blocco float32, totali (GHI_Whm2, energy_total_Wh, ...) calcolati su richiesta
+    """
+    series = {
+        "GHI_Wm2": clearsky['ghi'],
+        "DNI_Wm2": clearsky['dni'],
+        "DHI_Wm2": clearsky['dhi'],
+        "POA_Wm2": poa_global,
+        "POA_unshaded_Wm2": poa['poa_global'],
+        "row_shaded_fraction": row_shaded_fraction,
+        "T_amb": T_amb,
+        "T_cell": production["T_cell"],
+        "sun_zenith": solpos['zenith'],
+        "sun_elevation": solpos['elevation'],
+        "sun_azimuth": solpos['azimuth'],
+        "power_single_W": production["power_single_W"],
+        "power_total_W": production["power_total_W"],
+    }
+    return PVResults(
+        times, series,
+        area_pannello=area_pannello,
+        num_panels_total=num_panels_total,
+        **geometry
+    )
+
+
+def calculate_all_pv(params: dict) -> PVResults:
     """
     Calcola tutti i parametri PV
     """
     # Serie temporale oraria
-    times = pd.date_range(
-        start=pd.Timestamp(params["data"]),
-        end=pd.Timestamp(params["data"]) + pd.Timedelta(days=1) - pd.Timedelta(hours=1),
-        freq="1h",
-        tz=params["timezone"]
-    )
+    times = build_time_index(params)
     
     # Calcoli geometrici
-    panel_metrics = calculate_panel_metrics(params)
-    max_panels_info = calculate_max_panels(params)
-    occupied_space = calculate_occupied_space(params, panel_metrics)
+    geometry = calculate_geometry(params)
     
     # Calcoli solari
     solpos = calculate_solar_position(times, params["lat"], params["lon"])
-    clearsky = calculate_clearsky_irradiance(times, params["lat"], params["lon"], str(params["timezone"]))
-    poa_global = calculate_poa_global(clearsky, solpos, params["tilt_pannello"], 
-                                      params["azimuth_pannello"], params["albedo"])
+    clearsky = calculate_clearsky_irradiance(times, params["lat"], params["lon"], str(params["timezone"]), solpos)
+
+    # Orientamento (None per impianto fisso) e ombreggiamento reciproco tra file (solo componente diretta)
+    orientation = calculate_orientation(params, times, solpos)
+    row_shaded_fraction = calculate_row_shading(params, solpos, orientation)
+    poa, poa_global = calculate_shaded_poa(params, clearsky, solpos, row_shaded_fraction, orientation)
     T_amb = estimate_ambient_temperature(times, params["lat"])
     
     # Produzione elettrica
     production = calculate_pv_production(params, poa_global, T_amb)
     
     # Assemblaggio risultati
-    return {
-        # Serie temporali
-        "times": times,
-        "GHI_Wm2": clearsky['ghi'].round(0).astype(int),
-        "DNI_Wm2": clearsky['dni'].round(0).astype(int),
-        "DHI_Wm2": clearsky['dhi'].round(0).astype(int),
-        "POA_Wm2": poa_global,
-        "T_amb": T_amb.round(1),
-        "solpos": solpos,
-        
-        # Totali giornalieri
-        "GHI_Whm2": clearsky['ghi'].sum().round(0).astype(int),
-        "DNI_Whm2": clearsky['dni'].sum().round(0).astype(int),
-        "DHI_Whm2": clearsky['dhi'].sum().round(0).astype(int),
-        "POA_Whm2": poa_global.sum().round(0).astype(int),
-        
-        # Metriche geometriche
-        **panel_metrics,
-        **occupied_space,
-        **max_panels_info,
-        
-        # Produzione elettrica
-        **production
-    }
\ No newline at end of file
+    return assemble_pv_results(times, solpos, clearsky, poa, poa_global,
+                               row_shaded_fraction, T_amb, geometry, production,
+                               params["area_pannello"], params["num_panels_total"])
@@ -0,0 +1,139 @@
+"""
+Modulo Grafici - Serie temporali interattive di produzione e agronomia
+Le serie lunghe (annuali o sub-orarie) vengono ridotte lato server con
+LTTB (Largest-Triangle-Three-Buckets), che conserva picchi e forma della
+curva: al browser arrivano al massimo max_points punti per traccia.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import CHART_CONFIG
+from agri_calculations import calculate_par_contributions
+
+
+# ==================== DOWNSAMPLING LTTB ====================
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indici dei punti scelti da LTTB (primo e ultimo sempre inclusi)
+
+    I punti interni sono divisi in n_out - 2 bucket; in ciascuno si sceglie
+    il punto che forma il triangolo di area massima con il punto scelto nel
+    bucket precedente e la media del bucket successivo.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    # Media di ogni bucket (per il bucket successivo) con somme cumulative
+    cx, cy = np.r_[0, np.cumsum(x)], np.r_[0, np.cumsum(y)]
+    counts = np.maximum(np.diff(edges), 1)
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / counts
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / counts
+    # L'ultimo bucket punta all'ultimo punto della serie
+    mean_x, mean_y = np.r_[mean_x[1:], x[-1]], np.r_[mean_y[1:], y[-1]]
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs(
+            (x[a] - mean_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[b] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+
+    return selected
+
+
+def downsample(series: pd.Series, n_out: int = None) -> pd.Series:
+    """Serie ridotta con LTTB (invariata se già abbastanza corta)"""
+    n_out = n_out or CHART_CONFIG["max_points"]
+    if len(series) <= n_out:
+        return series
+    x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else np.arange(len(series))
+    return series.iloc[lttb_indices(x, series.to_numpy(), n_out)]
+
+
+def chart_frame(curves: dict, n_out: int = None) -> pd.DataFrame:
+    """
+    Formato lungo (time, valore, serie) con ogni traccia ridotta in modo
+    indipendente: ogni curva conserva i propri picchi
+    """
+    frames = []
+    for name, series in curves.items():
+        reduced = downsample(series, n_out)
+        frames.append(pd.DataFrame({
+            "time": reduced.index.tz_localize(None) if reduced.index.tz is not None else reduced.index,
+            "valore": reduced.to_numpy(dtype=float),
+            "serie": name,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ==================== SERIE DA VISUALIZZARE ====================
+
+def dli_curve(results) -> pd.Series:
+    """
+    DLI nel tempo: accumulo nella giornata (simulazione di un giorno)
+    oppure DLI di ogni giorno (periodi più lunghi)
+    """
+    agri = results["agri_results"]
+    par = calculate_par_contributions(results["GHI_Wm2"].astype(float), agri["shaded_fraction"].astype(float))
+    if results.step_hours * len(results["times"]) <= 24:
+        return par.cumsum()
+    return par.resample("D").sum()
+
+
+def chart_groups(results) -> dict:
+    """Grafici: titolo -> {nome traccia: serie}"""
+    agri = results["agri_results"]
+    return {
+        "Irradianza [W/m²]": {
+            "POA": results["POA_Wm2"],
+            "POA senza ombre tra file": results["POA_unshaded_Wm2"],
+            "GHI": results["GHI_Wm2"],
+        },
+        "Potenza [kW]": {
+            "Potenza totale": results["power_total_W"] / 1000,
+        },
+        "Temperatura [°C]": {
+            "Celle": results["T_cell"],
+            "Ambiente": results["T_amb"],
+        },
+        "Ombreggiamento campo [%]": {
+            "Frazione ombreggiata": agri["shaded_fraction"] * 100,
+        },
+        "DLI [mol/m²·d]": {
+            "DLI": dli_curve(results),
+        },
+    }
+
+
+# ==================== FUNZIONE PRINCIPALE ====================
+
+def display_charts(results):
+    """Visualizza i grafici delle serie temporali (un tab per grafico)"""
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        '📈 Analisi Dettagliata'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    # Risultati immutabili: la riduzione si calcola una volta per simulazione
+    frames = results.memo(
+        ("charts", CHART_CONFIG["max_points"]),
+        lambda: {title: chart_frame(curves) for title, curves in chart_groups(results).items()}
+    )
+    tabs = st.tabs(list(frames))
+    for tab, (title, frame) in zip(tabs, frames.items()):
+        with tab:
+            st.line_chart(frame, x="time", y="valore", color="serie", x_label="", y_label=title)
@@ -3,6 +3,7 @@ Configurazione centralizzata per PV Simulator
 Contiene: costanti, parametri default, stili CSS, configurazioni UI
 """
 
+import os
 from zoneinfo import ZoneInfo
 
 # ==================== COSTANTI FISICHE ====================
@@ -10,6 +11,10 @@ HECTARE_M2 = 10000  # 1 ettaro in m²
 TIMEZONE = "Europe/Rome"
 TIMEZONE_OBJ = ZoneInfo(TIMEZONE)
 
+# Versione dei modelli di calcolo: entra nella chiave di cache e archivio,
+# va incrementata quando una modifica cambia i risultati a parità di input
+MODEL_VERSION = 3
+
 # ==================== PARAMETRI DEFAULT ====================
 DEFAULT_PARAMS = {
     # Localizzazione
@@ -28,16 +33,180 @@ DEFAULT_PARAMS = {
     "pitch_laterale": 3.0,  # m - centro-centro pannelli
     "tilt": 30,  # gradi
     "azimuth": 180,  # gradi (Sud)
+
+    # Inseguitore monoassiale (mount = "Monoassiale": azimuth = direzione dell'asse)
+    "mount": "Fisso",  # "Fisso" o "Monoassiale"
+    "max_angle": 60.0,  # gradi - rotazione massima dell'inseguitore
+    "backtrack": True,  # backtracking contro l'ombreggiamento tra file
+    "steer_window_h": 0.0,  # ore attorno al mezzogiorno solare con deviazione per le colture
+    "steer_fraction": 0.0,  # deviazione verso il taglio (0 = backtracking, 1 = parallelo ai raggi)
     
     # Caratteristiche elettriche
     "eff": 0.20,  # efficienza 20%
     "noct": 45.0,  # °C
+    "temp_model": "NOCT",  # modello temperatura celle (vedi TEMPERATURE_MODELS)
+    "wind_speed": 1.0,  # m/s - vento (modelli Faiman e SAPM)
+    "thermal_tau_min": 0.0,  # min - costante di tempo termica (0 = regime stazionario)
     "temp_coeff": -0.004,  # %/°C
     "losses": 0.10,  # perdite di sistema 10%
     "albedo": 0.2,  # riflettanza del suolo
     
+    # Periodo simulato
+    "periodo": "Giorno",  # "Giorno" (data selezionata) o "Anno" (anno della data)
+    "risoluzione_min": 60,  # passo temporale in minuti
+
     # Superficie terreno
     "hectares": 1.0,  # ettari totali del campo
+    "setback": 0.0,  # m - fascia di rispetto dal confine (solo con poligono del campo)
+}
+
+# ==================== GEOCODING ====================
+GEOCODING_CONFIG = {
+    "debounce_s": 0.8,  # attesa dopo l'ultima modifica del comune prima della ricerca
+    "timeout_s": 8.0,  # timeout massimo complessivo di una ricerca (retry inclusi)
+    "poll_s": 0.5,  # intervallo di controllo del risultato in background
+    "max_workers": 2,  # thread dedicati al geocoding (condivisi tra sessioni)
+}
+
+# ==================== CIELO SERENO ====================
+CLEARSKY_CONFIG = {
+    # tabella torbidità di Linke convertita in .npy (memory-map condivisa tra processi)
+    "cache_dir": os.environ.get("APV_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "apv-app")),
+}
+
+# ==================== CACHE RISULTATI ====================
+CACHE_CONFIG = {
+    "max_mb": 256,  # tetto di memoria della cache condivisa tra sessioni
+}
+
+# ==================== ARCHIVIO SCENARI ====================
+STORE_CONFIG = {
+    "enabled": os.environ.get("APV_STORE", "1") != "0",
+    # indice SQLite + serie in Parquet, indirizzati dall'hash degli input
+    "path": os.environ.get("APV_STORE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "apv-app", "scenari")),
+    "max_mb": 1024,  # oltre questa dimensione si eliminano gli scenari usati meno di recente
+    "list_limit": 50,  # scenari mostrati nella sidebar
+}
+
+# ==================== ESECUZIONE PARALLELA ====================
+PARALLEL_CONFIG = {
+    # processi per le simulazioni lunghe (1 = sempre in serie): di default in
+    # serie, il pool "spawn" richiede la guardia __main__ negli script chiamanti
+    "workers": int(os.environ.get("APV_WORKERS", 1)),
+    # processi usati dall'app e dal job regionale (che attivano il pool esplicitamente)
+    "app_workers": int(os.environ.get("APV_WORKERS", os.cpu_count() or 1)),
+    "min_steps": 8760,  # passi temporali da cui conviene dividere in blocchi (anno orario)
+    "chunks_per_worker": 2,  # blocchi per processo (bilanciamento del carico)
+}
+
+# ==================== BATCH MULTI-SITO ====================
+BATCH_CONFIG = {
+    # serie orarie scritte su disco (array memory-mapped float32 siti × tempi)
+    "series": ("GHI_Wm2", "POA_Wm2", "T_cell", "power_total_W", "shaded_fraction"),
+    "chunk_sites": 100,  # siti per blocco di calcolo (memoria intermedia ~150 MB su un anno orario)
+}
+
+# ==================== POTENZIALE REGIONALE ====================
+REGIONAL_CONFIG = {
+    "bounds": (35.4, 47.1, 6.6, 18.6),  # lat min, lat max, lon min, lon max (Italia)
+    "cell_km": 1.0,  # lato cella della griglia
+    "chunk_sites": 2000,  # celle per blocco (checkpoint)
+    "path": os.environ.get("APV_REGIONAL_DIR", os.path.join(os.path.expanduser("~"), ".cache", "apv-app", "regionale")),
+}
+
+# ==================== TILE DELLA MAPPA ====================
+TILES_CONFIG = {
+    # piramide XYZ di PNG generata al primo accesso e riutilizzata
+    "path": os.environ.get("APV_TILES_DIR", os.path.join(os.path.expanduser("~"), ".cache", "apv-app", "tiles")),
+    "host": "127.0.0.1",
+    "port": int(os.environ.get("APV_TILES_PORT", "8766")),  # 0 = porta libera qualsiasi
+    "public_url": os.environ.get("APV_TILES_URL"),  # URL visto dal browser (es. dietro proxy)
+    "max_native_zoom": 11,  # oltre, Leaflet ingrandisce i tile esistenti (griglia ~1 km)
+    "opacity": 0.7,
+}
+
+# ==================== ANALISI ECONOMICA ====================
+ECONOMICS_CONFIG = {
+    # CSV locale di prezzi orari [€/MWh] (es. PUN o prezzo zonale GME): colonne
+    # data/ora o timestamp + una colonna per zona; senza file si usa il prezzo fisso
+    "price_csv": os.environ.get("APV_PRICE_CSV"),
+    "price_eur_mwh": 110.0,  # prezzo fisso di riferimento
+    "capex_eur_kwp": 1300.0,  # investimento (strutture agrivoltaiche elevate)
+    "opex_eur_kwp_y": 20.0,  # O&M annuo
+    "life_years": 25,  # vita utile
+    "discount_rate": 0.06,  # tasso di attualizzazione (WACC reale)
+    "degradation": 0.005,  # perdita annua di produzione
+    "price_escalation": 0.0,  # variazione annua dei prezzi
+}
+
+# ==================== ACCUMULO A BATTERIA ====================
+STORAGE_CONFIG = {
+    # CSV locale del carico aziendale [kW] (irrigazione, celle frigo): stessi
+    # formati dei prezzi (timestamp, Data/Ora o giorno tipo con sola Ora)
+    "load_csv": os.environ.get("APV_LOAD_CSV"),
+    "load_kw": 5.0,  # carico costante senza profilo
+    "capacity_kwh": 20.0,
+    "power_kw": 10.0,  # potenza massima di carica/scarica
+    "efficiency": 0.90,  # rendimento di ciclo (carica × scarica)
+    "soc_min": 0.10,  # stato di carica minimo (frazione della capacità)
+    "sweep_max_kwh": 100.0,  # capacità massima dello sweep
+    "sweep_steps": 21,
+}
+
+# ==================== ANALISI MONTE CARLO ====================
+MONTE_CARLO_CONFIG = {
+    "samples": 10000,  # numero di campioni
+    "seed": 42,  # seed riproducibile
+    "chunk_bytes": 32 * 2**20,  # byte per matrice campioni × tempi (float32) di ogni blocco
+    "levels": (10, 50, 75, 90, 99),  # livelli di superamento Pxx riportati
+    "nominal_tolerance": 0.001,  # scarto relativo ammesso tra campione nominale e pipeline
+}
+
+# Scostamenti assoluti rispetto al valore nominale dei parametri incerti
+UNCERTAINTY_DISTRIBUTIONS = {
+    "eff": {"dist": "normal", "sd": 0.006, "clip": (0.01, 0.5)},
+    "losses": {"dist": "triangular", "low": -0.04, "high": 0.06, "clip": (0.0, 0.5)},
+    "temp_coeff": {"dist": "normal", "sd": 0.0005, "clip": (-0.01, 0.0)},
+    "albedo": {"dist": "uniform", "half_width": 0.05, "clip": (0.0, 1.0)},
+    "transmission_under": {"dist": "uniform", "half_width": 0.10, "clip": (0.0, 1.0)},
+}
+
+# ==================== SERVIZIO HTTP ====================
+SERVER_CONFIG = {
+    "host": "127.0.0.1",  # solo localhost di default
+    "port": 8765,
+    "workers": 2,  # processi di calcolo (pvlib già importato e tabelle precaricate)
+    "max_pending": 16,  # richieste in coda/esecuzione oltre le quali si risponde 503
+    "request_timeout_s": 60.0,  # oltre si risponde 504
+    "max_body_bytes": 1024 * 1024,
+    "max_items": 64,  # valori per sweep / simulazioni per batch
+    # Obiettivi di latenza [ms] con worker caldi, simulazione giornaliera oraria
+    # (annuale a 15 min: ~10x); verificati da /health sulle richieste servite
+    "latency_targets_ms": {
+        "simulate": {"p50": 50, "p95": 150},
+        "sweep": {"p50": 250, "p95": 600},  # 10 valori
+        "batch": {"p50": 400, "p95": 1000},  # 10 simulazioni
+    },
+}
+
+# ==================== SENSITIVITÀ ====================
+# Parametri perturbati: nome -> (etichetta, passo, tipo passo "rel" | "abs")
+SENSITIVITY_PARAMS = {
+    "tilt_pannello": ("Tilt", 5.0, "abs"),
+    "carreggiata": ("Carreggiata (interfila)", 0.10, "rel"),
+    "pitch_laterale": ("Pitch laterale", 0.10, "rel"),
+    "altezza_suolo": ("Altezza dal suolo", 0.10, "rel"),
+    "eff": ("Efficienza", 0.10, "rel"),
+    "losses": ("Perdite", 0.10, "rel"),
+    "albedo": ("Albedo", 0.10, "rel"),
+    "noct": ("NOCT", 0.10, "rel"),
+}
+
+# ==================== STRATEGIE INSEGUITORE ====================
+TRACKER_SEARCH = {
+    # strategie candidate: finestra attorno al mezzogiorno solare × deviazione
+    "windows_h": (2, 4, 6, 8),
+    "fractions": (0.25, 0.5, 0.75, 1.0),
 }
 
 # ==================== COLORI TEMA ====================
@@ -61,11 +230,27 @@ CHART_CONFIG = {
     "screen_width_fallback": 1200,
     "map_height_mobile": 300,
     "map_height_desktop": 400,
+    "max_points": 1500,  # punti per serie inviati al browser (downsampling LTTB)
+}
+
+# ==================== MODELLI TERMICI ====================
+TEMPERATURE_MODELS = {
+    "NOCT": {},  # T_amb + POA/800·(NOCT − 20), senza vento
+    "Faiman": {"u0": 25.0, "u1": 6.84},  # W/m²K, W·s/m³K (default pvlib)
+    "SAPM": {"a": -3.56, "b": -0.075, "deltaT": 3.0},  # open rack, vetro/polimero
+}
+
+# ==================== LAYOUT SU MAPPA ====================
+MAP_LAYOUT_CONFIG = {
+    "module_zoom": 17,  # zoom minimo per i singoli moduli (sotto: file fuse)
+    "max_modules": 20000,  # oltre questa soglia si disegnano solo le file
+    "precision": 6,  # decimali delle coordinate (~0.1 m)
 }
 
 # ==================== MESSAGGI UI ====================
 MESSAGES = {
     "location_not_found": "Comune non trovato",
+    "location_pending": "🔄 Ricerca coordinate di {comune}...",
     "location_success": "Coordinate: {lat:.4f} °N, {lon:.4f}°E",
 }
 
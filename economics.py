@@ -0,0 +1,346 @@
+"""
+Modulo Economia - Ricavi orari, LCOE e tempo di ritorno
+Post-elaborazione dei risultati (nessun ricalcolo della simulazione): la
+potenza oraria viene valorizzata con una serie locale di prezzi orari
+(es. PUN o prezzo zonale GME) riportata sulle ore simulate per ogni anno
+di prezzi disponibile. Tutto è vettoriale su scenari × tempo (ricavi come
+prodotto matrice energia × prezzi) e su scenari × anni di progetto, per
+cui il costo è trascurabile anche su simulazioni annuali o batch.
+"""
+
+import io
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import ECONOMICS_CONFIG
+from results import time_step_hours
+from metrics import create_metric_card, display_card_group, format_value
+
+TIME_COLUMNS = ("time", "timestamp", "datetime", "data_ora", "dataora")
+SLOTS_PER_YEAR = 12 * 31 * 24  # mese × giorno × ora
+
+
+def economics_params(params: dict) -> dict:
+    """Ipotesi economiche: valori della sidebar/richiesta, altrimenti ECONOMICS_CONFIG"""
+    return {key: params.get(key, default) if params.get(key) is not None else default
+            for key, default in ECONOMICS_CONFIG.items()}
+
+
+def system_kwp(params: dict) -> float:
+    """Potenza di picco [kWp] in condizioni standard (1000 W/m²)"""
+    return params["num_panels_total"] * params["area_pannello"] * params["eff"]
+
+
+# ==================== PREZZI ====================
+
+def read_hourly_csv(source, column: str = None) -> pd.Series:
+    """
+    Serie oraria locale da CSV (prezzi, carichi), indice in ora locale senza fuso
+
+    Formati: una colonna timestamp (time, datetime, ...), oppure "Data"
+    (AAAAMMGG o data) + "Ora" (1-24, come negli export GME), oppure solo
+    "Ora" per un giorno tipo. Valori dalla colonna indicata o dalla prima
+    colonna numerica; virgola decimale ammessa.
+    """
+    frame = pd.read_csv(source, sep=None, engine="python")
+    for name in frame.columns[frame.dtypes == object]:
+        numeric = pd.to_numeric(frame[name].astype(str).str.replace(",", "."), errors="coerce")
+        if numeric.notna().mean() > 0.9:
+            frame[name] = numeric
+    if frame.shape[1] < 2:
+        raise ValueError("CSV: servono almeno una colonna temporale e una di valori")
+    columns = {name.strip().lower(): name for name in frame.columns}
+
+    if "data" in columns and "ora" in columns:
+        day = pd.to_datetime(frame[columns["data"]].astype(str), format="mixed", dayfirst=True)
+        index = day + pd.to_timedelta(pd.to_numeric(frame[columns["ora"]]) - 1, unit="h")
+        time_columns = {columns["data"], columns["ora"]}
+    elif "ora" in columns or "hour" in columns:
+        # Giorno tipo (ripetuto su tutto l'anno da hourly_matrix)
+        name = columns.get("ora", columns.get("hour"))
+        hours = pd.to_numeric(frame[name])
+        index = pd.Timestamp("2000-01-01") + pd.to_timedelta(hours - hours.min(), unit="h")
+        time_columns = {name}
+    else:
+        name = next((columns[c] for c in TIME_COLUMNS if c in columns), frame.columns[0])
+        index = pd.to_datetime(frame[name], format="mixed")
+        if index.dt.tz is not None:
+            index = index.dt.tz_localize(None)
+        time_columns = {name}
+
+    if column is None:
+        candidates = [c for c in frame.columns
+                      if c not in time_columns and pd.api.types.is_numeric_dtype(frame[c])]
+        if not candidates:
+            raise ValueError("CSV: nessuna colonna numerica di valori")
+        column = candidates[0]
+    elif column not in frame.columns:
+        raise ValueError(f"CSV: colonna '{column}' assente")
+
+    prices = pd.Series(pd.to_numeric(frame[column], errors="coerce").to_numpy(),
+                       index=pd.DatetimeIndex(index), name=str(column)).dropna()
+    if prices.empty:
+        raise ValueError("CSV: nessun valore valido")
+    return prices.sort_index()
+
+
+@lru_cache(maxsize=8)
+def _read_csv_file(path: str, mtime: float, column: str = None) -> pd.Series:
+    return read_hourly_csv(path, column)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _read_csv_upload(data: bytes, column: str = None) -> pd.Series:
+    return read_hourly_csv(io.BytesIO(data), column)
+
+
+def load_hourly_series(data: bytes = None, path: str = None, column: str = None):
+    """Serie oraria da file caricato (bytes) o da percorso locale, in cache; None se assente"""
+    if data:
+        return _read_csv_upload(data, column)
+    if path and os.path.exists(path):
+        return _read_csv_file(path, os.path.getmtime(path), column)
+    return None
+
+
+def get_price_series(params: dict):
+    """
+    Prezzi orari dello scenario: file caricato (bytes in params["price_data"]),
+    percorso ECONOMICS_CONFIG["price_csv"] oppure None (prezzo fisso)
+    """
+    return load_hourly_series(params.get("price_data"), params.get("price_csv") or ECONOMICS_CONFIG["price_csv"],
+                              params.get("price_column"))
+
+
+def hourly_matrix(prices: pd.Series, times: pd.DatetimeIndex) -> tuple:
+    """
+    Serie oraria (prezzi, carichi) riportata sulle ore simulate per ogni
+    anno della serie, per mese/giorno/ora locali (l'anno della serie può
+    differire da quello simulato). Buchi (es. 29 febbraio, mesi mancanti,
+    giorno tipo) coperti con la media mese-ora dell'anno, poi con la media
+    per ora del giorno e infine con la media annua.
+
+    Returns:
+        (anni, matrice (n_anni, n_tempi))
+    """
+    idx = prices.index
+    years = np.unique(idx.year)
+    year_pos = np.searchsorted(years, idx.year)
+    values = prices.to_numpy(dtype=float)
+
+    def mean_by(slot: np.ndarray, n_slots: int) -> np.ndarray:
+        sums = np.zeros((len(years), n_slots))
+        counts = np.zeros((len(years), n_slots))
+        np.add.at(sums, (year_pos, slot), values)
+        np.add.at(counts, (year_pos, slot), 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts
+
+    by_day = mean_by(((idx.month - 1) * 31 + idx.day - 1) * 24 + idx.hour, SLOTS_PER_YEAR)
+    by_month = mean_by((idx.month - 1) * 24 + idx.hour, 12 * 24)
+    by_hour = mean_by(idx.hour, 24)
+    yearly = np.array([values[year_pos == i].mean() for i in range(len(years))])
+
+    local = times.tz_localize(None) if times.tz is not None else times
+    day_slot = ((local.month - 1) * 31 + local.day - 1) * 24 + local.hour
+    month_slot = (local.month - 1) * 24 + local.hour
+    matrix = by_day[:, day_slot]
+    matrix = np.where(np.isnan(matrix), by_month[:, month_slot], matrix)
+    matrix = np.where(np.isnan(matrix), by_hour[:, local.hour], matrix)
+    matrix = np.where(np.isnan(matrix), yearly[:, None], matrix)
+    return years, matrix
+
+
+# ==================== CALCOLO ====================
+
+def project_economics(energy_mwh, revenue_eur, kwp, econ: dict) -> dict:
+    """
+    Flussi di cassa del progetto per scenari × anni (broadcasting)
+
+    Args:
+        energy_mwh, revenue_eur: produzione e ricavi del primo anno, (n_scenari,)
+        kwp: potenza di picco, (n_scenari,) o scalare
+
+    Returns:
+        dict con capex, npv, lcoe [€/MWh], payback [anni, NaN se oltre la vita utile]
+        (n_scenari,) e cashflow (n_scenari, vita utile)
+    """
+    energy_mwh, revenue_eur = np.atleast_1d(energy_mwh).astype(float), np.atleast_1d(revenue_eur).astype(float)
+    kwp = np.broadcast_to(np.asarray(kwp, dtype=float), energy_mwh.shape)
+    years = np.arange(1, int(econ["life_years"]) + 1)
+
+    output = (1 - econ["degradation"]) ** (years - 1)
+    discount = (1 + econ["discount_rate"]) ** -years
+    capex = econ["capex_eur_kwp"] * kwp
+    opex = np.broadcast_to((econ["opex_eur_kwp_y"] * kwp)[:, None], (len(kwp), len(years)))
+    energy = energy_mwh[:, None] * output
+    revenue = revenue_eur[:, None] * output * (1 + econ["price_escalation"]) ** (years - 1)
+    cashflow = revenue - opex
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lcoe = (capex + (opex * discount).sum(axis=1)) / (energy * discount).sum(axis=1)
+
+        # Ritorno semplice: primo anno con flussi cumulati >= investimento (interpolato nell'anno)
+        cumulative = np.cumsum(cashflow, axis=1)
+        reached = cumulative >= capex[:, None]
+        year = reached.argmax(axis=1)
+        before = np.where(year > 0, cumulative[np.arange(len(year)), year - 1], 0.0)
+        payback = year + (capex - before) / cashflow[np.arange(len(year)), year]
+        payback = np.where(reached.any(axis=1), payback, np.nan)
+
+    return {
+        "capex": capex,
+        "npv": -capex + (cashflow * discount).sum(axis=1),
+        "lcoe": lcoe,
+        "payback": payback,
+        "cashflow": cashflow,
+    }
+
+
+def calculate_economics(power_w, times: pd.DatetimeIndex, kwp, params: dict, prices: pd.Series = None) -> dict:
+    """
+    Ricavi e indicatori di progetto per uno o più scenari sullo stesso periodo
+
+    Args:
+        power_w: potenza AC [W], (n_tempi,) o (n_scenari, n_tempi)
+        prices: prezzi orari (None = prezzo fisso di ECONOMICS_CONFIG/params)
+
+    Returns:
+        dict di array (n_scenari,): energy_mwh, revenue_eur (media sugli anni di
+        prezzo), captured_price; revenue_by_year (n_scenari, n_anni), price_years;
+        full_year e, solo su un anno intero, capex, npv, lcoe, payback, cashflow
+    """
+    econ = economics_params(params)
+    power = np.atleast_2d(np.asarray(power_w, dtype=float))
+    energy_step = power * time_step_hours(times) / 1e6  # MWh per passo
+    n_days = len(times) * time_step_hours(times) / 24
+
+    if prices is None:
+        price_years, matrix = np.array([0]), np.full((1, len(times)), float(econ["price_eur_mwh"]))
+    else:
+        price_years, matrix = hourly_matrix(prices, times)
+
+    energy = energy_step.sum(axis=1)
+    revenue_by_year = energy_step @ matrix.T  # (n_scenari, n_anni)
+    revenue = revenue_by_year.mean(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        captured = revenue / energy
+
+    result = {
+        "energy_mwh": energy,
+        "revenue_eur": revenue,
+        "captured_price": captured,
+        "revenue_by_year": revenue_by_year,
+        "price_years": price_years,
+        "full_year": n_days >= 365,
+    }
+    if result["full_year"]:
+        result.update(project_economics(energy, revenue, kwp, econ))
+    return result
+
+
+def batch_economics(batch, params: dict, prices: pd.Series = None, chunk_sites: int = 1000) -> pd.DataFrame:
+    """
+    Indicatori economici per ogni sito di un batch su disco (batch.py),
+    leggendo la potenza memory-mapped a blocchi di siti
+    """
+    power = batch.values("power_total_W")
+    kwp = system_kwp(params)
+    frames = []
+    for start in range(0, batch.n_sites, chunk_sites):
+        eco = calculate_economics(power[start:start + chunk_sites], batch.times, kwp, params, prices)
+        frames.append(pd.DataFrame({
+            key: eco[key] for key in ("energy_mwh", "revenue_eur", "captured_price", "lcoe", "npv", "payback")
+            if key in eco
+        }))
+    frame = pd.concat(frames, ignore_index=True)
+    frame.insert(0, "lat", np.asarray(batch.lat))
+    frame.insert(1, "lon", np.asarray(batch.lon))
+    return frame
+
+
+def scenario_economics(computed: dict, scenario_params: dict, params: dict) -> dict:
+    """
+    Indicatori per tutti gli scenari confrontati (una sola operazione per
+    gruppo di scenari sugli stessi istanti), con le ipotesi economiche correnti
+
+    Args:
+        scenario_params: parametri di ogni scenario (per la potenza di picco)
+    """
+    prices = get_price_series(params)
+    # Raggruppati per indice temporale (non per lunghezza: date o periodi
+    # diversi con lo stesso numero di passi hanno prezzi diversi)
+    groups = []
+    for name, results in computed.items():
+        for times, names in groups:
+            if times.equals(results["times"]):
+                names.append(name)
+                break
+        else:
+            groups.append((results["times"], [name]))
+
+    out = {}
+    for times, names in groups:
+        power = np.stack([computed[name].values("power_total_W") for name in names])
+        kwp = [system_kwp(scenario_params[name]) for name in names]
+        eco = calculate_economics(power, times, kwp, params, prices)
+        for i, name in enumerate(names):
+            out[name] = {key: value[i] for key, value in eco.items()
+                         if isinstance(value, np.ndarray) and value.ndim and len(value) == len(names)}
+    return out
+
+
+# ==================== VISUALIZZAZIONE ====================
+
+def display_economics_section(results, params: dict):
+    """Sezione economica: ricavi, prezzo catturato, LCOE, VAN e tempo di ritorno"""
+    try:
+        prices = get_price_series(params)
+    except (ValueError, OSError) as e:
+        st.warning(f"File prezzi non valido ({e}): uso il prezzo fisso")
+        prices = None
+
+    eco = calculate_economics(results.values("power_total_W"), results["times"], system_kwp(params),
+                              params, prices)
+    econ = economics_params(params)
+
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Analisi Economica'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    source = (f"prezzi orari {prices.name}, anni {', '.join(map(str, eco['price_years']))}"
+              if prices is not None else f"prezzo fisso {econ['price_eur_mwh']:.0f} €/MWh")
+    cards = [
+        create_metric_card("Ricavi", format_value(eco["revenue_eur"][0], "€", 0),
+                           f"Produzione valorizzata ora per ora ({source})"),
+        create_metric_card("Prezzo catturato", format_value(eco["captured_price"][0], "€/MWh", 1),
+                           "Ricavo medio per MWh prodotto"),
+    ]
+    if eco["full_year"]:
+        payback = eco["payback"][0]
+        cards += [
+            create_metric_card("LCOE", format_value(eco["lcoe"][0], "€/MWh", 1),
+                               f"Costo livellato su {econ['life_years']} anni al {econ['discount_rate'] * 100:.1f}%"),
+            create_metric_card("VAN", format_value(eco["npv"][0], "€", 0),
+                               f"Investimento {format_value(eco['capex'][0], '€', 0)}"),
+            create_metric_card("Tempo di ritorno",
+                               format_value(payback, "anni", 1) if np.isfinite(payback) else "oltre la vita utile",
+                               "Flussi cumulati non attualizzati"),
+        ]
+    display_card_group(cards)
+
+    if not eco["full_year"]:
+        st.caption("LCOE, VAN e tempo di ritorno richiedono una simulazione annuale (periodo 'Anno').")
+    if len(eco["price_years"]) > 1:
+        st.dataframe(pd.DataFrame({
+            "Anno prezzi": eco["price_years"],
+            "Ricavi [€]": eco["revenue_by_year"][0],
+            "Prezzo catturato [€/MWh]": eco["revenue_by_year"][0] / eco["energy_mwh"][0],
+        }).round(1), width="stretch", hide_index=True)
@@ -0,0 +1,306 @@
+"""
+Modulo Export - Esportazione risultati orari e aggregati (CSV, Parquet, Excel)
+La scrittura avviene a blocchi: per simulazioni pluriennali o multi-sito
+la memoria resta costante indipendentemente dalla dimensione dell'output.
+"""
+
+import io
+import os
+import tempfile
+import zipfile
+from numbers import Number
+
+import pandas as pd
+import streamlit as st
+
+from results import ResultBlock
+from cache import params_hash
+
+
+# ==================== COSTANTI ====================
+
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "mime": "text/csv"},
+    "parquet": {"label": "Parquet", "mime": "application/octet-stream"},
+    "xlsx": {"label": "Excel", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+}
+
+EXCEL_MAX_ROWS = 1_048_575  # righe dati per foglio (esclusa intestazione)
+SUMMARY_SUFFIX = "_riepilogo"
+
+
+# ==================== ESTRAZIONE DATI ====================
+
+def _iter_sections(results):
+    """Risultati PV e, se presenti, agronomici"""
+    yield results
+    if results.get("agri_results") is not None:
+        yield results["agri_results"]
+
+
+def hourly_frame(results) -> pd.DataFrame:
+    """
+    Raccoglie tutte le serie orarie (PV, posizione solare, agronomiche)
+    in un unico DataFrame indicizzato sul tempo
+    """
+    if isinstance(results, ResultBlock):
+        frames = [section.to_frame() for section in _iter_sections(results)]
+        return pd.concat(frames, axis=1) if len(frames) > 1 else frames[0]
+
+    times = results["times"]
+    columns = {}
+
+    for section in _iter_sections(results):
+        for key, value in section.items():
+            if isinstance(value, pd.Series) and value.index.equals(times) and key not in columns:
+                columns[key] = value
+            elif isinstance(value, pd.DataFrame) and value.index.equals(times):
+                for col in ("zenith", "elevation", "azimuth"):
+                    if col in value:
+                        columns.setdefault(f"sun_{col}", value[col])
+
+    frame = pd.DataFrame(columns, index=times)
+    frame.index.name = "time"
+    return frame
+
+
+def summary_frame(results, params: dict = None) -> pd.DataFrame:
+    """
+    Riga unica con tutti i valori aggregati (ed eventualmente gli input
+    scalari, con prefisso "input_")
+    """
+    row = {}
+
+    if params:
+        for key, value in params.items():
+            if isinstance(value, (Number, str)):
+                row[f"input_{key}"] = value
+            elif key == "data":
+                row[f"input_{key}"] = str(value)
+
+    for section in _iter_sections(results):
+        values = section.scalars() if isinstance(section, ResultBlock) else section
+        for key, value in values.items():
+            if isinstance(value, (Number, str)) and not isinstance(value, bool):
+                row.setdefault(key, value)
+
+    return pd.DataFrame([row])
+
+
+def _excel_ready(frame: pd.DataFrame) -> pd.DataFrame:
+    """Excel non supporta datetime con fuso orario: si usa l'ora locale"""
+    frame = frame.reset_index()
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.DatetimeTZDtype):
+            frame[col] = frame[col].dt.tz_localize(None)
+    return frame
+
+
+# ==================== SCRITTURA A BLOCCHI ====================
+
+class ChunkedWriter:
+    """
+    Scrive DataFrame a blocchi su un unico file senza tenerli in memoria:
+    CSV in append, Parquet un row group per blocco, Excel in modalità
+    write-only (nuovo foglio al superamento del limite di righe).
+    """
+
+    def __init__(self, path: str, fmt: str = None, sheet_name: str = "Orario"):
+        self.path = path
+        self.fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+        if self.fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Formato di export non supportato: '{self.fmt}'")
+        self.sheet_name = sheet_name
+        self.rows_written = 0
+        self._handle = None
+        self._columns = None
+        self._sheet_rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, frame: pd.DataFrame, index: bool = True):
+        """Accoda un blocco (le colonne devono coincidere con il primo blocco)"""
+        if self._columns is None:
+            self._columns = list(frame.columns)
+        elif list(frame.columns) != self._columns:
+            frame = frame.reindex(columns=self._columns)
+
+        getattr(self, f"_write_{self.fmt}")(frame, index)
+        self.rows_written += len(frame)
+
+    def _write_csv(self, frame: pd.DataFrame, index: bool):
+        if self._handle is None:
+            self._handle = open(self.path, "w", newline="", encoding="utf-8")
+            frame.to_csv(self._handle, index=index)
+        else:
+            frame.to_csv(self._handle, index=index, header=False)
+
+    def _write_parquet(self, frame: pd.DataFrame, index: bool):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Export Parquet non disponibile: installare 'pyarrow'") from e
+
+        table = pa.Table.from_pandas(frame, preserve_index=index)
+        if self._handle is None:
+            self._handle = pq.ParquetWriter(self.path, table.schema)
+        self._handle.write_table(table.cast(self._handle.schema))
+
+    def _write_xlsx(self, frame: pd.DataFrame, index: bool):
+        try:
+            from openpyxl import Workbook
+        except ImportError as e:
+            raise ImportError("Export Excel non disponibile: installare 'openpyxl'") from e
+
+        frame = _excel_ready(frame) if index else _excel_ready(frame).iloc[:, 1:]
+        if self._handle is None:
+            self._handle = {"workbook": Workbook(write_only=True), "sheet": None, "n": 0}
+
+        for row in frame.itertuples(index=False, name=None):
+            if self._handle["sheet"] is None or self._sheet_rows >= EXCEL_MAX_ROWS:
+                self._handle["n"] += 1
+                suffix = "" if self._handle["n"] == 1 else f"_{self._handle['n']}"
+                self._handle["sheet"] = self._handle["workbook"].create_sheet(f"{self.sheet_name}{suffix}")
+                self._handle["sheet"].append(list(frame.columns))
+                self._sheet_rows = 0
+            self._handle["sheet"].append(list(row))
+            self._sheet_rows += 1
+
+    def add_excel_sheet(self, frame: pd.DataFrame, sheet_name: str):
+        """Aggiunge un foglio separato (solo Excel, es. riepilogo)"""
+        if self.fmt != "xlsx" or self._handle is None:
+            raise ValueError("Fogli aggiuntivi disponibili solo per export Excel già avviato")
+        sheet = self._handle["workbook"].create_sheet(sheet_name)
+        sheet.append(list(frame.columns))
+        for row in frame.itertuples(index=False, name=None):
+            sheet.append(list(row))
+
+    def close(self):
+        if self._handle is None:
+            return
+        if self.fmt == "xlsx":
+            self._handle["workbook"].save(self.path)
+        else:
+            self._handle.close()
+        self._handle = None
+
+
+# ==================== API ====================
+
+def summary_path(path: str) -> str:
+    """Percorso del file di riepilogo affiancato (CSV/Parquet)"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}{SUMMARY_SUFFIX}{ext}"
+
+
+def stream_results(runs, path: str, fmt: str = None, label_key: str = "scenario") -> int:
+    """
+    Esporta una sequenza di simulazioni (es. mesi, anni o siti) blocco per
+    blocco. Ogni elemento è un risultato o una tupla (etichetta, risultato,
+    params); le serie orarie vengono scritte subito e scartate.
+
+    CSV/Parquet: file orario + file "<nome>_riepilogo". Excel: fogli
+    "Orario" e "Riepilogo" nello stesso file.
+
+    Returns:
+        numero di righe orarie scritte
+    """
+    summaries = []
+
+    with ChunkedWriter(path, fmt) as writer:
+        for i, run in enumerate(runs):
+            label, results, params = run if isinstance(run, tuple) else (i, run, None)
+
+            frame = hourly_frame(results)
+            frame.insert(0, label_key, label)
+            writer.write(frame)
+
+            summary = summary_frame(results, params)
+            summary.insert(0, label_key, label)
+            summaries.append(summary)
+
+        summary = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame()
+        if writer.fmt == "xlsx" and writer.rows_written:
+            writer.add_excel_sheet(_excel_ready(summary).iloc[:, 1:], "Riepilogo")
+
+    if writer.fmt != "xlsx":
+        with ChunkedWriter(summary_path(path), writer.fmt) as summary_writer:
+            summary_writer.write(summary, index=False)
+
+    return writer.rows_written
+
+
+def export_results(results, path: str, fmt: str = None, params: dict = None) -> int:
+    """Esporta una singola simulazione (serie orarie + riepilogo)"""
+    label = params.get("comune", 0) if params else 0
+    return stream_results([(label, results, params)], path, fmt)
+
+
+def export_to_bytes(results, fmt: str, params: dict = None) -> tuple:
+    """
+    Export in memoria per il download dall'interfaccia
+
+    Returns:
+        (dati, estensione): Excel in un unico file, CSV/Parquet come zip
+        con file orario e riepilogo
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"risultati.{fmt}")
+        export_results(results, path, fmt, params)
+
+        if fmt == "xlsx":
+            with open(path, "rb") as f:
+                return f.read(), fmt
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for file_path in (path, summary_path(path)):
+                archive.write(file_path, os.path.basename(file_path))
+        return buffer.getvalue(), "zip"
+
+
+# ==================== INTERFACCIA ====================
+
+def display_export_section(results, params: dict):
+    """Sezione download dei risultati completi"""
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Esportazione Risultati'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    col1, col2 = st.columns([1, 2], gap="medium")
+    fmt = col1.selectbox(
+        "Formato",
+        options=list(EXPORT_FORMATS),
+        format_func=lambda f: EXPORT_FORMATS[f]["label"],
+        help="Serie orarie e valori aggregati della simulazione"
+    )
+
+    # File generato solo su richiesta (su serie annuali Excel/CSV richiedono secondi)
+    # e conservato nella sessione finché input e formato non cambiano
+    export_key = (params_hash(params), fmt)
+    prepared = st.session_state.get("export_file")
+    if prepared is None or prepared[0] != export_key:
+        if not col2.button("📦 Prepara file"):
+            return
+        try:
+            prepared = (export_key, *export_to_bytes(results, fmt, params))
+        except ImportError as e:
+            col2.warning(str(e))
+            return
+        st.session_state["export_file"] = prepared
+
+    _, data, ext = prepared
+    col2.download_button(
+        "⬇️ Scarica risultati",
+        data=data,
+        file_name=f"simulazione_{params.get('comune', 'sito')}_{params.get('data', '')}.{ext}",
+        mime=EXPORT_FORMATS[fmt]["mime"] if ext == fmt else "application/zip"
+    )
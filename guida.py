@@ -89,11 +89,14 @@ def tab_introduzione():
        • Localizzazione e Geometria
        • Parametri Elettrici e Colturali
        ↓
+    ORCHESTRAZIONE (pipeline.py)
+       • Grafo delle fasi: rieseguite solo quelle a valle degli input modificati
+       ↓
     2. CALCOLI FOTOVOLTAICI (calculations.py)
        • Posizione solare oraria (pvlib.solarposition)
        • Irradianza clearsky (pvlib.clearsky)
-       • POA (trasposizione sul piano inclinato)
-       • Temperatura celle (modello NOCT)
+       • POA (trasposizione sul piano inclinato, fisso o con inseguitore)
+       • Temperatura celle (NOCT, Faiman o SAPM, inerzia termica opzionale)
        • Potenza DC/AC con correzione efficienza
        ↓
     3. CALCOLI AGRIVOLTAICI (agri_calculations.py)
@@ -105,7 +108,7 @@ def tab_introduzione():
        ↓
     4. OUTPUT METRICHE (metrics.py)
        • KPI energetici e agronomici visualizzati in card
-       • Grafici temporali e indicatori di performance
+       • Grafici temporali (charts.py, serie lunghe ridotte con LTTB)
     ```
     """)
 
@@ -122,9 +125,10 @@ def tab_input_utente():
     
     | Parametro | Descrizione | Implementazione |
     |-----------|------------|----------------|
-    | Comune | Località della simulazione | Geocoding tramite `geopy.Nominatim` con caching |
+    | Comune | Località della simulazione | Geocoding tramite `geopy.Nominatim` con caching, in background con debounce e timeout |
     | Latitudine e Longitudine | Coordinate geografiche del sito | Derivate dal Geocoding o inserite manualmente |
     | Data | Giorno della simulazione | Serie temporale oraria (24 ore) |
+    | Periodo e Risoluzione | Giorno o intero anno, passo 60/30/15 min | Energie e DLI integrati con il passo effettivo (DLI medio giornaliero) |
     
     ### ⚙️ Parametri Pannelli
     
@@ -160,17 +164,30 @@ def tab_calculations():
     - **Superficie Libera:** Area Totale Campo − Proiezione Totale Pannelli
     - **Ground Cover Ratio (GCR):** frazione di suolo coperta
       $$\text{GCR} = \frac{\text{Proiezione Totale Pannelli}}{\text{Superficie Totale Campo}}$$
+    - **Pannelli installabili:** senza poligono il campo è approssimato come un quadrato di lato $\sqrt{\text{Superficie}}$;
+      con il poligono reale (disegnato sulla mappa o da GeoJSON, modulo `layout.py`) le file vengono orientate secondo l'azimut
+      e impaccate nel campo ridotto della fascia di rispetto
     
     ### ☀️ Calcoli Solari
     
     - Posizione Solare oraria: `pvlib.solarposition.get_solarposition`
     - Irradianza Clearsky: `pvlib.location.Location.get_clearsky(model="ineichen")`
     - Irradianza sul piano inclinato (POA): `pvlib.irradiance.get_total_irradiance`
+    - **Ombreggiamento tra file** (angolo di profilo $\alpha_p$, interasse $P = L_{minore} + \text{Carreggiata}$, lo stesso del layout):
+      $$f_{ombra} = 1 - \frac{P \cdot \sin\alpha_p}{L_{minore} \cdot \sin(\alpha_p + \beta)}$$
+      applicata alla sola componente diretta delle file successive alla prima
+    - **Inseguitore monoassiale:** rotazione da `pvlib.tracking.singleaxis` (backtracking con il GCR del layout),
+      ombre tra file con `pvlib.shading.shaded_fraction1d`; attorno al mezzogiorno solare la rotazione può essere
+      deviata verso il taglio $\theta = \theta_{track} + d \cdot (\theta_{taglio} - \theta_{track})$ per dare più luce
+      alle colture. Le strategie candidate (finestra × deviazione, `tracking.py`) sono valutate in blocco e
+      confrontate su energia e DLI
     
     ### 🌡️ Calcoli Produzione Elettrica
     
     - **Temperatura Celle (NOCT):**
       $$T_{cell} = T_{amb} + \frac{\text{POA}_{\text{global}}}{800} \cdot (NOCT - 20)$$
+      in alternativa Faiman $T_{cell} = T_{amb} + \frac{\text{POA}}{U_0 + U_1 \cdot v}$ o SAPM (con vento $v$);
+      l'inerzia termica è un filtro del primo ordine $T_k = T_{k-1} + \alpha (T_{ss,k} - T_{k-1})$, $\alpha = 1 - e^{-\Delta t/\tau}$
     - **Efficienza corretta:**
       $$\eta_{corr} = \eta \cdot [1 + \gamma \cdot (T_{cell} - 25)]$$
     - **Potenza DC:**
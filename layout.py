@@ -0,0 +1,293 @@
+"""
+Modulo Layout - Impaccamento dei pannelli nel poligono reale del campo
+Il campo (GeoJSON in lon/lat, disegnato sulla mappa o caricato da file)
+viene proiettato in metri, ridotto della fascia di rispetto e riempito
+con le file di pannelli orientate secondo l'azimut.
+"""
+
+import json
+import math
+
+import numpy as np
+import shapely
+from shapely.geometry import shape, mapping
+
+from config import HECTARE_M2
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+# ==================== POLIGONO DEL CAMPO ====================
+
+def parse_field_geojson(data) -> dict:
+    """
+    Geometria del campo da GeoJSON (stringa, bytes o dict: FeatureCollection,
+    Feature o geometria). Restituisce un dict GeoJSON Polygon/MultiPolygon.
+    """
+    if isinstance(data, (bytes, str)):
+        data = json.loads(data)
+
+    if data.get("type") == "FeatureCollection":
+        geometries = [feature["geometry"] for feature in data.get("features", [])]
+    elif data.get("type") == "Feature":
+        geometries = [data["geometry"]]
+    else:
+        geometries = [data]
+
+    polygons = [shape(g) for g in geometries if g and g.get("type") in ("Polygon", "MultiPolygon")]
+    if not polygons:
+        raise ValueError("Il GeoJSON non contiene poligoni")
+
+    field = shapely.union_all(polygons)
+    if not field.is_valid:
+        field = shapely.make_valid(field)
+    if field.is_empty or field.area == 0:
+        raise ValueError("Il poligono del campo è vuoto")
+    return mapping(field)
+
+
+def field_origin(field_lonlat) -> tuple:
+    """Origine (lon, lat) della proiezione locale: centroide del campo"""
+    centroid = field_lonlat.centroid
+    return centroid.x, centroid.y
+
+
+def to_local(geom, origin: tuple):
+    """Lon/lat -> metri (equirettangolare attorno all'origine, adatta a singoli lotti)"""
+    lon0, lat0 = origin
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    return shapely.transform(geom, lambda c: (c - (lon0, lat0)) * (kx, ky))
+
+
+def to_lonlat(geom, origin: tuple):
+    """Metri -> lon/lat (inversa di to_local)"""
+    lon0, lat0 = origin
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    return shapely.transform(geom, lambda c: c / (kx, ky) + (lon0, lat0))
+
+
+def field_area_m2(field_geojson: dict) -> float:
+    """Superficie del campo [m²]"""
+    field = shape(field_geojson)
+    return to_local(field, field_origin(field)).area
+
+
+# ==================== IMPACCAMENTO ====================
+
+def row_pitch(lato_minore, carreggiata):
+    """
+    Interasse tra le file [m]: lato minore del modulo + carreggiata.
+    Unica definizione per dimensionamento del campo, layout e ombreggiamento
+    tra file (fisso e inseguitore); accetta anche array (sweep di layout).
+    """
+    return lato_minore + carreggiata
+
+
+def _row_rotation(params: dict) -> float:
+    """
+    Rotazione del sistema delle file [°]: con impianto fisso le file sono
+    perpendicolari all'azimut dei moduli, con inseguitore corrono lungo l'asse
+    """
+    rotation = params.get("azimuth_pannello", 180) - 180
+    return rotation + 90 if params.get("mount", "Fisso") == "Monoassiale" else rotation
+
+
+def _rotate(xy: np.ndarray, angle_deg: float) -> np.ndarray:
+    """Rotazione antioraria di coordinate (..., 2) attorno all'origine"""
+    a = math.radians(angle_deg)
+    rot = np.array([[math.cos(a), math.sin(a)], [-math.sin(a), math.cos(a)]])
+    return xy @ rot
+
+
+def pack_panels(field_local, params: dict) -> dict:
+    """
+    Impacca i pannelli nel campo (coordinate locali in metri)
+
+    Nel sistema ruotato i pannelli guardano verso -y (inseguitore: asse lungo x),
+    le file corrono lungo x
+    con passo pitch_laterale, le file si susseguono lungo y con passo
+    row_pitch (come nel dimensionamento a campo quadrato).
+    L'ingombro a terra del pannello è lato_maggiore × lato_minore·cos(tilt).
+
+    Per ogni fila si calcola in blocco (shapely vettoriale) la parte della
+    striscia che cade fuori dal campo: un pannello è valido se il suo
+    intervallo in x non interseca nessuna di queste parti. Il test è esatto
+    e resta puro numpy (searchsorted), anche con decine di migliaia di moduli.
+    """
+    rotation = _row_rotation(params)
+    setback = params.get("setback", 0.0)
+
+    usable = field_local.buffer(-setback, join_style="mitre") if setback > 0 else field_local
+    empty = np.empty(0, dtype=int)
+    if usable.is_empty:
+        return _packing_result(np.empty((0, 5, 2)), empty, empty, rotation)
+
+    # Campo ruotato: facciata pannelli verso -y
+    usable_rot = shapely.transform(usable, lambda c: _rotate(c, rotation))
+    minx, miny, maxx, maxy = usable_rot.bounds
+
+    width = params["lato_maggiore"]
+    depth = params["lato_minore"] * math.cos(math.radians(params["tilt_pannello"]))
+    pitch_x = max(params["pitch_laterale"], width)
+    pitch_y = row_pitch(params["lato_minore"], params["carreggiata"])
+
+    xs = np.arange(minx, maxx - width + 1e-9, pitch_x)
+    ys = np.arange(miny, maxy - depth + 1e-9, pitch_y)
+    if not len(xs) or not len(ys):
+        return _packing_result(np.empty((0, 5, 2)), empty, empty, rotation)
+
+    # Parti di ogni striscia di fila esterne al campo
+    strips = shapely.box(minx - 1, ys, maxx + 1, ys + depth)
+    parts, part_row = shapely.get_parts(shapely.difference(strips, usable_rot), return_index=True)
+    solid = shapely.area(parts) > 1e-9
+    bounds = shapely.bounds(parts[solid])
+    part_row = part_row[solid]
+
+    rows, cols = [], []
+    for row in range(len(ys)):
+        sel = part_row == row
+        lo, hi = np.sort(bounds[sel, 0]), np.sort(bounds[sel, 2])
+        # Parti sovrapposte a [x, x + width]: iniziano prima della fine meno quelle già concluse
+        overlaps = np.searchsorted(lo, xs + width, side="left") - np.searchsorted(hi, xs, side="right")
+        free = np.flatnonzero(overlaps == 0)
+        cols.append(free)
+        rows.append(np.full(len(free), row))
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+
+    x0, y0 = xs[cols], ys[rows]
+    corners = np.stack([
+        np.stack([x0, y0], axis=-1),
+        np.stack([x0 + width, y0], axis=-1),
+        np.stack([x0 + width, y0 + depth], axis=-1),
+        np.stack([x0, y0 + depth], axis=-1),
+        np.stack([x0, y0], axis=-1),
+    ], axis=1)
+
+    # Ritorno al sistema locale non ruotato
+    return _packing_result(_rotate(corners, -rotation), rows, cols, rotation)
+
+
+def _packing_result(footprints: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+                    rotation: float) -> dict:
+    if len(rows):
+        _, per_row = np.unique(rows, return_counts=True)
+    else:
+        per_row = np.zeros(1, dtype=int)
+    return {
+        "footprints": footprints,  # (N, 5, 2) coordinate locali [m]
+        "row_index": rows,
+        "col_index": cols,
+        "rotation_deg": rotation,
+        "total_panels": int(len(rows)),
+        "max_rows": int(np.count_nonzero(per_row)),
+        "max_panels_per_row": int(per_row.max()),
+    }
+
+
+def pack_field(params: dict) -> dict:
+    """
+    Layout completo nel poligono params["field_polygon"] (GeoJSON lon/lat):
+    conteggi, superficie e ingombri dei pannelli
+    """
+    field = shape(params["field_polygon"])
+    origin = field_origin(field)
+    field_local = to_local(field, origin)
+
+    packing = pack_panels(field_local, params)
+    packing["origin"] = origin
+    packing["field_area_m2"] = field_local.area
+    packing["field_hectares"] = field_local.area / HECTARE_M2
+    return packing
+
+
+# ==================== LAYOUT SIMULATO ====================
+
+def _grid_footprints(params: dict) -> tuple:
+    """
+    Ingombri del layout simulato (num_rows × num_panels_per_row) centrato
+    sull'origine locale, senza poligono del campo
+    """
+    rotation = _row_rotation(params)
+    width = params["lato_maggiore"]
+    depth = params["lato_minore"] * math.cos(math.radians(params["tilt_pannello"]))
+    pitch_x = max(params["pitch_laterale"], width)
+    pitch_y = row_pitch(params["lato_minore"], params["carreggiata"])
+
+    n_cols, n_rows = int(params["num_panels_per_row"]), int(params["num_rows"])
+    cols, rows = np.meshgrid(np.arange(n_cols), np.arange(n_rows))
+    cols, rows = cols.ravel(), rows.ravel()
+
+    x0 = cols * pitch_x - ((n_cols - 1) * pitch_x + width) / 2
+    y0 = rows * pitch_y - ((n_rows - 1) * pitch_y + depth) / 2
+    corners = np.stack([
+        np.stack([x0, y0], axis=-1),
+        np.stack([x0 + width, y0], axis=-1),
+        np.stack([x0 + width, y0 + depth], axis=-1),
+        np.stack([x0, y0 + depth], axis=-1),
+        np.stack([x0, y0], axis=-1),
+    ], axis=1)
+    return _rotate(corners, -rotation), rows, cols
+
+
+def array_footprints(params: dict) -> tuple:
+    """
+    Ingombri [lon/lat] dei pannelli simulati con indici di fila e colonna
+    (ordinati per fila, poi per colonna).
+    Con il poligono del campo si usano i primi num_panels_total moduli
+    del layout impaccato, altrimenti la griglia attorno a (lat, lon).
+    """
+    if params.get("field_polygon"):
+        packing = pack_field(params)
+        n = min(int(params["num_panels_total"]), packing["total_panels"])
+        footprints, rows, cols = (packing[k][:n] for k in ("footprints", "row_index", "col_index"))
+        origin = packing["origin"]
+    else:
+        footprints, rows, cols = _grid_footprints(params)
+        origin = (params["lon"], params["lat"])
+
+    lon0, lat0 = origin
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    return footprints / (kx, ky) + (lon0, lat0), rows, cols
+
+
+def _feature_collection(coords: np.ndarray, precision: int) -> dict:
+    """Un'unica Feature MultiPolygon: nessun overhead per singolo modulo"""
+    rings = np.round(coords, precision).tolist()
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "properties": {},
+            "geometry": {"type": "MultiPolygon", "coordinates": [[ring] for ring in rings]},
+        }] if rings else [],
+    }
+
+
+def layout_geojson(params: dict, precision: int = 6, max_modules: int = None) -> dict:
+    """
+    GeoJSON del layout per la mappa, in due livelli di dettaglio:
+        modules: un poligono per modulo (None oltre max_modules)
+        rows: un poligono per tratto continuo di fila (moduli adiacenti fusi)
+
+    I tratti sono costruiti dai vertici del primo e dell'ultimo modulo
+    (le file sono rettilinee), senza unioni geometriche.
+    """
+    footprints, rows, cols = array_footprints(params)
+
+    # Nuovo tratto a ogni cambio di fila o salto di colonna
+    breaks = (np.diff(rows) != 0) | (np.diff(cols) != 1)
+    starts = np.flatnonzero(np.r_[True, breaks]) if len(rows) else np.empty(0, dtype=int)
+    ends = np.r_[starts[1:], len(rows)] - 1
+    first, last = footprints[starts], footprints[ends]
+    row_polygons = np.stack([first[:, 0], last[:, 1], last[:, 2], first[:, 3], first[:, 0]], axis=1)
+
+    return {
+        "modules": (_feature_collection(footprints, precision)
+                    if max_modules is None or len(rows) <= max_modules else None),
+        "rows": _feature_collection(row_polygons, precision),
+        "n_modules": int(len(rows)),
+    }
@@ -4,8 +4,12 @@ Modulo per la visualizzazione della mappa interattiva e info impianto
 
 import streamlit as st
 import folium
+from branca.element import MacroElement
+from folium.plugins import Draw
+from jinja2 import Template
 from streamlit_folium import st_folium
-from config import CHART_CONFIG
+from config import CHART_CONFIG, MAP_LAYOUT_CONFIG, TILES_CONFIG
+from layout import parse_field_geojson, layout_geojson
 
 
 # ==================== UTILITY ====================
@@ -30,11 +34,12 @@ def get_map_height(screen_width: int) -> int:
 # ==================== CREAZIONE MAPPA ====================
 
 def create_location_map(lat: float, lon: float, comune: str) -> folium.Map:
-    """Crea mappa interattiva con marker della località"""
+    """Crea mappa interattiva con marker della località (renderer canvas)"""
     m = folium.Map(
         location=[lat, lon], 
         zoom_start=6, 
-        tiles='Cartodb Positron'
+        tiles='Cartodb Positron',
+        prefer_canvas=True
     )
     folium.Marker(
         [lat, lon],
@@ -42,8 +47,119 @@ def create_location_map(lat: float, lon: float, comune: str) -> folium.Map:
         popup=f"<b>{comune}</b><br>Lat: {lat:.4f}<br>Lon: {lon:.4f}",
         icon=folium.Icon(color='green', icon='sun', prefix='fa')
     ).add_to(m)
+    add_potential_tiles(m)
     return m
 
+
+def add_potential_tiles(m: folium.Map) -> folium.Map:
+    """
+    Potenziale regionale (se calcolato con regional.py) come livelli a tile
+    XYZ, spenti all'avvio: i PNG sono generati e serviti da tiles.py
+    """
+    from tiles import get_tile_renderer, start_tile_server, tile_url
+
+    version = get_tile_renderer().version
+    if version is None:
+        return m
+
+    base_url = start_tile_server()
+    layers = {"energy": "Potenziale: energia [kWh/ha·anno]", "level": "Potenziale: idoneità DLI"}
+    for layer, name in layers.items():
+        folium.TileLayer(
+            tiles=tile_url(base_url, layer, version), attr="Simulazione regionale APV", name=name,
+            overlay=True, control=True, show=False, opacity=TILES_CONFIG["opacity"],
+            max_native_zoom=TILES_CONFIG["max_native_zoom"], max_zoom=19,
+        ).add_to(m)
+    folium.LayerControl(collapsed=True).add_to(m)
+    return m
+
+class ZoomSwitch(MacroElement):
+    """Mostra il livello dettagliato da min_zoom in su, quello semplificato sotto"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var detail = {{ this.detail.get_name() }};
+            var coarse = {{ this.coarse.get_name() }};
+            function update() {
+                var show = map.getZoom() >= {{ this.min_zoom }} ? detail : coarse;
+                var hide = show === detail ? coarse : detail;
+                if (map.hasLayer(hide)) { map.removeLayer(hide); }
+                if (!map.hasLayer(show)) { map.addLayer(show); }
+            }
+            map.on('zoomend', update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, detail, coarse, min_zoom: int):
+        super().__init__()
+        self._name = "ZoomSwitch"
+        self.detail = detail
+        self.coarse = coarse
+        self.min_zoom = min_zoom
+
+
+def add_panel_layout(m: folium.Map, params: dict) -> folium.Map:
+    """
+    Ingombri dei pannelli simulati: un solo MultiPolygon per livello
+    (moduli / file fuse), disegnati su canvas e scambiati in base allo zoom.
+    Oltre max_modules si disegnano solo le file.
+    """
+    layout = layout_geojson(params, MAP_LAYOUT_CONFIG["precision"], MAP_LAYOUT_CONFIG["max_modules"])
+    if not layout["n_modules"]:
+        return m
+
+    style = {"color": "#1f4e79", "weight": 0.5, "fillColor": "#2e75b6", "fillOpacity": 0.7}
+    geojson_kwargs = dict(style_function=lambda _: style, highlight_function=None,
+                          smooth_factor=1.0, embed=True)
+
+    rows = folium.GeoJson(layout["rows"], name="File pannelli", **geojson_kwargs)
+    if layout["modules"] is None:
+        rows.add_to(m)
+        return m
+
+    modules = folium.GeoJson(layout["modules"], name="Moduli", **geojson_kwargs)
+    rows.add_to(m)
+    modules.add_to(m)
+    m.add_child(ZoomSwitch(modules, rows, MAP_LAYOUT_CONFIG["module_zoom"]))
+    return m
+
+
+def add_field_drawing(m: folium.Map, field_polygon: dict = None) -> folium.Map:
+    """Strumento di disegno del poligono del campo (+ poligono corrente)"""
+    if field_polygon is not None:
+        layer = folium.GeoJson(
+            field_polygon,
+            name="Campo",
+            style_function=lambda _: {"color": "#74a65b", "weight": 2, "fillOpacity": 0.1},
+        ).add_to(m)
+        m.fit_bounds(layer.get_bounds())
+
+    Draw(
+        export=False,
+        draw_options={
+            "polygon": True, "rectangle": True,
+            "polyline": False, "circle": False, "marker": False, "circlemarker": False,
+        },
+        edit_options={"edit": False},
+    ).add_to(m)
+    return m
+
+
+def update_field_from_drawing(drawing: dict):
+    """Salva il poligono disegnato sulla mappa come campo (una sola volta per disegno)"""
+    if not drawing or drawing == st.session_state.get("field_polygon_drawn"):
+        return
+    st.session_state["field_polygon_drawn"] = drawing
+    try:
+        st.session_state["field_polygon"] = parse_field_geojson(drawing)
+    except (ValueError, KeyError):
+        return
+    st.rerun()
+
 # ==================== INFO BOX ====================
 
 def format_info_item(name: str, value) -> str:
@@ -148,4 +264,8 @@ def display_map_section(params: dict):
 
     with col_map:
         location_map = create_location_map(params["lat"], params["lon"], params["comune"])
-        st_folium(location_map, width="100%", height=map_height)
+        add_field_drawing(location_map, params.get("field_polygon"))
+        add_panel_layout(location_map, params)
+        output = st_folium(location_map, width="100%", height=map_height,
+                           returned_objects=["last_active_drawing"])
+        update_field_from_drawing((output or {}).get("last_active_drawing"))
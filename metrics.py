@@ -91,28 +91,28 @@ def generate_solar_metrics(results: dict) -> list:
             "GHI",
             f"{format_value(results['GHI_Wm2'].mean(), 'W/m²')}<br>"
             f"{format_value(results['GHI_Whm2'], 'Wh/m²')}",
-            "Radiazione globale orizzontale (media oraria / totale giornaliero)"
+            "Radiazione globale orizzontale (media / totale del periodo)"
         ),
         
         create_metric_card(
             "DNI",
             f"{format_value(results['DNI_Wm2'].mean(), 'W/m²')}<br>"
             f"{format_value(results['DNI_Whm2'], 'Wh/m²')}",
-            "Radiazione diretta normale (media oraria / totale giornaliero)"
+            "Radiazione diretta normale (media / totale del periodo)"
         ),
         
         create_metric_card(
             "DHI",
             f"{format_value(results['DHI_Wm2'].mean(), 'W/m²')}<br>"
             f"{format_value(results['DHI_Whm2'], 'Wh/m²')}",
-            "Radiazione diffusa orizzontale (media oraria / totale giornaliero)"
+            "Radiazione diffusa orizzontale (media / totale del periodo)"
         ),
         
         create_metric_card(
             "POA",
             f"{format_value(results['POA_Wm2'].mean(), 'W/m²')}<br>"
             f"{format_value(results['POA_Whm2'], 'Wh/m²')}",
-            "Radiazione sul piano pannelli (media oraria / totale giornaliero)"
+            "Radiazione sul piano pannelli (media / totale del periodo)"
         ),
         
         create_metric_card(
@@ -135,20 +135,26 @@ def generate_production_metrics(results: dict) -> list:
             "Produzione Singolo Pannello",
             f"{format_value(results['power_single_W'].mean(), 'W')}<br>"
             f"{format_value(results['energy_single_Wh'], 'Wh')}",
-            "Potenza media oraria / Energia giornaliera singolo pannello"
+            "Potenza media / Energia del periodo singolo pannello"
         ),
         
         create_metric_card(
             "Produzione Totale",
             f"{format_value(results['power_total_W'].mean(), 'W')}<br>"
             f"{format_value(results['energy_total_Wh'], 'Wh')}",
-            "Potenza media oraria / Energia giornaliera tutti i pannelli"
+            "Potenza media / Energia del periodo tutti i pannelli"
         ),
         
         create_metric_card(
             "Produzione Energetica per m²",
             f"{format_value(results['energy_total_Wh_m2'], 'Wh/m²', 1)}",
-            "Energia giornaliera per metro quadro di pannello"
+            "Energia del periodo per metro quadro di pannello"
+        ),
+
+        create_metric_card(
+            "Perdita Ombreggiamento File",
+            f"{format_value(results['row_shading_loss_pct'], '%', 1)}",
+            "Riduzione POA per ombreggiamento reciproco tra file (componente diretta)"
         ),
     ]
 
@@ -206,7 +212,7 @@ def generate_agri_metrics(agri_results: dict) -> list:
         create_metric_card(
             "DLI totale giornaliero",
             f"{format_value(agri_results['DLI_mol_m2_day'], 'mol/m²·day', 1)}",
-            "Totale giornaliero di luce fotosinteticamente attiva"
+            "Totale giornaliero di luce fotosinteticamente attiva (media sui giorni simulati)"
         ),
 
         create_metric_card( 
@@ -233,13 +239,13 @@ def generate_agri_metrics(agri_results: dict) -> list:
         create_metric_card(
             "Ombreggiamento Medio",
             f"{format_value(agri_results['shaded_fraction_avg']*100, '%', 1)}",
-            "Media giornaliera della frazione di superficie del campo in ombra"
+            "Media sul periodo della frazione di superficie del campo in ombra"
         ),
         
         create_metric_card(
             "Ombra Massima",
             f"{format_value(agri_results['shadow_area_max_m2'], 'm²', 0)}",
-            "Area massima in ombra rilevata sul campo durante la giornata"
+            "Area massima in ombra rilevata sul campo durante il periodo"
         ),
     ]
 
@@ -293,6 +299,8 @@ def display_metrics(results: dict, params: dict):
         '</p>',
         unsafe_allow_html=True
         )
+    if results["agri_results"]["crop_warning"]:
+        st.warning(results["agri_results"]["crop_warning"])
     agri_cards = generate_agri_metrics(results["agri_results"])
     display_card_group(agri_cards)
 
@@ -0,0 +1,376 @@
+"""
+Modulo Pipeline - Grafo delle fasi di calcolo con ricalcolo incrementale
+Ogni fase dichiara i parametri che legge e le fasi da cui dipende:
+al variare di un input vengono rieseguite solo le fasi a valle.
+"""
+
+import hashlib
+import multiprocessing
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from config import PARALLEL_CONFIG, MODEL_VERSION
+from calculations import (
+    build_time_index,
+    calculate_geometry,
+    calculate_solar_position,
+    calculate_clearsky_irradiance,
+    calculate_orientation,
+    calculate_row_shading,
+    calculate_shaded_poa,
+    estimate_ambient_temperature,
+    calculate_pv_production,
+    assemble_pv_results,
+)
+from results import PVResults, AgriResults, time_step_hours
+from cache import get_result_cache, params_hash
+from store import get_scenario_store
+from agri_calculations import (
+    calculate_agri_shading,
+    calculate_dli,
+    evaluate_crop_suitability,
+    assemble_agri_results,
+)
+
+
+# ==================== DEFINIZIONE FASI ====================
+
+# name: nome fase | params: chiavi lette da params | deps: fasi a monte
+# func(p, up): p = solo i parametri dichiarati, up = output delle fasi a monte
+Stage = namedtuple("Stage", ["name", "params", "deps", "func"])
+
+STAGES = [
+    Stage("times", ("data", "timezone", "periodo", "risoluzione_min"), (),
+          lambda p, up: build_time_index(p)),
+
+    Stage("geometry",
+          ("area_pannello", "num_panels_total", "tilt_pannello", "hectares",
+           "pitch_laterale", "lato_minore", "lato_maggiore", "carreggiata",
+           "azimuth_pannello", "field_polygon", "setback", "mount"), (),
+          lambda p, up: calculate_geometry(p)),
+
+    Stage("solpos", ("lat", "lon"), ("times",),
+          lambda p, up: calculate_solar_position(up["times"], p["lat"], p["lon"])),
+
+    Stage("clearsky", ("lat", "lon", "timezone"), ("times", "solpos"),
+          lambda p, up: calculate_clearsky_irradiance(up["times"], p["lat"], p["lon"], str(p["timezone"]),
+                                                      up["solpos"])),
+
+    # Inseguitore monoassiale: rotazione per istante (None per impianto fisso)
+    Stage("orientation",
+          ("mount", "azimuth_pannello", "max_angle", "backtrack", "lato_minore", "carreggiata",
+           "steer_window_h", "steer_fraction", "lon"), ("times", "solpos"),
+          lambda p, up: calculate_orientation(p, up["times"], up["solpos"])),
+
+    Stage("row_shading",
+          ("tilt_pannello", "azimuth_pannello", "lato_minore", "carreggiata"), ("solpos", "orientation"),
+          lambda p, up: calculate_row_shading(p, up["solpos"], up["orientation"])),
+
+    Stage("poa", ("tilt_pannello", "azimuth_pannello", "albedo", "num_rows"),
+          ("clearsky", "solpos", "row_shading", "orientation"),
+          lambda p, up: calculate_shaded_poa(p, up["clearsky"], up["solpos"], up["row_shading"],
+                                             up["orientation"])),
+
+    Stage("temperature", ("lat",), ("times",),
+          lambda p, up: estimate_ambient_temperature(up["times"], p["lat"])),
+
+    Stage("production",
+          ("noct", "eff", "temp_coeff", "area_pannello", "losses", "num_panels_total",
+           "temp_model", "wind_speed", "thermal_tau_min"),
+          ("poa", "temperature"),
+          lambda p, up: calculate_pv_production(p, up["poa"][1], up["temperature"])),
+
+    Stage("shadow",
+          ("hectares", "lato_maggiore", "lato_minore", "tilt_pannello", "azimuth_pannello",
+           "altezza_suolo", "num_panels_total", "pitch_laterale"), ("solpos", "orientation"),
+          lambda p, up: calculate_agri_shading(p, up["solpos"], up["orientation"])),
+
+    Stage("dli", (), ("clearsky", "shadow"),
+          lambda p, up: calculate_dli(up["clearsky"]["ghi"], up["shadow"][1])),
+
+    Stage("crop", ("crops",), ("dli",),
+          lambda p, up: evaluate_crop_suitability(up["dli"], p.get("crops", "Cereali"))),
+]
+
+
+# Tutti i parametri che influenzano i risultati (chiave canonica delle cache)
+PIPELINE_PARAMS = tuple(sorted({name for stage in STAGES for name in stage.params}))
+
+# Fasi temporali ricomposte dai blocchi paralleli e memorizzate nella pipeline
+PARALLEL_STAGES = ("times", "solpos", "clearsky")
+
+
+def topological_order(stages: list) -> list:
+    """Ordina le fasi in modo che ogni fase segua tutte le sue dipendenze"""
+    by_name = {stage.name: stage for stage in stages}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dipendenza circolare sulla fase '{name}'")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name)
+    return ordered
+
+
+def _given_key(name: str, value) -> str:
+    """Chiave di un output fornito dall'esterno (contenuto dell'indice o repr)"""
+    if isinstance(value, pd.DatetimeIndex):
+        content = value.asi8.tobytes() + str(value.tz).encode()
+    else:
+        content = repr(value).encode()
+    return hashlib.sha1(name.encode() + b":given:" + content).hexdigest()
+
+
+# ==================== PIPELINE INCREMENTALE ====================
+
+class Pipeline:
+    """
+    Esegue il grafo delle fasi memorizzando gli output di ciascuna fase.
+
+    La chiave di una fase è l'hash dei parametri dichiarati e delle chiavi
+    delle fasi a monte: se non cambia, l'output memorizzato viene riusato.
+    Per ogni fase si conservano fino a max_entries risultati (LRU), così
+    anche il ritorno a una configurazione precedente non costa nulla.
+
+    Con workers > 1 le simulazioni lunghe (run) non ancora memorizzate sono
+    divise in blocchi di giorni interi calcolati su un pool di processi
+    (vedi run_parallel). Il default è PARALLEL_CONFIG["workers"] (1).
+    """
+
+    def __init__(self, stages: list = None, max_entries: int = 8, workers: int = None):
+        self.stages = topological_order(stages or STAGES)
+        self.max_entries = max_entries
+        self.workers = PARALLEL_CONFIG["workers"] if workers is None else workers
+        self._memo = {stage.name: OrderedDict() for stage in self.stages}
+        self.executed = []  # fasi rieseguite nell'ultimo run
+
+    def _stage_key(self, stage: Stage, params: dict, keys: dict) -> str:
+        values = tuple((name, repr(params.get(name))) for name in stage.params)
+        upstream = tuple(keys[dep] for dep in stage.deps)
+        return hashlib.sha1(repr((stage.name, values, upstream)).encode()).hexdigest()
+
+    def stage_keys(self, params: dict, given: dict = None) -> dict:
+        """Chiavi di tutte le fasi per questi input, senza eseguire nulla"""
+        keys = {}
+        for stage in self.stages:
+            if given and stage.name in given:
+                keys[stage.name] = _given_key(stage.name, given[stage.name])
+            else:
+                keys[stage.name] = self._stage_key(stage, params, keys)
+        return keys
+
+    def _remember(self, name: str, key: str, value):
+        memo = self._memo[name]
+        memo[key] = value
+        if len(memo) > self.max_entries:
+            memo.popitem(last=False)
+
+    def run_stages(self, params: dict, given: dict = None) -> dict:
+        """
+        Esegue le fasi necessarie e restituisce gli output di tutte le fasi
+
+        Args:
+            given: output già calcolati di alcune fasi (es. blocco di "times"),
+                usati così come sono e non memorizzati
+        """
+        outputs = {}
+        keys = self.stage_keys(params, given)
+        self.executed = []
+
+        for stage in self.stages:
+            key = keys[stage.name]
+            if given and stage.name in given:
+                outputs[stage.name] = given[stage.name]
+                continue
+
+            memo = self._memo[stage.name]
+            if key in memo:
+                memo.move_to_end(key)
+            else:
+                stage_params = {name: params[name] for name in stage.params if name in params}
+                upstream = {dep: outputs[dep] for dep in stage.deps}
+                self._remember(stage.name, key, stage.func(stage_params, upstream))
+                self.executed.append(stage.name)
+            outputs[stage.name] = memo[key]
+
+        return outputs
+
+    def run(self, params: dict, given: dict = None) -> PVResults:
+        """
+        Calcola risultati PV e agronomici (stesso contenitore di calculate_all_pv
+        con i risultati agronomici in "agri_results")
+
+        Con workers > 1 si passa al pool solo a freddo, cioè se le fasi di
+        PARALLEL_STAGES non sono memorizzate: i loro output ricomposti dai
+        blocchi vengono memorizzati, così le variazioni successive (es. di
+        rendimento o di coltura) ricalcolano in serie solo le fasi a valle.
+        """
+        if given is None and self.workers > 1 and all(name in self._memo for name in PARALLEL_STAGES):
+            keys = self.stage_keys(params)
+            if any(keys[name] not in self._memo[name] for name in PARALLEL_STAGES):
+                times = build_time_index(params)
+                if len(times) >= PARALLEL_CONFIG["min_steps"]:
+                    results, merged = run_parallel(params, times, self.workers)
+                    for name in PARALLEL_STAGES:
+                        self._remember(name, keys[name], merged[name])
+                    self.executed = [stage.name for stage in self.stages]
+                    return results
+
+        return assemble_results(params, self.run_stages(params, given))
+
+
+def assemble_results(params: dict, out: dict) -> PVResults:
+    """Contenitore dei risultati PV e agronomici dagli output delle fasi"""
+    poa, poa_global = out["poa"]
+    shadow_df, shaded_fraction = out["shadow"]
+
+    results = assemble_pv_results(
+        out["times"], out["solpos"], out["clearsky"], poa, poa_global,
+        out["row_shading"], out["temperature"], out["geometry"], out["production"],
+        params["area_pannello"], params["num_panels_total"]
+    )
+    results.agri_results = assemble_agri_results(
+        out["times"], shadow_df, shaded_fraction, out["crop"]
+    )
+    return results
+
+
+# ==================== ESECUZIONE PARALLELA A BLOCCHI ====================
+
+def split_time_index(times: pd.DatetimeIndex, n_chunks: int) -> list:
+    """
+    Divide l'indice in al più n_chunks blocchi consecutivi di giorni interi:
+    i tagli cadono a mezzanotte, con irradianza nulla, per cui l'inerzia
+    termica riparte dall'equilibrio come nella simulazione continua
+    """
+    day_starts = np.flatnonzero(np.r_[True, np.diff(times.normalize().asi8) != 0])
+    n_chunks = max(1, min(n_chunks, len(day_starts)))
+    cuts = day_starts[np.linspace(0, len(day_starts), n_chunks, endpoint=False).astype(int)]
+    return [times[start:end] for start, end in zip(cuts, np.r_[cuts[1:], len(times)])]
+
+
+def _run_chunk(params: dict, times: pd.DatetimeIndex, geometry: dict) -> tuple:
+    """
+    Worker: blocchi delle serie PV e agronomiche di un intervallo, DLI,
+    giorni simulati e output delle fasi di PARALLEL_STAGES
+    """
+    out = Pipeline(max_entries=1, workers=1).run_stages(params, given={"times": times, "geometry": geometry})
+    results = assemble_results(params, out)
+    n_days = max(len(times) * time_step_hours(times) / 24, 1.0)
+    stages = {name: out[name] for name in PARALLEL_STAGES if name != "times"}
+    return (results.block, results.agri_results.block, results["agri_results"]["DLI_mol_m2_day"],
+            n_days, stages)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool di processi condiviso (creato al primo uso, avvio "spawn": sicuro
+    anche da processi con thread come Streamlit)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def run_parallel(params: dict, times: pd.DatetimeIndex, workers: int) -> tuple:
+    """
+    Simulazione divisa in blocchi di giorni su un pool di processi e
+    ricomposta nell'ordine: le serie sono concatenate (energie e irradiazioni
+    restano integrali sull'intero periodo), il DLI è la media pesata sui
+    giorni dei blocchi e la valutazione della coltura si fa sul totale.
+    La geometria (indipendente dal tempo) si calcola una sola volta.
+
+    Returns:
+        (risultati, output ricomposti delle fasi di PARALLEL_STAGES)
+    """
+    chunks = split_time_index(times, workers * PARALLEL_CONFIG["chunks_per_worker"])
+    stage_params = {name: params[name] for name in PIPELINE_PARAMS if name in params}
+    geometry = calculate_geometry(stage_params)
+    if len(chunks) < 2:
+        out = Pipeline(workers=1).run_stages(stage_params, given={"geometry": geometry})
+        return assemble_results(stage_params, out), {name: out[name] for name in PARALLEL_STAGES}
+
+    parts = list(get_process_pool(workers).map(_run_chunk, repeat(stage_params), chunks, repeat(geometry)))
+    pv_block = np.concatenate([part[0] for part in parts], axis=1)
+    agri_block = np.concatenate([part[1] for part in parts], axis=1)
+    days = np.array([part[3] for part in parts])
+    dli = float(np.dot([part[2] for part in parts], days) / days.sum())
+
+    results = PVResults.from_block(
+        times, pv_block,
+        area_pannello=params["area_pannello"], num_panels_total=params["num_panels_total"], **geometry
+    )
+    shadow = dict(zip(AgriResults.SERIES, agri_block))
+    results.agri_results = assemble_agri_results(
+        times, shadow, shadow["shaded_fraction"],
+        evaluate_crop_suitability(dli, params.get("crops", "Cereali"))
+    )
+    merged = {name: pd.concat([part[4][name] for part in parts]) for name in PARALLEL_STAGES if name != "times"}
+    merged["times"] = times
+    return results, merged
+
+
+def scenario_key(params: dict) -> str:
+    """
+    Chiave di cache e archivio: input della pipeline, versione dei modelli,
+    serie e scalari salvati (risultati di versioni precedenti non vengono riusati)
+    """
+    return params_hash({
+        "params": params_hash(params, PIPELINE_PARAMS),
+        "model_version": MODEL_VERSION,
+        "series": PVResults.SERIES + AgriResults.SERIES,
+        "scalars": PVResults.SCALARS + AgriResults.SCALARS,
+    })
+
+
+def run_cached(pipeline: Pipeline, params: dict) -> PVResults:
+    """
+    Risultati dalla cache condivisa tra sessioni; in caso di miss si prova
+    l'archivio su disco e solo infine la pipeline (che riusa le fasi già
+    calcolate, es. posizione solare). I nuovi risultati vengono archiviati.
+    """
+    key = scenario_key(params)
+    return get_result_cache().get_or_compute(key, lambda: _load_or_run(pipeline, params, key))
+
+
+def _load_or_run(pipeline: Pipeline, params: dict, key: str) -> PVResults:
+    store = get_scenario_store()
+    if store is None:
+        return pipeline.run(params)
+
+    try:
+        results = store.get(key)
+    except (OSError, sqlite3.Error, ImportError, ValueError):
+        store, results = None, None  # archivio non disponibile: si calcola comunque
+    if results is None:
+        results = pipeline.run(params)
+        if store is not None:
+            try:
+                store.put(key, {name: params.get(name) for name in PIPELINE_PARAMS}, results)
+            except (OSError, sqlite3.Error, ImportError, ValueError):
+                pass
+    return results
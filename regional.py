@@ -0,0 +1,236 @@
+"""
+Modulo Potenziale Regionale - Mappa di screening agrivoltaico su griglia
+Per un layout di riferimento valuta i modelli esistenti su ogni cella di
+una griglia di ~1 km sull'Italia: energia annua per ettaro e adeguatezza
+del DLI per la coltura. Le celle sono simulate a blocchi in parallelo
+(batch.py, solo aggregati su disco): i blocchi completati fanno da
+checkpoint e un job interrotto riprende da dove si era fermato.
+Il risultato è un raster compatto (.npz) letto dalla mappa, con il layout
+di riferimento nei metadati.
+
+Uso da riga di comando:
+    python regional.py --cell-km 1 --workers 8 --crop Cereali
+"""
+
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from config import REGIONAL_CONFIG, PARALLEL_CONFIG, HECTARE_M2
+from calculations import lookup_land_mask
+from agri_calculations import crop_requirement, suitability_level, SUITABILITY_LEVELS
+from batch import run_sites_batch
+
+NODATA_LEVEL = 255  # celle fuori regione nel livello di idoneità
+KM_PER_DEGREE = 111.32
+
+# Parametri del layout di riferimento riportati nei metadati del raster
+LAYOUT_KEYS = ("hectares", "num_panels_total", "num_rows", "num_panels_per_row", "mount",
+               "tilt_pannello", "azimuth_pannello", "lato_maggiore", "lato_minore",
+               "carreggiata", "pitch_laterale", "altezza_suolo")
+COUNT_KEYS = ("num_panels_total", "num_panels_per_row", "num_rows")
+
+
+# ==================== GRIGLIA ====================
+
+def grid_axes(bounds: tuple = None, cell_km: float = None) -> tuple:
+    """
+    Centri delle celle (lat da nord a sud, lon da ovest a est): passo in
+    longitudine corretto per il coseno della latitudine media
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds or REGIONAL_CONFIG["bounds"]
+    cell_km = cell_km or REGIONAL_CONFIG["cell_km"]
+    lat_step = cell_km / KM_PER_DEGREE
+    lon_step = lat_step / np.cos(np.radians((lat_min + lat_max) / 2))
+    lats = np.arange(lat_max - lat_step / 2, lat_min, -lat_step)
+    lons = np.arange(lon_min + lon_step / 2, lon_max, lon_step)
+    return lats, lons
+
+
+def region_cells(lats: np.ndarray, lons: np.ndarray, boundary: dict = None) -> tuple:
+    """
+    Indici (riga, colonna) delle celle da simulare: terraferma secondo la
+    mappa delle quote di pvlib (risoluzione 5') ed eventualmente interne
+    al confine GeoJSON dato
+    """
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing="ij")
+    inside = lookup_land_mask(lat_grid, lon_grid)
+    if boundary is not None:
+        import shapely
+        from shapely.geometry import shape
+
+        inside &= shapely.contains_xy(shape(boundary), lon_grid, lat_grid)
+    return np.nonzero(inside)
+
+
+def _load_boundary(path: str) -> dict:
+    """Geometria da file GeoJSON (geometria, Feature o FeatureCollection)"""
+    import shapely
+    from shapely.geometry import shape, mapping
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("type") == "FeatureCollection":
+        return mapping(shapely.union_all([shape(feat["geometry"]) for feat in data["features"]]))
+    return data.get("geometry", data)
+
+
+# ==================== LAYOUT DI RIFERIMENTO ====================
+
+def pack_reference_layout(params: dict) -> dict:
+    """
+    Riempie un campo quadrato di params["hectares"] con layout.pack_panels
+    (file, passo laterale, carreggiata e arretramento dei parametri): il
+    numero di pannelli corrisponde alla densità reale del layout per ettaro
+    """
+    from shapely.geometry import box
+    from layout import pack_panels
+
+    side = math.sqrt(params["hectares"] * HECTARE_M2)
+    packing = pack_panels(box(0, 0, side, side), params)
+    if not packing["total_panels"]:
+        raise ValueError("Nessun pannello nel campo di riferimento: controllare dimensioni e carreggiata")
+    return {
+        **params,
+        "num_panels_total": packing["total_panels"],
+        "num_rows": packing["max_rows"],
+        "num_panels_per_row": packing["max_panels_per_row"],
+    }
+
+
+def layout_meta(params: dict) -> dict:
+    """Layout di riferimento (con ground coverage ratio) per i metadati del raster"""
+    meta = {key: params.get(key) for key in LAYOUT_KEYS}
+    meta["gcr"] = params["num_panels_total"] * params["area_pannello"] / (params["hectares"] * HECTARE_M2)
+    return meta
+
+
+# ==================== CALCOLO ====================
+
+def run_regional(params: dict, path: str = None, cell_km: float = None, boundary: dict = None,
+                 workers: int = None, resume: bool = True, progress=None) -> dict:
+    """
+    Job regionale completo: griglia, simulazione annua delle celle (con
+    ripresa dai blocchi già scritti) e raster finale
+
+    Args:
+        params: parametri del layout di riferimento (lat/lon ignorati)
+        path: cartella del job (default REGIONAL_CONFIG["path"])
+        boundary: geometria GeoJSON della regione (default: tutta la terraferma nei limiti)
+        workers: processi (default PARALLEL_CONFIG["workers"]; da riga di comando tutti i core)
+        progress: callback(blocchi_completati, blocchi_totali)
+
+    Returns:
+        raster (come load_raster)
+    """
+    if params.get("periodo") != "Anno":
+        params = {**params, "periodo": "Anno"}
+    path = path or REGIONAL_CONFIG["path"]
+    cell_km = cell_km or REGIONAL_CONFIG["cell_km"]
+
+    lats, lons = grid_axes(REGIONAL_CONFIG["bounds"], cell_km)
+    rows, cols = region_cells(lats, lons, boundary)
+    batch = run_sites_batch(
+        params, lats[rows], lons[cols], os.path.join(path, "celle"), series=(),
+        chunk_sites=REGIONAL_CONFIG["chunk_sites"], workers=workers,
+        resume=resume, progress=progress,
+    )
+    return write_raster(batch, params, lats, lons, rows, cols, cell_km, os.path.join(path, "potenziale.npz"))
+
+
+def write_raster(batch, params: dict, lats: np.ndarray, lons: np.ndarray,
+                 rows: np.ndarray, cols: np.ndarray, cell_km: float, path: str) -> dict:
+    """
+    Raster compatto (npz compresso, float32/uint8) dagli aggregati per cella:
+    energia [kWh/ha·anno], DLI [mol/m²·d], DLI in % dell'ottimale e classe di idoneità
+    """
+    aggregates = batch.aggregates()
+    requirement = crop_requirement(params["crops"])
+    if requirement is None:
+        raise ValueError(f"Coltura sconosciuta: '{params['crops']}'")
+
+    shape = (len(lats), len(lons))
+    energy = np.full(shape, np.nan, dtype=np.float32)
+    dli = np.full(shape, np.nan, dtype=np.float32)
+    energy[rows, cols] = aggregates["energy_total_Wh"].to_numpy() / 1000 / params["hectares"]
+    dli[rows, cols] = aggregates["DLI_mol_m2_day"].to_numpy()
+    dli_pct = dli / requirement["DLI_opt"] * 100
+
+    level = np.full(shape, NODATA_LEVEL, dtype=np.uint8)
+    level[rows, cols] = suitability_level(dli_pct[rows, cols])
+
+    lat_half, lon_half = abs(lats[0] - lats[1]) / 2, abs(lons[1] - lons[0]) / 2
+    meta = {
+        # limiti esterni delle celle: [[sud, ovest], [nord, est]]
+        "bounds": [[float(lats[-1] - lat_half), float(lons[0] - lon_half)],
+                   [float(lats[0] + lat_half), float(lons[-1] + lon_half)]],
+        "cell_km": cell_km,
+        "crop": params["crops"],
+        "DLI_opt": requirement["DLI_opt"],
+        "levels": [status for _, status, _ in SUITABILITY_LEVELS],
+        "n_cells": int(len(rows)),
+        "complete": batch.complete,
+        "layout": layout_meta(params),
+    }
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp, lat=lats.astype(np.float32), lon=lons.astype(np.float32),
+                        energy_kwh_ha=energy, dli=dli, dli_pct=dli_pct.astype(np.float32),
+                        level=level, meta=np.array(json.dumps(meta)))
+    os.replace(tmp, path)
+    return load_raster(path)
+
+
+# ==================== LETTURA ====================
+
+def load_raster(path: str = None):
+    """Raster del potenziale (dict di array + "meta"), None se non ancora calcolato"""
+    path = path or os.path.join(REGIONAL_CONFIG["path"], "potenziale.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        raster = {key: data[key] for key in data.files if key != "meta"}
+        raster["meta"] = json.loads(str(data["meta"]))
+    return raster
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Potenziale agrivoltaico regionale su griglia")
+    parser.add_argument("--out", default=REGIONAL_CONFIG["path"], help="cartella del job")
+    parser.add_argument("--cell-km", type=float, default=REGIONAL_CONFIG["cell_km"])
+    parser.add_argument("--workers", type=int, default=PARALLEL_CONFIG["app_workers"])
+    parser.add_argument("--crop", default="Cereali")
+    parser.add_argument("--params", help="file JSON con il layout di riferimento (chiavi dell'API); "
+                        "senza numero di pannelli l'ettaro viene riempito con il layout dato")
+    parser.add_argument("--boundary", help="file GeoJSON con il confine della regione")
+    parser.add_argument("--no-resume", action="store_true", help="ricalcola da zero")
+    args = parser.parse_args()
+
+    from api import build_params
+
+    payload = {"crops": args.crop, "periodo": "Anno"}
+    if args.params:
+        with open(args.params, encoding="utf-8") as f:
+            payload.update(json.load(f))
+    params = build_params(payload)
+    if not any(key in payload for key in COUNT_KEYS):
+        params = pack_reference_layout(params)  # niente conteggi espliciti: campo pieno
+    boundary = _load_boundary(args.boundary) if args.boundary else None
+
+    def progress(done: int, total: int):
+        print(f"\rBlocchi completati: {done}/{total}", end="", flush=True)
+
+    raster = run_regional(params, args.out, args.cell_km, boundary, args.workers,
+                          resume=not args.no_resume, progress=progress)
+    meta = raster["meta"]
+    print(f"\n{meta['n_cells']} celle da {meta['cell_km']} km, layout di riferimento "
+          f"{meta['layout']['num_panels_total']} pannelli/{meta['layout']['hectares']:g} ha "
+          f"(GCR {meta['layout']['gcr']:.2f}) -> {os.path.join(args.out, 'potenziale.npz')}")
+
+
+if __name__ == "__main__":
+    main()
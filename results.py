@@ -0,0 +1,228 @@
+"""
+Modulo Risultati - Contenitori compatti dei risultati di simulazione
+Tutte le serie temporali stanno in un unico blocco float32 colonnare
+(una riga per serie) che condivide l'indice temporale; gli scalari sono
+attributi __slots__ e gli aggregati vengono calcolati solo se richiesti.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# ==================== CONTENITORE BASE ====================
+
+class ResultBlock:
+    """
+    Contenitore a sola lettura con interfaccia tipo dizionario
+    (results["POA_Wm2"], results.get(...), "chiave" in results).
+
+    Le serie restituite sono viste sul blocco condiviso (nessuna copia):
+    il blocco è non scrivibile, quindi i risultati possono essere
+    condivisi tra sessioni senza rischio di modifiche.
+    """
+
+    SERIES = ()  # nomi delle serie temporali (righe del blocco)
+    SCALARS = ()  # nomi degli scalari (attributi __slots__)
+    AGGREGATES = {}  # nome -> funzione(self), calcolati in modo lazy
+    __slots__ = ("times", "_block", "_cache")
+
+    def __init__(self, times: pd.DatetimeIndex, series: dict, **scalars):
+        self.times = times
+        block = np.empty((len(self.SERIES), len(times)), dtype=np.float32)
+        for row, name in enumerate(self.SERIES):
+            block[row] = np.asarray(series[name], dtype=np.float32)
+        block.flags.writeable = False
+        self._block = block
+        self._cache = {}
+
+        for name in self.SCALARS:
+            setattr(self, name, scalars.get(name))
+
+    @classmethod
+    def from_block(cls, times: pd.DatetimeIndex, block: np.ndarray, **scalars):
+        """Ricostruisce il contenitore da un blocco già allocato (nessuna copia se float32)"""
+        obj = cls.__new__(cls)
+        obj.times = times
+        obj._block = np.asarray(block, dtype=np.float32)
+        obj._block.flags.writeable = False
+        obj._cache = {}
+        for name in cls.SCALARS:
+            setattr(obj, name, scalars.get(name))
+        return obj
+
+    # --- accesso ai dati ---
+
+    @property
+    def block(self) -> np.ndarray:
+        """Blocco float32 (n_serie, n_tempi) a sola lettura, righe nell'ordine di SERIES"""
+        return self._block
+
+    def values(self, name: str) -> np.ndarray:
+        """Vista numpy (float32) di una serie"""
+        return self._block[self.SERIES.index(name)]
+
+    def series(self, name: str) -> pd.Series:
+        """Serie pandas costruita come vista sul blocco"""
+        return pd.Series(self.values(name), index=self.times, name=name, copy=False)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Tutte le serie in un DataFrame (vista trasposta del blocco)"""
+        frame = pd.DataFrame(self._block.T, index=self.times, columns=list(self.SERIES), copy=False)
+        frame.index.name = "time"
+        return frame
+
+    def scalars(self) -> dict:
+        """Scalari e aggregati (questi ultimi calcolati al momento)"""
+        out = {name: getattr(self, name) for name in self.SCALARS}
+        out.update({name: self[name] for name in self.AGGREGATES})
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        """Occupazione approssimativa in memoria (blocco + indice temporale)"""
+        return self._block.nbytes + self.times.nbytes
+
+    def memo(self, key, compute):
+        """Dato derivato calcolato una sola volta (es. serie ridotte per i grafici)"""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def step_hours(self) -> float:
+        """Passo temporale delle serie [h]"""
+        return time_step_hours(self.times)
+
+    # --- interfaccia tipo dizionario ---
+
+    def keys(self) -> list:
+        return ["times", *self.SERIES, *self.SCALARS, *self.AGGREGATES]
+
+    def items(self):
+        for key in self.keys():
+            yield key, self[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        if key == "times":
+            return self.times
+        if key in self.SERIES:
+            return self.series(key)
+        if key in self.SCALARS:
+            return getattr(self, key)
+        if key in self.AGGREGATES:
+            if key not in self._cache:
+                self._cache[key] = self.AGGREGATES[key](self)
+            return self._cache[key]
+        raise KeyError(key)
+
+
+def time_step_hours(times: pd.DatetimeIndex) -> float:
+    """Passo di un indice temporale regolare [h] (1 se non determinabile)"""
+    if len(times) < 2:
+        return 1.0
+    return (times[1] - times[0]).total_seconds() / 3600
+
+
+def _sum(name: str):
+    """Aggregato: somma della serie (accumulo in float64)"""
+    return lambda r: float(r.values(name).sum(dtype=np.float64))
+
+
+def _integral(name: str):
+    """Aggregato: integrale nel tempo (es. W -> Wh) con il passo dell'indice"""
+    return lambda r: _sum(name)(r) * r.step_hours
+
+
+def _mean(name: str):
+    return lambda r: float(r.values(name).mean(dtype=np.float64))
+
+
+def _max(name: str):
+    return lambda r: float(r.values(name).max()) if len(r.times) else 0.0
+
+
+# ==================== RISULTATI PV ====================
+
+class PVResults(ResultBlock):
+    """Risultati fotovoltaici (irradianza, produzione, geometria)"""
+
+    SERIES = (
+        "GHI_Wm2", "DNI_Wm2", "DHI_Wm2",
+        "POA_Wm2", "POA_unshaded_Wm2", "row_shaded_fraction",
+        "T_amb", "T_cell",
+        "sun_zenith", "sun_elevation", "sun_azimuth",
+        "power_single_W", "power_total_W",
+    )
+    SCALARS = (
+        # Metriche geometriche
+        "area_singolo", "superficie_totale_pannelli",
+        "proiezione_singolo_pannello", "proiezione_totale_pannelli",
+        "gcr", "superficie_libera",
+        "lato_campo_stimato_m", "max_panels_per_row", "max_rows", "total_panels",
+        "spazio_laterale_libero_m", "spazio_longitudinale_libero_m",
+        # Layout (per aggregati normalizzati)
+        "area_pannello", "num_panels_total",
+        # Risultati agronomici collegati
+        "agri_results",
+    )
+    AGGREGATES = {
+        "GHI_Whm2": _integral("GHI_Wm2"),
+        "DNI_Whm2": _integral("DNI_Wm2"),
+        "DHI_Whm2": _integral("DHI_Wm2"),
+        "POA_Whm2": _integral("POA_Wm2"),
+        "row_shading_loss_pct": lambda r: (
+            1 - r["POA_Whm2"] / max(_integral("POA_unshaded_Wm2")(r), 1)) * 100,
+        "energy_single_Wh": _integral("power_single_W"),
+        "energy_total_Wh": _integral("power_total_W"),
+        "energy_total_Wh_m2": lambda r: r["energy_total_Wh"] / (r.area_pannello * r.num_panels_total),
+        "T_cell_avg": _mean("T_cell"),
+    }
+    __slots__ = SCALARS
+
+    def __getitem__(self, key):
+        if key == "solpos":
+            return pd.DataFrame({
+                "zenith": self.values("sun_zenith"),
+                "elevation": self.values("sun_elevation"),
+                "azimuth": self.values("sun_azimuth"),
+            }, index=self.times)
+        return super().__getitem__(key)
+
+    def keys(self) -> list:
+        return [*super().keys(), "solpos"]
+
+    @property
+    def nbytes(self) -> int:
+        agri = self.agri_results.nbytes if self.agri_results is not None else 0
+        return super().nbytes + agri
+
+
+# ==================== RISULTATI AGRONOMICI ====================
+
+class AgriResults(ResultBlock):
+    """Risultati agronomici (ombreggiamento e DLI)"""
+
+    SERIES = ("shaded_fraction", "shadow_length_m", "shadow_area_m2")
+    SCALARS = (
+        "DLI_mol_m2_day", "crop_status", "crop_status_color",
+        "crop_light_adequacy_pct", "DLI_min", "DLI_opt", "unit",
+        "crop_warning",  # avviso della valutazione coltura (None se assente)
+    )
+    AGGREGATES = {
+        "shaded_fraction_avg": _mean("shaded_fraction"),
+        "shadow_area_max_m2": _max("shadow_area_m2"),
+        "shadow_length_max_m": _max("shadow_length_m"),
+    }
+    __slots__ = SCALARS
@@ -0,0 +1,238 @@
+"""
+Modulo Scenari - Confronto affiancato di più configurazioni
+Gli scenari fissati vengono calcolati con la pipeline della sessione:
+scenari con stesso sito e data riusano posizione solare e cielo sereno,
+per cui ogni scenario aggiuntivo costa solo i calcoli legati al layout.
+Gli scenari dell'archivio su disco si ripristinano senza ricalcolo.
+"""
+
+import pandas as pd
+import streamlit as st
+
+from config import STORE_CONFIG
+from pipeline import Pipeline, run_cached, scenario_key
+from store import get_scenario_store
+from charts import chart_frame
+from economics import scenario_economics
+from metrics import (
+    generate_solar_metrics,
+    generate_production_metrics,
+    generate_geometric_metrics,
+    generate_agri_metrics,
+)
+
+
+# ==================== COSTANTI ====================
+
+MAX_SCENARIOS = 4
+CURRENT_NAME = "Corrente"  # nome riservato alla configurazione corrente nel confronto
+
+# Serie orarie confrontabili: etichetta -> (sezione, chiave)
+COMPARISON_SERIES = {
+    "Potenza totale [W]": ("pv", "power_total_W"),
+    "POA [W/m²]": ("pv", "POA_Wm2"),
+    "Temperatura celle [°C]": ("pv", "T_cell"),
+    "Frazione ombreggiata campo": ("agri", "shaded_fraction"),
+}
+
+# Gruppi di card: etichetta tab -> (sezione, generatore)
+CARD_GROUPS = {
+    "Irradiamento": ("pv", generate_solar_metrics),
+    "Produzione": ("pv", generate_production_metrics),
+    "Geometria": ("pv", generate_geometric_metrics),
+    "Agronomia": ("agri", generate_agri_metrics),
+}
+
+
+# ==================== GESTIONE SCENARI ====================
+
+def get_scenarios() -> dict:
+    """Scenari fissati nella sessione (nome -> params)"""
+    if "scenarios" not in st.session_state:
+        st.session_state["scenarios"] = {}
+    return st.session_state["scenarios"]
+
+
+def scenario_name_taken(name: str) -> bool:
+    return name == CURRENT_NAME or name in get_scenarios()
+
+
+def next_scenario_name(prefix: str = "Scenario") -> str:
+    """Primo nome "<prefix> N" libero (anche dopo la rimozione di uno scenario)"""
+    n = 1
+    while scenario_name_taken(f"{prefix} {n}"):
+        n += 1
+    return f"{prefix} {n}"
+
+
+def pin_scenario(name: str, params: dict) -> bool:
+    """
+    Fissa una copia dei parametri correnti (senza l'oggetto geocoding);
+    False se il nome è già usato (lo scenario esistente non viene sovrascritto)
+    """
+    if scenario_name_taken(name):
+        return False
+    get_scenarios()[name] = {k: v for k, v in params.items() if k != "location"}
+    return True
+
+
+def scenario_sidebar(params: dict):
+    """Sidebar: fissa la configurazione corrente o rimuove scenari"""
+    scenarios = get_scenarios()
+
+    with st.sidebar.expander(f"📌 Confronto Scenari ({len(scenarios)}/{MAX_SCENARIOS})", expanded=False):
+        name = st.text_input("Nome scenario", value=next_scenario_name())
+
+        if st.button("Fissa configurazione corrente", disabled=len(scenarios) >= MAX_SCENARIOS):
+            name = name.strip() or next_scenario_name()
+            if pin_scenario(name, params):
+                st.rerun()
+            st.warning(f"Esiste già uno scenario '{name}': scegliere un altro nome")
+
+        for pinned in list(scenarios):
+            col1, col2 = st.columns([3, 1])
+            col1.markdown(f"**{pinned}**")
+            if col2.button("✖", key=f"remove_scenario_{pinned}", help="Rimuovi scenario"):
+                del scenarios[pinned]
+                st.rerun()
+
+
+def archive_sidebar(params: dict):
+    """
+    Sidebar: scenari archiviati su disco (nome alla configurazione corrente,
+    ripristino nel confronto, eliminazione)
+    """
+    store = get_scenario_store()
+    if store is None:
+        return
+    stats = store.stats()
+
+    with st.sidebar.expander(f"🗄️ Archivio Scenari ({stats['entries']})", expanded=False):
+        st.caption(f"{stats['bytes'] / 2**20:.1f}/{stats['max_bytes'] / 2**20:.0f} MB su disco")
+
+        name = st.text_input("Nome configurazione corrente", key="archive_name")
+        if st.button("Salva con nome", disabled=not name.strip()):
+            store.rename(scenario_key(params), name.strip())
+            st.rerun()
+
+        listing = store.list(STORE_CONFIG["list_limit"])
+        if listing.empty:
+            st.caption("Nessuno scenario archiviato")
+            return
+
+        def label(i):
+            row = listing.loc[i]
+            return (f"{row['name'] or 'Senza nome'} · {row['data']} ({row['periodo']}) · "
+                    f"{row['lat']:.2f}, {row['lon']:.2f} · {row['energy_kwh']:.0f} kWh")
+
+        choice = st.selectbox("Scenari archiviati", options=listing.index, format_func=label)
+        selected = listing.loc[choice]
+
+        col1, col2 = st.columns([3, 1])
+        if col1.button("Ripristina nel confronto", disabled=len(get_scenarios()) >= MAX_SCENARIOS):
+            name = selected["name"] or f"Archivio {selected['hash'][:8]}"
+            pin_scenario(next_scenario_name(name) if scenario_name_taken(name) else name,
+                         store.load_params(selected["hash"]))
+            st.rerun()
+        if col2.button("🗑", help="Elimina dall'archivio"):
+            store.delete(selected["hash"])
+            st.rerun()
+
+
+def compute_scenarios(pipeline: Pipeline, current_results) -> dict:
+    """Risultati di tutti gli scenari (più la configurazione corrente)"""
+    computed = {CURRENT_NAME: current_results}
+    for name, params in get_scenarios().items():
+        computed[name] = run_cached(pipeline, params)
+    return computed
+
+
+# ==================== VISUALIZZAZIONE ====================
+
+def _section(results, section: str):
+    return results if section == "pv" else results["agri_results"]
+
+
+ECONOMIC_ROWS = {
+    "Ricavi [€]": "revenue_eur",
+    "Prezzo catturato [€/MWh]": "captured_price",
+    "LCOE [€/MWh]": "lcoe",
+    "Tempo di ritorno [anni]": "payback",
+}
+
+
+def comparison_table(computed: dict, economics: dict = None) -> pd.DataFrame:
+    """Tabella KPI principali: righe = metriche, colonne = scenari (+ indicatori economici)"""
+    rows = {
+        "Energia totale [kWh]": lambda r: r["energy_total_Wh"] / 1000,
+        "Energia per m² [Wh/m²]": lambda r: r["energy_total_Wh_m2"],
+        "POA [Wh/m²]": lambda r: r["POA_Whm2"],
+        "Perdita ombreggiamento file [%]": lambda r: r["row_shading_loss_pct"],
+        "GCR [%]": lambda r: r["gcr"] * 100,
+        "DLI [mol/m²·d]": lambda r: r["agri_results"]["DLI_mol_m2_day"],
+        "Adeguatezza luce [%]": lambda r: r["agri_results"]["crop_light_adequacy_pct"],
+        "Stato coltura": lambda r: r["agri_results"]["crop_status"],
+    }
+    def fmt(value):
+        return f"{value:.1f}" if isinstance(value, (int, float)) else str(value)
+
+    table = pd.DataFrame({
+        name: {label: fmt(value(results)) for label, value in rows.items()}
+        for name, results in computed.items()
+    })
+    if economics:
+        table = pd.concat([table, pd.DataFrame({
+            name: {label: fmt(float(economics[name][key])) for label, key in ECONOMIC_ROWS.items()
+                   if key in economics[name]}
+            for name in computed
+        })])
+    return table
+
+
+def display_scenario_comparison(pipeline: Pipeline, current_results, params: dict = None):
+    """Sezione confronto: tabella KPI, card affiancate e curve orarie"""
+    if not get_scenarios():
+        return
+
+    computed = compute_scenarios(pipeline, current_results)
+    economics = None
+    if params and params.get("economics"):
+        try:
+            economics = scenario_economics(computed, {CURRENT_NAME: params, **get_scenarios()}, params)
+        except (ValueError, OSError):
+            economics = None  # file prezzi non valido: segnalato nella sezione economica
+
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Confronto Scenari'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    st.dataframe(comparison_table(computed, economics), width="stretch")
+
+    # Card affiancate per gruppo di metriche
+    tabs = st.tabs(list(CARD_GROUPS))
+    for tab, (section, generator) in zip(tabs, CARD_GROUPS.values()):
+        with tab:
+            cols = st.columns(len(computed), gap="small")
+            for col, (name, results) in zip(cols, computed.items()):
+                with col:
+                    st.markdown(f"**{name}**")
+                    for card in generator(_section(results, section)):
+                        st.markdown(card, unsafe_allow_html=True)
+
+    # Curve orarie sovrapposte
+    label = st.selectbox("Serie oraria", options=list(COMPARISON_SERIES))
+    section, key = COMPARISON_SERIES[label]
+    # Solo scenari sugli stessi istanti della configurazione corrente
+    # (stesso numero di passi non basta: data, periodo o fuso possono differire)
+    curves = {
+        name: _section(results, section)[key]
+        for name, results in computed.items()
+        if results["times"].equals(current_results["times"])
+    }
+    st.line_chart(chart_frame(curves), x="time", y="valore", color="serie", x_label="", y_label=label)
+    skipped = [name for name in computed if name not in curves]
+    if skipped:
+        st.caption(f"Non sovrapposti (periodo simulato diverso): {', '.join(skipped)}")
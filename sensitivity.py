@@ -0,0 +1,191 @@
+"""
+Modulo Sensitività - Analisi one-at-a-time di energia e DLI
+Ogni parametro viene perturbato in basso e in alto rispetto al nominale;
+tutti gli scenari perturbati sono valutati in un'unica operazione su array
+(scenari × tempo) riusando posizione solare, cielo sereno e temperatura
+ambiente già calcolati dalla pipeline.
+"""
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import pvlib
+import streamlit as st
+
+from config import SENSITIVITY_PARAMS, HECTARE_M2, COLORS
+from calculations import (
+    calculate_row_shaded_fraction,
+    calculate_array_shaded_fraction,
+    calculate_cell_temperature,
+    calculate_tracker_shaded_fraction,
+    tracker_pitch,
+)
+from agri_calculations import (
+    calculate_shadow_projection,
+    calculate_shaded_fraction,
+    TRANSMISSION_COEFF,
+    PAR_FRACTION,
+)
+from results import time_step_hours
+
+
+# ==================== SCENARI PERTURBATI ====================
+
+def build_perturbations(params: dict, rel_step: float = None,
+                        sensitivity_params: dict = SENSITIVITY_PARAMS) -> pd.DataFrame:
+    """
+    Tabella degli scenari: riga 0 = nominale, poi (basso, alto) per ogni
+    parametro. Colonne = parametri perturbati, più "param" e "side".
+    """
+    nominal = {name: float(params[name]) for name in sensitivity_params}
+    rows = [{**nominal, "param": None, "side": "nominale"}]
+
+    for name, (_, step, kind) in sensitivity_params.items():
+        if kind == "rel":
+            delta = abs(nominal[name]) * (rel_step if rel_step is not None else step)
+        else:
+            delta = step
+        for side, sign in (("basso", -1), ("alto", 1)):
+            rows.append({**nominal, name: nominal[name] + sign * delta, "param": name, "side": side})
+
+    scenarios = pd.DataFrame(rows)
+    # Limiti fisici dei parametri
+    scenarios["tilt_pannello"] = scenarios["tilt_pannello"].clip(0, 90)
+    scenarios[["eff", "losses", "albedo"]] = scenarios[["eff", "losses", "albedo"]].clip(0, 1)
+    return scenarios
+
+
+# ==================== VALUTAZIONE VETTORIALE ====================
+
+def evaluate_scenarios(params: dict, stages: dict, scenarios: pd.DataFrame) -> pd.DataFrame:
+    """
+    Energia totale [Wh] e DLI medio giornaliero [mol/m²/d] per ogni scenario,
+    con parametri come colonne (n_scenari, 1) e serie solari (n_tempi,)
+    """
+    col = {name: scenarios[name].to_numpy()[:, None] for name in SENSITIVITY_PARAMS}
+    solpos, clearsky = stages["solpos"], stages["clearsky"]
+    elevation, sun_azimuth = solpos["elevation"].to_numpy(), solpos["azimuth"].to_numpy()
+    ghi = clearsky["ghi"].to_numpy()
+    step_hours = time_step_hours(stages["times"])
+    n_days = max(len(ghi) * step_hours / 24, 1.0)
+
+    # Irradianza sul piano e ombreggiamento tra file
+    orientation = stages.get("orientation")
+    if orientation is None:
+        tilt, azimuth = col["tilt_pannello"], params["azimuth_pannello"]
+        row_fraction = calculate_row_shaded_fraction(
+            elevation, sun_azimuth, col["tilt_pannello"], params["azimuth_pannello"],
+            params["lato_minore"], col["carreggiata"]
+        )
+    else:
+        # Inseguitore: orientamento per istante dalla pipeline, il tilt non è un parametro
+        tilt, azimuth = orientation["surface_tilt"].to_numpy(), orientation["surface_azimuth"].to_numpy()
+        row_fraction = calculate_tracker_shaded_fraction(
+            solpos, orientation["tracker_theta"].to_numpy(), params["azimuth_pannello"],
+            params["lato_minore"], tracker_pitch({**params, "carreggiata": col["carreggiata"]})
+        )
+    poa = pvlib.irradiance.get_total_irradiance(
+        tilt, azimuth,
+        solpos["zenith"].to_numpy(), sun_azimuth,
+        clearsky["dni"].to_numpy(), ghi, clearsky["dhi"].to_numpy(),
+        albedo=col["albedo"]
+    )
+    beam_factor = 1 - calculate_array_shaded_fraction(row_fraction, params["num_rows"])
+    poa_global = poa["poa_direct"] * beam_factor + poa["poa_diffuse"]
+
+    # Produzione
+    T_cell = calculate_cell_temperature({**params, "noct": col["noct"]}, poa_global,
+                                        stages["temperature"].to_numpy(), step_hours)
+    eff_corr = col["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
+    power_total = poa_global * params["area_pannello"] * eff_corr * (1 - col["losses"]) * params["num_panels_total"]
+    energy = power_total.sum(axis=1) * step_hours
+
+    # DLI
+    shadow = calculate_shadow_projection(
+        params["lato_maggiore"], params["lato_minore"], tilt,
+        azimuth, elevation, sun_azimuth, col["altezza_suolo"]
+    )
+    shaded_fraction = calculate_shaded_fraction(
+        shadow, params["num_panels_total"], params["hectares"] * HECTARE_M2, col["pitch_laterale"]
+    )
+    transmission = shaded_fraction * TRANSMISSION_COEFF["under_panel"] + (1 - shaded_fraction)
+    dli = PAR_FRACTION * 4.6 * 3600 * step_hours / 1e6 / n_days * (ghi * transmission).sum(axis=1)
+
+    return scenarios.assign(energy_Wh=energy, DLI=dli)
+
+
+def elasticity_table(evaluated: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per ogni parametro: variazioni percentuali di energia e DLI agli
+    estremi ed elasticità (differenza centrata: ΔY/Y ÷ Δx/x)
+    """
+    nominal = evaluated.iloc[0]
+    rows = []
+    for name, (label, _, _) in SENSITIVITY_PARAMS.items():
+        low = evaluated[(evaluated["param"] == name) & (evaluated["side"] == "basso")].iloc[0]
+        high = evaluated[(evaluated["param"] == name) & (evaluated["side"] == "alto")].iloc[0]
+        dx = (high[name] - low[name]) / nominal[name] if nominal[name] else np.nan
+
+        row = {"Parametro": label}
+        for output, unit in (("energy_Wh", "Energia"), ("DLI", "DLI")):
+            y0 = nominal[output]
+            row[f"{unit} basso [%]"] = (low[output] / y0 - 1) * 100 if y0 else np.nan
+            row[f"{unit} alto [%]"] = (high[output] / y0 - 1) * 100 if y0 else np.nan
+            row[f"Elasticità {unit}"] = ((high[output] - low[output]) / y0 / dx
+                                         if y0 and dx else np.nan)
+        rows.append(row)
+
+    table = pd.DataFrame(rows).set_index("Parametro")
+    return table.reindex(
+        (table["Energia alto [%]"] - table["Energia basso [%]"]).abs().sort_values(ascending=False).index
+    )
+
+
+def run_sensitivity(params: dict, stages: dict, rel_step: float = None) -> pd.DataFrame:
+    """Analisi di sensitività completa (una sola valutazione batch)"""
+    scenarios = build_perturbations(params, rel_step)
+    table = elasticity_table(evaluate_scenarios(params, stages, scenarios))
+    if stages.get("orientation") is not None:
+        table = table.drop(SENSITIVITY_PARAMS["tilt_pannello"][0])
+    return table
+
+
+# ==================== VISUALIZZAZIONE ====================
+
+def tornado_chart(table: pd.DataFrame, output: str) -> alt.Chart:
+    """Grafico tornado: barre dalla variazione con parametro basso a quella con parametro alto"""
+    order = (table[f"{output} alto [%]"] - table[f"{output} basso [%]"]).abs().sort_values(ascending=False).index
+    data = pd.concat([
+        pd.DataFrame({"Parametro": table.index, "Variazione [%]": table[f"{output} basso [%]"],
+                      "Perturbazione": "Parametro basso"}),
+        pd.DataFrame({"Parametro": table.index, "Variazione [%]": table[f"{output} alto [%]"],
+                      "Perturbazione": "Parametro alto"}),
+    ])
+    return alt.Chart(data, title=output).mark_bar().encode(
+        y=alt.Y("Parametro:N", sort=list(order), title=None),
+        x=alt.X("Variazione [%]:Q"),
+        color=alt.Color("Perturbazione:N", scale=alt.Scale(
+            domain=["Parametro basso", "Parametro alto"], range=[COLORS["info"], COLORS["warning"]])),
+        tooltip=["Parametro", "Perturbazione", alt.Tooltip("Variazione [%]:Q", format=".2f")],
+    )
+
+
+def display_sensitivity_section(params: dict, stages: dict):
+    """Sezione sensitività: tornado energia/DLI e tabella elasticità"""
+    if not params.get("sensitivity"):
+        return
+
+    table = run_sensitivity(params, stages, params.get("sensitivity_step"))
+
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Analisi di Sensitività'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    col1, col2 = st.columns(2, gap="medium")
+    col1.altair_chart(tornado_chart(table, "Energia"), use_container_width=True)
+    col2.altair_chart(tornado_chart(table, "DLI"), use_container_width=True)
+
+    st.dataframe(table.round(3), width="stretch")
@@ -0,0 +1,427 @@
+"""
+Modulo Server - Servizio HTTP/JSON di simulazione per integrazioni esterne
+Endpoint (POST, corpo JSON):
+    /simulate  {"params": {...}, "include_series": false}
+    /sweep     {"params": {...}, "param": "tilt", "values": [10, 20, 30]}
+    /batch     {"runs": [{"params": {...}}, ...]}
+    GET /health  stato, coda e latenze osservate rispetto agli obiettivi
+    GET /tiles/<livello>/<z>/<x>/<y>.png  tile del potenziale regionale (tiles.py)
+
+I calcoli girano in processi worker mantenuti caldi (pvlib importato,
+tabelle clearsky in memoria, pipeline con fasi memorizzate). La coda è
+limitata: oltre SERVER_CONFIG["max_pending"] richieste si risponde 503
+con Retry-After, così il servizio degrada senza accumulare ritardi.
+Richieste identiche concorrenti (es. retry di un'integrazione) condividono
+un solo calcolo e non occupano posti in coda.
+
+Avvio: python server.py [--host 127.0.0.1] [--port 8765] [--workers 2]
+Verifica: python server.py --self-test  (flight_key e handler HTTP in processo)
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from config import SERVER_CONFIG
+from cache import SingleFlight, params_hash
+
+
+# ==================== WORKER ====================
+
+def _init_worker():
+    """Importa i moduli di calcolo e scalda le cache con una simulazione"""
+    from config import PARALLEL_CONFIG
+
+    # Il parallelismo è già tra le richieste: niente pool annidati nei worker
+    PARALLEL_CONFIG["workers"] = 1
+    import api
+
+    try:
+        api.simulate({"params": {}})
+    except Exception:
+        pass
+
+
+def _worker_ready(barrier) -> int:
+    """
+    Attende che tutti i worker siano dentro il pool: ogni task occupa un
+    processo diverso e gira solo dopo l'initializer. Restituisce il pid.
+    """
+    barrier.wait()
+    return os.getpid()
+
+
+def _run_operation(name: str, payload: dict) -> dict:
+    import api
+
+    return api.OPERATIONS[name](payload)
+
+
+# ==================== SERVIZIO ====================
+
+class Overloaded(Exception):
+    """Coda piena: la richiesta viene rifiutata (503)"""
+
+
+def _canonical_params(params: dict) -> str:
+    from api import build_params
+    from pipeline import PIPELINE_PARAMS
+
+    return params_hash(build_params(params), PIPELINE_PARAMS)
+
+
+def flight_key(name: str, payload: dict) -> str:
+    """
+    Chiave single-flight sugli input canonici: parametri completi come li
+    vede la pipeline (default, alias e tipi risolti da build_params) più i
+    campi propri dell'operazione. Richieste scritte in modo diverso ma con
+    lo stesso risultato condividono il calcolo.
+
+    Raises:
+        ValueError: parametri non validi (come build_params)
+    """
+    if name == "simulate":
+        fields = {"params": _canonical_params(payload.get("params", {})),
+                  "include_series": bool(payload.get("include_series", False))}
+    elif name == "sweep" and "param" in payload and isinstance(payload.get("values"), list):
+        base = payload.get("params", {})
+        fields = {"param": payload["param"],
+                  "runs": [_canonical_params({**base, payload["param"]: value}) for value in payload["values"]]}
+    elif name == "batch" and all(isinstance(run, dict) for run in payload["runs"]):
+        fields = {"runs": [flight_key("simulate", run) for run in payload["runs"]]}
+    else:
+        fields = {"payload": payload}  # richiesta malformata: l'errore arriva dal worker
+    return params_hash({"operation": name, **fields})
+
+
+class SimulationService:
+    """
+    Pool di worker con coda limitata e statistiche di latenza per endpoint
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None, timeout_s: float = None):
+        self.workers = workers or SERVER_CONFIG["workers"]
+        self.max_pending = max_pending or SERVER_CONFIG["max_pending"]
+        self.timeout_s = timeout_s or SERVER_CONFIG["request_timeout_s"]
+        # spawn: worker puliti anche se il server è avviato da un processo con thread
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.counters = {"served": 0, "rejected": 0, "errors": 0, "timeouts": 0}
+        self.latencies = {name: deque(maxlen=1000) for name in SERVER_CONFIG["latency_targets_ms"]}
+        self._flight = SingleFlight()
+
+    def warm_up(self):
+        """
+        Avvia tutti i worker prima di accettare richieste: un task per worker
+        bloccato su una barriera comune, quindi ogni processo ha completato
+        l'initializer.
+
+        Raises:
+            RuntimeError: non tutti i worker si sono avviati entro il timeout
+        """
+        with multiprocessing.get_context("spawn").Manager() as manager:
+            barrier = manager.Barrier(self.workers, timeout=self.timeout_s)
+            try:
+                pids = set(self.executor.map(_worker_ready, [barrier] * self.workers, timeout=self.timeout_s))
+            except (FutureTimeout, threading.BrokenBarrierError):
+                pids = set()
+        if len(pids) != self.workers:
+            raise RuntimeError(f"Avviati {len(pids)} worker su {self.workers}")
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def run(self, name: str, payload: dict) -> dict:
+        """
+        Esegue un'operazione; richieste equivalenti già in volo ne condividono
+        il risultato (chiave = input canonici, vedi flight_key)
+        """
+        if name == "batch" and not isinstance(payload.get("runs"), list):
+            raise ValueError("batch richiede una lista 'runs'")
+
+        start = time.perf_counter()
+        key = flight_key(name, payload)
+        result = self._flight.do(key, lambda: self._execute(name, payload))
+
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        self._count("served")
+        return result
+
+    def _execute(self, name: str, payload: dict) -> dict:
+        """
+        Esegue un'operazione su un worker.
+        Lo slot di coda si libera al termine effettivo del calcolo (anche
+        dopo un timeout), così la contropressione riflette il carico reale.
+        """
+
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise Overloaded()
+        with self._lock:
+            self.pending += 1
+
+        try:
+            if name == "batch":
+                # Simulazioni indipendenti distribuite su tutti i worker
+                future = _gather([self.executor.submit(_run_operation, "simulate", run)
+                                  for run in payload["runs"]])
+            else:
+                future = self.executor.submit(_run_operation, name, payload)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            result = future.result(timeout=self.timeout_s)
+        except FutureTimeout:
+            self._count("timeouts")
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+        return {"runs": result} if name == "batch" else result
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def health(self) -> dict:
+        """Stato del servizio con latenze osservate (p50/p95) e obiettivi"""
+        latency = {}
+        for name, targets in SERVER_CONFIG["latency_targets_ms"].items():
+            samples = np.array(self.latencies[name])
+            observed = ({"p50": float(np.percentile(samples, 50)), "p95": float(np.percentile(samples, 95))}
+                        if len(samples) else {})
+            latency[name] = {
+                "target_ms": targets,
+                "observed_ms": observed,
+                "samples": int(len(samples)),
+                "within_target": all(observed[k] <= targets[k] for k in observed) if observed else None,
+            }
+        with self._lock:
+            return {
+                "status": "ok",
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                **self.counters,
+                **self._flight.stats(),
+                "latency": latency,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _gather(futures: list):
+    """Future che si completa con la lista dei risultati (nell'ordine dato)"""
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            combined.set_exception(errors[0])
+        else:
+            combined.set_result([f.result() for f in futures])
+
+    if not futures:
+        combined.set_result([])
+    for future in futures:
+        future.add_done_callback(on_done)
+    return combined
+
+
+# ==================== HTTP ====================
+
+class SimulationHandler(BaseHTTPRequestHandler):
+    """Richieste JSON -> SimulationService (self.server.service)"""
+
+    server_version = "APVSimulation/1.0"
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, self.server.service.health())
+        elif self.path.startswith("/tiles/"):
+            from tiles import get_tile_renderer, send_tile
+
+            send_tile(self, *(get_tile_renderer().handle(self.path) or (404, b"")))
+        else:
+            self._send_json(404, {"error": f"Endpoint sconosciuto: {self.path}"})
+
+    def do_POST(self):
+        name = self.path.strip("/")
+        if name not in SERVER_CONFIG["latency_targets_ms"]:
+            self._send_json(404, {"error": f"Endpoint sconosciuto: {self.path}"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > SERVER_CONFIG["max_body_bytes"]:
+            self._send_json(413, {"error": "Corpo della richiesta troppo grande"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("Il corpo deve essere un oggetto JSON")
+            items = payload.get("values") if name == "sweep" else payload.get("runs")
+            if isinstance(items, list) and len(items) > SERVER_CONFIG["max_items"]:
+                raise ValueError(f"Massimo {SERVER_CONFIG['max_items']} elementi per richiesta")
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            result = self.server.service.run(name, payload)
+        except Overloaded:
+            self._send_json(503, {"error": "Servizio sovraccarico, riprovare"}, {"Retry-After": "1"})
+        except FutureTimeout:
+            self._send_json(504, {"error": "Tempo di calcolo superato"})
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            self._send_json(200, result)
+
+
+def create_server(host: str = None, port: int = None, service: SimulationService = None) -> ThreadingHTTPServer:
+    """Server HTTP (non avviato) collegato al servizio di simulazione"""
+    server = ThreadingHTTPServer((host or SERVER_CONFIG["host"], SERVER_CONFIG["port"] if port is None else port),
+                                 SimulationHandler)
+    server.daemon_threads = True
+    server.service = service or SimulationService()
+    return server
+
+
+# ==================== VERIFICA ====================
+
+def _request(server, method: str, path: str, body: bytes = None) -> tuple:
+    """Richiesta al server locale: (stato, corpo JSON)"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=SERVER_CONFIG["request_timeout_s"])
+    try:
+        conn.request(method, path, body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+
+def self_check(workers: int = 1):
+    """
+    Verifica in processo di flight_key e del servizio HTTP (server su porta
+    libera di localhost, worker reali): chiavi canoniche, codici di stato e
+    coalescenza delle richieste identiche
+
+    Raises:
+        AssertionError: primo controllo fallito
+    """
+    # --- flight_key: stessi input canonici -> stessa chiave ---
+    key = flight_key("simulate", {"params": {"tilt": 30}})
+    assert key == flight_key("simulate", {"params": {"tilt_pannello": "30.0"}}), "alias/tipi non canonici"
+    assert key != flight_key("simulate", {"params": {"tilt": 31}}), "parametri diversi, stessa chiave"
+    assert key != flight_key("simulate", {"params": {"tilt": 30}, "include_series": True}), "include_series ignorato"
+    assert (flight_key("sweep", {"params": {"lat": 45}, "param": "tilt", "values": [10, 20]})
+            == flight_key("sweep", {"params": {"lat": "45"}, "param": "tilt", "values": ["10", 20.0]})), "sweep"
+    assert (flight_key("batch", {"runs": [{"params": {"tilt": 30}}]})
+            == flight_key("batch", {"runs": [{"params": {"tilt_pannello": 30.0}}]})), "batch"
+    try:
+        flight_key("simulate", {"params": {"sconosciuto": 1}})
+        raise AssertionError("parametro sconosciuto accettato")
+    except ValueError:
+        pass
+
+    # --- handler HTTP ---
+    service = SimulationService(workers=workers)
+    service.warm_up()
+    server = create_server("127.0.0.1", 0, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        status, body = _request(server, "GET", "/health")
+        assert status == 200 and body["workers"] == workers, f"/health: {status}"
+        assert _request(server, "GET", "/sconosciuto")[0] == 404, "GET sconosciuto"
+        assert _request(server, "POST", "/sconosciuto", b"{}")[0] == 404, "POST sconosciuto"
+        assert _request(server, "POST", "/simulate", b"{non json")[0] == 400, "JSON non valido"
+        assert _request(server, "POST", "/simulate", b"[]")[0] == 400, "corpo non oggetto"
+        assert _request(server, "POST", "/simulate", b'{"params": {"tilt": "x"}}')[0] == 400, "tilt non numerico"
+        assert _request(server, "POST", "/batch", b'{"runs": 1}')[0] == 400, "batch senza lista"
+
+        body = json.dumps({"params": {"tilt": 25}}).encode()
+        status, result = _request(server, "POST", "/simulate", body)
+        assert status == 200 and result["pv"]["energy_total_Wh"] > 0, f"/simulate: {status} {result}"
+
+        # Richieste identiche concorrenti (simulazione annuale, abbastanza lunga): un solo calcolo
+        before = service.health()["coalesced"]
+        body = json.dumps({"params": {"tilt": 26, "periodo": "Anno"}}).encode()
+        threads = [threading.Thread(target=_request, args=(server, "POST", "/simulate", body)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        health = service.health()
+        assert health["coalesced"] > before, "richieste identiche non condivise"
+        assert health["errors"] == 0, f"errori: {health}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servizio HTTP/JSON di simulazione agrivoltaica")
+    parser.add_argument("--host", default=SERVER_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=SERVER_CONFIG["port"])
+    parser.add_argument("--workers", type=int, default=SERVER_CONFIG["workers"])
+    parser.add_argument("--max-pending", type=int, default=SERVER_CONFIG["max_pending"])
+    parser.add_argument("--self-test", action="store_true", help="Verifica flight_key e handler HTTP ed esce")
+    args = parser.parse_args()
+
+    if args.self_test:
+        self_check(args.workers)
+        print("Verifica completata")
+        return
+
+    service = SimulationService(args.workers, args.max_pending)
+    service.warm_up()
+    server = create_server(args.host, args.port, service)
+    print(f"Servizio di simulazione su http://{args.host}:{server.server_port} ({args.workers} worker)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,10 @@ from datetime import date
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderServiceError, GeocoderTimedOut
 import time
-from config import DEFAULT_PARAMS, LOGO_URL, TIMEZONE_OBJ
+from concurrent.futures import ThreadPoolExecutor
+from config import (DEFAULT_PARAMS, LOGO_URL, TIMEZONE_OBJ, GEOCODING_CONFIG, MESSAGES, MONTE_CARLO_CONFIG,
+                    HECTARE_M2, TEMPERATURE_MODELS, ECONOMICS_CONFIG, STORAGE_CONFIG)
+from layout import parse_field_geojson, field_area_m2
 
 
 # ==================== HEADER SIDEBAR ====================
@@ -83,41 +86,157 @@ from functools import lru_cache
 
 @lru_cache(maxsize=200)
 def cached_geocode(comune: str):
-    geolocator = Nominatim(user_agent="resfarm@monitoring.com", timeout=10)
+    geolocator = Nominatim(user_agent="resfarm@monitoring.com", timeout=GEOCODING_CONFIG["timeout_s"])
     return geolocator.geocode(f"{comune}, Italia")
 
 
-def get_location_from_comune(comune: str, max_retries: int = 3):
+def get_location_from_comune(comune: str, max_retries: int = 3, deadline: float = None):
     """Ritorna (lat, lon, location) o (None, None, None) se fallisce"""
     for attempt in range(max_retries):
         try:
             if loc := cached_geocode(comune):
                 return loc.latitude, loc.longitude, loc
         except (GeocoderServiceError, GeocoderTimedOut):
+            if deadline is not None and time.monotonic() + attempt + 1 >= deadline:
+                break
             time.sleep(attempt + 1)
         except Exception:
             break
 
     return None, None, None
 
+
+# ==================== GEOCODING IN BACKGROUND ====================
+
+# Pool condiviso tra tutte le sessioni: le ricerche non bloccano mai il rerun
+_geocode_executor = ThreadPoolExecutor(
+    max_workers=GEOCODING_CONFIG["max_workers"],
+    thread_name_prefix="geocoding"
+)
+
+
+def get_geocoding_state() -> dict:
+    """Stato del geocoding della sessione (ultime coordinate note + ricerca in corso)"""
+    if "geocoding" not in st.session_state:
+        st.session_state["geocoding"] = {
+            "requested": DEFAULT_PARAMS["comune"],  # ultimo comune digitato
+            "resolved": None,  # comune a cui si riferiscono lat/lon
+            "lat": DEFAULT_PARAMS["lat"],
+            "lon": DEFAULT_PARAMS["lon"],
+            "location": None,
+            "failed": False,
+            "changed_at": 0.0,
+            "future": None,
+            "submitted_at": 0.0,
+        }
+    return st.session_state["geocoding"]
+
+
+def request_geocoding(state: dict, comune: str):
+    """Registra il comune digitato; la ricerca parte dopo il debounce"""
+    if comune == state["requested"]:
+        return
+
+    if state["future"] is not None:
+        state["future"].cancel()
+
+    state.update(requested=comune, changed_at=time.monotonic(), future=None, failed=False)
+
+
+def update_geocoding(state: dict) -> bool:
+    """
+    Avanza la ricerca in background: avvio dopo il debounce, raccolta del
+    risultato o scadenza del timeout
+
+    Returns:
+        True se le coordinate della sessione sono cambiate
+    """
+    now = time.monotonic()
+
+    if state["requested"] == state["resolved"] or state["failed"]:
+        return False
+
+    if state["future"] is None:
+        if now - state["changed_at"] >= GEOCODING_CONFIG["debounce_s"]:
+            deadline = now + GEOCODING_CONFIG["timeout_s"]
+            state["future"] = _geocode_executor.submit(
+                get_location_from_comune, state["requested"], deadline=deadline
+            )
+            state["submitted_at"] = now
+        return False
+
+    if state["future"].done():
+        lat, lon, location = state["future"].result()
+    elif now - state["submitted_at"] > GEOCODING_CONFIG["timeout_s"]:
+        # Timeout rigido: il risultato tardivo viene ignorato
+        lat, lon, location = None, None, None
+    else:
+        return False
+
+    state["future"] = None
+    if lat is None or lon is None:
+        state["failed"] = True
+    else:
+        state.update(resolved=state["requested"], lat=lat, lon=lon, location=location)
+    return True
+
+
+def geocoding_pending(state: dict) -> bool:
+    """True se una ricerca è in attesa di debounce o in esecuzione"""
+    return state["requested"] != state["resolved"] and not state["failed"]
+
+
+@st.fragment(run_every=GEOCODING_CONFIG["poll_s"])
+def poll_geocoding():
+    """Controlla periodicamente la ricerca e rilancia l'app al completamento"""
+    state = get_geocoding_state()
+    if update_geocoding(state):
+        st.rerun(scope="app")
+    if geocoding_pending(state):
+        st.caption(MESSAGES["location_pending"].format(comune=state["requested"]))
+
 # ==================== SEZIONI INPUT ====================
 
 def get_location_and_date():
     """Raccoglie località e data simulazione"""
+    state = get_geocoding_state()
+
     with st.sidebar.expander("🌍 Localizzazione e Data", expanded=False):
         col1, col2 = st.columns(2)
         
         with col1:
             comune = st.text_input("Comune", value=DEFAULT_PARAMS["comune"])
-            lat, lon, location = get_location_from_comune(comune)
+            request_geocoding(state, comune)
+            update_geocoding(state)
         
         with col2:
             data_sim = st.date_input("Data", value=date.today())
+
+        col1, col2 = st.columns(2)
+        periodo = col1.selectbox(
+            "Periodo",
+            options=["Giorno", "Anno"],
+            index=["Giorno", "Anno"].index(DEFAULT_PARAMS["periodo"]),
+            help="Giornata selezionata o intero anno della data"
+        )
+        risoluzione = col2.selectbox(
+            "Risoluzione [min]",
+            options=[60, 30, 15],
+            index=[60, 30, 15].index(DEFAULT_PARAMS["risoluzione_min"]),
+            help="Passo temporale della simulazione"
+        )
+
+        # Ricerca in corso: si usano le ultime coordinate note
+        if geocoding_pending(state):
+            poll_geocoding()
+
+        lat, lon, location = state["lat"], state["lon"], state["location"]
         
         # Fallback manuale se geocoding fallisce
-        if lat is None or lon is None:
-            lat = st.number_input("Latitudine [°]", value=DEFAULT_PARAMS["lat"], format="%.4f")
-            lon = st.number_input("Longitudine [°]", value=DEFAULT_PARAMS["lon"], format="%.4f")
+        if state["failed"]:
+            st.caption(MESSAGES["location_not_found"])
+            lat = st.number_input("Latitudine [°]", value=float(lat), format="%.4f")
+            lon = st.number_input("Longitudine [°]", value=float(lon), format="%.4f")
             location = None
     
     return {
@@ -126,7 +245,9 @@ def get_location_and_date():
         "lon": lon,
         "timezone": TIMEZONE_OBJ,
         "location": location,
-        "data": data_sim
+        "data": data_sim,
+        "periodo": periodo,
+        "risoluzione_min": risoluzione
     }
 
 
@@ -220,21 +341,65 @@ def get_all_panel_params():
         )
 
         # --- Orientamento ---
+        mount = st.radio(
+            "Montaggio",
+            ["Fisso", "Monoassiale"],
+            index=["Fisso", "Monoassiale"].index(DEFAULT_PARAMS["mount"]),
+            horizontal=True,
+            help="Monoassiale: inseguitore ad asse orizzontale con backtracking"
+        )
+        tracker = {
+            "max_angle": DEFAULT_PARAMS["max_angle"],
+            "backtrack": DEFAULT_PARAMS["backtrack"],
+            "steer_window_h": DEFAULT_PARAMS["steer_window_h"],
+            "steer_fraction": DEFAULT_PARAMS["steer_fraction"],
+        }
         col1, col2 = st.columns(2)
 
-        tilt = col1.slider(
-            "Tilt [°]",
-            0, 90,
-            int(DEFAULT_PARAMS["tilt"]),
-            help="Inclinazione rispetto all'orizzontale"
-        )
+        if mount == "Fisso":
+            tilt = col1.slider(
+                "Tilt [°]",
+                0, 90,
+                int(DEFAULT_PARAMS["tilt"]),
+                help="Inclinazione rispetto all'orizzontale"
+            )
+        else:
+            # Ingombri e interasse calcolati con moduli in piano
+            tilt = 0
+            tracker["max_angle"] = float(col1.slider(
+                "Rotazione Max [°]",
+                0, 90,
+                int(DEFAULT_PARAMS["max_angle"]),
+                help="Rotazione massima dell'inseguitore rispetto al piano"
+            ))
         azimuth = col2.slider(
-            "Azimuth [°]",
+            "Azimuth [°]" if mount == "Fisso" else "Azimuth Asse [°]",
             0, 360,
             int(DEFAULT_PARAMS["azimuth"]),
-            help="Direzione del pannello"
+            help="Direzione del pannello" if mount == "Fisso" else "Direzione dell'asse di rotazione (180 = Nord-Sud)"
         )
 
+        if mount == "Monoassiale":
+            tracker["backtrack"] = st.checkbox(
+                "Backtracking",
+                value=DEFAULT_PARAMS["backtrack"],
+                help="Riduce la rotazione a sole basso per evitare ombre tra le file"
+            )
+            col1, col2 = st.columns(2)
+            tracker["steer_window_h"] = float(col1.slider(
+                "Finestra Colture [h]",
+                0, 12,
+                int(DEFAULT_PARAMS["steer_window_h"]),
+                help="Ore attorno al mezzogiorno solare in cui i moduli vengono deviati"
+            ))
+            tracker["steer_fraction"] = col2.slider(
+                "Deviazione [%]",
+                0, 100,
+                int(DEFAULT_PARAMS["steer_fraction"] * 100),
+                step=25,
+                help="0% = inseguimento, 100% = moduli paralleli ai raggi (più luce alle colture)"
+            ) / 100
+
         # --- Parametri elettrici ---
         col1, col2 = st.columns(2)
 
@@ -275,6 +440,8 @@ def get_all_panel_params():
         "altezza_suolo": altezza_suolo,  
         "tilt_pannello": tilt,
         "azimuth_pannello": azimuth,
+        "mount": mount,
+        **tracker,
         "eff": eff,
         "temp_coeff": temp_coeff,
         "noct": noct
@@ -310,18 +477,104 @@ def get_system_params():
         "albedo": albedo
     }
 
-def get_agricultural_params():
-    """Raccoglie parametri agricoli"""
-    with st.sidebar.expander("🌽 Parametri Agricoli", expanded=False):
+def get_thermal_params():
+    """Raccoglie modello di temperatura celle, vento e inerzia termica"""
+    with st.sidebar.expander("🌡️ Modello Termico", expanded=False):
+        temp_model = st.selectbox(
+            "Modello temperatura celle",
+            options=list(TEMPERATURE_MODELS),
+            index=list(TEMPERATURE_MODELS).index(DEFAULT_PARAMS["temp_model"]),
+            help="NOCT (senza vento), Faiman o SAPM (con vento)"
+        )
         col1, col2 = st.columns(2)
-        hectares = col1.number_input(
-            "Ettari Totali",
-            value=float(DEFAULT_PARAMS["hectares"]),
-            min_value=0.1,
-            step=0.1,
-            format="%.2f",
-            help="Superficie disponibile del sito"
+        wind_speed = col1.number_input(
+            "Vento [m/s]",
+            value=float(DEFAULT_PARAMS["wind_speed"]),
+            min_value=0.0,
+            max_value=30.0,
+            step=0.5,
+            disabled=temp_model == "NOCT",
+            help="Velocità media del vento a quota modulo"
+        )
+        thermal_tau = col2.number_input(
+            "Inerzia τ [min]",
+            value=float(DEFAULT_PARAMS["thermal_tau_min"]),
+            min_value=0.0,
+            max_value=60.0,
+            step=1.0,
+            help="Costante di tempo termica del modulo (0 = temperatura di regime)"
+        )
+
+    return {
+        "temp_model": temp_model,
+        "wind_speed": wind_speed,
+        "thermal_tau_min": thermal_tau
+    }
+
+def get_field_polygon_params():
+    """
+    Poligono reale del campo: caricato da GeoJSON o disegnato sulla mappa
+    (salvato in session_state["field_polygon"] da maps.py)
+    """
+    with st.sidebar.expander("🗺️ Poligono del Campo", expanded=False):
+        uploaded = st.file_uploader(
+            "Carica GeoJSON",
+            type=["geojson", "json"],
+            help="Poligono del campo in coordinate lon/lat (in alternativa disegnalo sulla mappa)"
         )
+        if uploaded is not None and st.session_state.get("field_polygon_file") != uploaded.file_id:
+            st.session_state["field_polygon_file"] = uploaded.file_id
+            try:
+                st.session_state["field_polygon"] = parse_field_geojson(uploaded.getvalue())
+            except (ValueError, KeyError) as e:
+                st.error(f"GeoJSON non valido: {e}")
+
+        field_polygon = st.session_state.get("field_polygon")
+        setback = st.number_input(
+            "Fascia di rispetto [m]",
+            value=float(DEFAULT_PARAMS["setback"]),
+            min_value=0.0,
+            step=1.0,
+            format="%.1f",
+            disabled=field_polygon is None,
+            help="Distanza minima dei pannelli dal confine del campo"
+        )
+
+        if field_polygon is not None:
+            st.caption(f"Campo: {field_area_m2(field_polygon) / HECTARE_M2:.2f} ha")
+            if st.button("Rimuovi poligono"):
+                st.session_state.pop("field_polygon", None)
+                st.rerun()
+        else:
+            st.caption("Nessun poligono: campo approssimato come quadrato")
+
+    return {
+        "field_polygon": field_polygon,
+        "setback": setback
+    }
+
+def get_agricultural_params(field_polygon: dict = None):
+    """Raccoglie parametri agricoli (ettari dal poligono del campo, se presente)"""
+    with st.sidebar.expander("🌽 Parametri Agricoli", expanded=False):
+        col1, col2 = st.columns(2)
+        if field_polygon is not None:
+            hectares = field_area_m2(field_polygon) / HECTARE_M2
+            col1.number_input(
+                "Ettari Totali",
+                value=round(hectares, 2),
+                format="%.2f",
+                disabled=True,
+                help="Superficie calcolata dal poligono del campo"
+            )
+        else:
+            hectares = col1.number_input(
+                "Ettari Totali",
+                value=float(DEFAULT_PARAMS["hectares"]),
+                min_value=0.1,
+                step=0.1,
+                format="%.2f",
+                help="Superficie disponibile del sito"
+            )
         colture = col2.selectbox(
             "Tipo di Coltura",
             options=[
@@ -345,6 +598,218 @@ def get_agricultural_params():
         "hectares": hectares
     }
 
+def get_uncertainty_params():
+    """Raccoglie opzioni analisi di incertezza (Monte Carlo)"""
+    with st.sidebar.expander("🎲 Analisi Incertezza", expanded=False):
+        monte_carlo = st.checkbox(
+            "Abilita Monte Carlo",
+            value=False,
+            help="Campiona efficienza, perdite, coeff. termico, albedo e trasmissione sotto pannello"
+        )
+        col1, col2 = st.columns(2)
+        samples = col1.number_input(
+            "Campioni",
+            value=int(MONTE_CARLO_CONFIG["samples"]),
+            min_value=100,
+            max_value=100000,
+            step=1000,
+            disabled=not monte_carlo
+        )
+        seed = col2.number_input(
+            "Seed",
+            value=int(MONTE_CARLO_CONFIG["seed"]),
+            min_value=0,
+            step=1,
+            disabled=not monte_carlo,
+            help="Stesso seed = stessi campioni"
+        )
+
+    return {
+        "monte_carlo": monte_carlo,
+        "mc_samples": int(samples),
+        "mc_seed": int(seed)
+    }
+
+def get_sensitivity_params():
+    """Raccoglie opzioni analisi di sensitività (tornado)"""
+    with st.sidebar.expander("🌪️ Analisi Sensitività", expanded=False):
+        sensitivity = st.checkbox(
+            "Abilita sensitività",
+            value=False,
+            help="Perturba tilt, interfila, pitch, altezza, efficienza, perdite, albedo e NOCT"
+        )
+        step = st.slider(
+            "Passo perturbazione [%]",
+            1, 30, 10,
+            disabled=not sensitivity,
+            help="Variazione relativa ± applicata ai parametri (tilt: ±5°)"
+        )
+
+    return {
+        "sensitivity": sensitivity,
+        "sensitivity_step": step / 100
+    }
+
+def get_economics_params():
+    """Raccoglie prezzi dell'energia e ipotesi economiche di progetto"""
+    with st.sidebar.expander("💶 Analisi Economica", expanded=False):
+        economics = st.checkbox(
+            "Abilita analisi economica",
+            value=True,
+            help="Ricavi orari, LCOE, VAN e tempo di ritorno (LCOE e ritorno solo su periodo 'Anno')"
+        )
+        uploaded = st.file_uploader(
+            "Prezzi orari CSV [€/MWh]",
+            type=["csv", "txt"],
+            disabled=not economics,
+            help="Es. PUN o prezzo zonale GME: colonne Data/Ora o timestamp + prezzo; "
+                 "senza file si usa il prezzo fisso"
+        )
+        price_column = st.text_input(
+            "Colonna prezzo",
+            value="",
+            disabled=not economics or uploaded is None,
+            help="Nome della colonna (es. zona NORD); vuoto = prima colonna numerica"
+        )
+        col1, col2 = st.columns(2)
+        price = col1.number_input(
+            "Prezzo fisso [€/MWh]",
+            value=float(ECONOMICS_CONFIG["price_eur_mwh"]),
+            min_value=0.0,
+            step=5.0,
+            disabled=not economics
+        )
+        capex = col2.number_input(
+            "CAPEX [€/kWp]",
+            value=float(ECONOMICS_CONFIG["capex_eur_kwp"]),
+            min_value=0.0,
+            step=50.0,
+            disabled=not economics
+        )
+        opex = col1.number_input(
+            "OPEX [€/kWp·anno]",
+            value=float(ECONOMICS_CONFIG["opex_eur_kwp_y"]),
+            min_value=0.0,
+            step=1.0,
+            disabled=not economics
+        )
+        life = col2.number_input(
+            "Vita utile [anni]",
+            value=int(ECONOMICS_CONFIG["life_years"]),
+            min_value=1,
+            max_value=50,
+            step=1,
+            disabled=not economics
+        )
+        discount = col1.number_input(
+            "Tasso sconto [%]",
+            value=float(ECONOMICS_CONFIG["discount_rate"] * 100),
+            min_value=0.0,
+            max_value=30.0,
+            step=0.5,
+            disabled=not economics
+        ) / 100
+        degradation = col2.number_input(
+            "Degrado [%/anno]",
+            value=float(ECONOMICS_CONFIG["degradation"] * 100),
+            min_value=0.0,
+            max_value=5.0,
+            step=0.1,
+            disabled=not economics
+        ) / 100
+
+    return {
+        "economics": economics,
+        "price_data": uploaded.getvalue() if economics and uploaded is not None else None,
+        "price_column": price_column.strip() or None,
+        "price_eur_mwh": price,
+        "capex_eur_kwp": capex,
+        "opex_eur_kwp_y": opex,
+        "life_years": int(life),
+        "discount_rate": discount,
+        "degradation": degradation
+    }
+
+def get_storage_params():
+    """Raccoglie profilo di carico aziendale e caratteristiche della batteria"""
+    with st.sidebar.expander("🔋 Accumulo e Carichi", expanded=False):
+        storage = st.checkbox(
+            "Abilita accumulo",
+            value=False,
+            help="Dispacciamento orario della batteria sui carichi (irrigazione, celle frigo) "
+                 "con sweep della capacità"
+        )
+        uploaded = st.file_uploader(
+            "Profilo di carico CSV [kW]",
+            type=["csv", "txt"],
+            disabled=not storage,
+            help="Colonne Data/Ora, timestamp o sola Ora (giorno tipo) + carico; "
+                 "senza file si usa il carico costante"
+        )
+        load_column = st.text_input(
+            "Colonna carico",
+            value="",
+            disabled=not storage or uploaded is None,
+            help="Nome della colonna; vuoto = prima colonna numerica"
+        )
+        col1, col2 = st.columns(2)
+        load_kw = col1.number_input(
+            "Carico costante [kW]",
+            value=float(STORAGE_CONFIG["load_kw"]),
+            min_value=0.0,
+            step=0.5,
+            disabled=not storage
+        )
+        capacity = col2.number_input(
+            "Capacità [kWh]",
+            value=float(STORAGE_CONFIG["capacity_kwh"]),
+            min_value=0.0,
+            step=5.0,
+            disabled=not storage
+        )
+        power = col1.number_input(
+            "Potenza [kW]",
+            value=float(STORAGE_CONFIG["power_kw"]),
+            min_value=0.0,
+            step=1.0,
+            disabled=not storage
+        )
+        efficiency = col2.number_input(
+            "Rendimento ciclo [%]",
+            value=float(STORAGE_CONFIG["efficiency"] * 100),
+            min_value=50.0,
+            max_value=100.0,
+            step=1.0,
+            disabled=not storage
+        ) / 100
+        soc_min = col1.number_input(
+            "SOC minimo [%]",
+            value=float(STORAGE_CONFIG["soc_min"] * 100),
+            min_value=0.0,
+            max_value=90.0,
+            step=5.0,
+            disabled=not storage
+        ) / 100
+        sweep_max = col2.number_input(
+            "Sweep fino a [kWh]",
+            value=float(STORAGE_CONFIG["sweep_max_kwh"]),
+            min_value=1.0,
+            step=10.0,
+            disabled=not storage
+        )
+
+    return {
+        "storage": storage,
+        "load_data": uploaded.getvalue() if storage and uploaded is not None else None,
+        "load_column": load_column.strip() or None,
+        "load_kw": load_kw,
+        "capacity_kwh": capacity,
+        "power_kw": power,
+        "efficiency": efficiency,
+        "soc_min": soc_min,
+        "sweep_max_kwh": sweep_max
+    }
+
 # ==================== FUNZIONE PRINCIPALE ====================
 
 def sidebar_inputs():
@@ -361,12 +826,24 @@ def sidebar_inputs():
     location_data = get_location_and_date()
     panel_params = get_all_panel_params()  
     system = get_system_params()
-    crops = get_agricultural_params()
+    thermal = get_thermal_params()
+    field = get_field_polygon_params()
+    crops = get_agricultural_params(field["field_polygon"])
+    uncertainty = get_uncertainty_params()
+    sensitivity = get_sensitivity_params()
+    economics = get_economics_params()
+    storage = get_storage_params()
 
     # Merge tutti i parametri
     return {
         **location_data,
         **panel_params,
         **system,
-        **crops
+        **thermal,
+        **field,
+        **crops,
+        **uncertainty,
+        **sensitivity,
+        **economics,
+        **storage
     }
@@ -0,0 +1,220 @@
+"""
+Modulo Accumulo - Dispacciamento orario di una batteria sui carichi aziendali
+La produzione PV (power_total_W) viene confrontata con un profilo di carico
+locale (irrigazione, celle frigo): l'eccedenza carica la batteria, il
+deficit la scarica, nei limiti di capacità, potenza, rendimento e stato di
+carica minimo. Il ciclo sullo stato di carica è sequenziale nel tempo ma
+vettoriale sulle taglie di batteria: uno sweep di decine di taglie su un
+anno orario costa un solo passaggio sulle ore.
+"""
+
+import time
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import STORAGE_CONFIG, COLORS
+from results import time_step_hours
+from economics import load_hourly_series, hourly_matrix
+from metrics import create_metric_card, display_card_group, format_value
+
+
+def storage_params(params: dict) -> dict:
+    """Ipotesi su batteria e carichi: valori della sidebar, altrimenti STORAGE_CONFIG"""
+    return {key: params.get(key, default) if params.get(key) is not None else default
+            for key, default in STORAGE_CONFIG.items()}
+
+
+# ==================== CARICO ====================
+
+def load_profile_w(params: dict, times: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Carico [W] sulle ore simulate: profilo CSV [kW] (file caricato o
+    STORAGE_CONFIG["load_csv"], media sugli anni presenti) o carico costante
+    """
+    config = storage_params(params)
+    profile = load_hourly_series(params.get("load_data"), config["load_csv"], params.get("load_column"))
+    if profile is None:
+        return np.full(len(times), config["load_kw"] * 1000.0)
+    _, matrix = hourly_matrix(profile, times)
+    return matrix.mean(axis=0) * 1000.0
+
+
+# ==================== DISPACCIAMENTO ====================
+
+def simulate_dispatch(pv_w, load_w, step_hours: float, capacity_wh, power_w,
+                      efficiency: float, soc_min: float = 0.0, keep_soc: bool = False) -> dict:
+    """
+    Dispacciamento per autoconsumo: ogni passo carica con l'eccedenza PV o
+    scarica sul deficit, limitato da potenza, spazio/energia disponibile e
+    rendimento (ripartito in modo simmetrico tra carica e scarica).
+    Batteria inizialmente al minimo.
+
+    Args:
+        pv_w, load_w: potenza PV e carico [W], (n_tempi,)
+        capacity_wh, power_w: taglie da confrontare, scalari o (n_taglie,)
+
+    Returns:
+        dict di array (n_taglie,) [Wh]: charged, discharged, export, import,
+        self_consumed; frazioni self_consumption (su PV) e self_sufficiency
+        (sul carico); soc (n_taglie, n_tempi) [Wh] se keep_soc
+    """
+    pv_w, load_w = np.asarray(pv_w, dtype=float), np.asarray(load_w, dtype=float)
+    capacity = np.atleast_1d(np.asarray(capacity_wh, dtype=float))
+    power = np.broadcast_to(np.asarray(power_w, dtype=float), capacity.shape)
+    eta = np.sqrt(efficiency)
+
+    # Eccedenza e deficit per passo [Wh]: uguali per tutte le taglie
+    net = (pv_w - load_w) * step_hours
+    surplus = np.maximum(net, 0.0)
+    deficit = np.maximum(-net, 0.0)
+
+    floor = soc_min * capacity
+    step_energy = power * step_hours
+    soc = floor.copy()
+    charged = np.zeros_like(capacity)
+    discharged = np.zeros_like(capacity)
+    flow = np.empty_like(capacity)
+    history = np.empty((len(capacity), len(net)), dtype=np.float32) if keep_soc else None
+
+    # Ciclo sequenziale sulle ore, vettoriale sulle taglie (buffer preallocati)
+    minimum, multiply, add, subtract = np.minimum, np.multiply, np.add, np.subtract
+    headroom = np.empty_like(capacity)
+    for t, (s, d) in enumerate(zip(surplus.tolist(), deficit.tolist())):
+        if s > 0.0:
+            subtract(capacity, soc, out=headroom)
+            headroom /= eta
+            minimum(step_energy, s, out=flow)
+            minimum(flow, headroom, out=flow)
+            add(charged, flow, out=charged)
+            flow *= eta
+            add(soc, flow, out=soc)
+        elif d > 0.0:
+            subtract(soc, floor, out=headroom)
+            headroom *= eta
+            minimum(step_energy, d, out=flow)
+            minimum(flow, headroom, out=flow)
+            add(discharged, flow, out=discharged)
+            flow /= eta
+            subtract(soc, flow, out=soc)
+        if history is not None:
+            history[:, t] = soc
+
+    direct = np.minimum(pv_w, load_w).sum() * step_hours
+    pv_total, load_total = pv_w.sum() * step_hours, load_w.sum() * step_hours
+    self_consumed = direct + discharged
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = {
+            "charged": charged,
+            "discharged": discharged,
+            "export": surplus.sum() - charged,
+            "import": deficit.sum() - discharged,
+            "self_consumed": self_consumed,
+            "self_consumption": self_consumed / pv_total if pv_total else np.zeros_like(capacity),
+            "self_sufficiency": self_consumed / load_total if load_total else np.zeros_like(capacity),
+            "cycles": np.where(capacity > floor, discharged / (capacity - floor), 0.0),
+        }
+    if history is not None:
+        result["soc"] = history
+    return result
+
+
+def run_storage_sweep(results, params: dict) -> tuple:
+    """
+    Batteria selezionata e sweep di capacità (stesso rapporto potenza/capacità)
+
+    Returns:
+        (DataFrame con una riga per taglia, indice della taglia selezionata, secondi impiegati)
+    """
+    config = storage_params(params)
+    times = results["times"]
+    load = load_profile_w(params, times)
+
+    capacities = np.unique(np.r_[np.linspace(0, config["sweep_max_kwh"], int(config["sweep_steps"])),
+                                 config["capacity_kwh"]])
+    c_rate = config["power_kw"] / config["capacity_kwh"] if config["capacity_kwh"] else 1.0
+
+    start = time.perf_counter()
+    dispatch = simulate_dispatch(
+        results.values("power_total_W"), load, time_step_hours(times),
+        capacities * 1000, capacities * c_rate * 1000, config["efficiency"], config["soc_min"]
+    )
+    elapsed = time.perf_counter() - start
+
+    sweep = pd.DataFrame({
+        "capacity_kwh": capacities,
+        "power_kw": capacities * c_rate,
+        "self_consumption_pct": dispatch["self_consumption"] * 100,
+        "self_sufficiency_pct": dispatch["self_sufficiency"] * 100,
+        "export_kwh": dispatch["export"] / 1000,
+        "import_kwh": dispatch["import"] / 1000,
+        "cycles": dispatch["cycles"],
+    })
+    selected = int(np.flatnonzero(capacities == config["capacity_kwh"])[0])
+    return sweep, selected, elapsed
+
+
+# ==================== VISUALIZZAZIONE ====================
+
+def sweep_chart(sweep: pd.DataFrame, selected_kwh: float) -> alt.Chart:
+    """Autoconsumo e autosufficienza in funzione della capacità"""
+    data = sweep.melt(
+        id_vars="capacity_kwh", value_vars=["self_consumption_pct", "self_sufficiency_pct"],
+        var_name="indicatore", value_name="valore"
+    ).replace({"self_consumption_pct": "Autoconsumo", "self_sufficiency_pct": "Autosufficienza"})
+    lines = alt.Chart(data).mark_line(point=True).encode(
+        x=alt.X("capacity_kwh:Q", title="Capacità batteria [kWh]"),
+        y=alt.Y("valore:Q", title="[%]", scale=alt.Scale(zero=False)),
+        color=alt.Color("indicatore:N", title=None, scale=alt.Scale(range=[COLORS["primary"], COLORS["info"]])),
+        tooltip=[alt.Tooltip("capacity_kwh:Q", title="Capacità [kWh]"),
+                 alt.Tooltip("indicatore:N"), alt.Tooltip("valore:Q", format=".1f")],
+    )
+    rule = alt.Chart(pd.DataFrame({"capacity_kwh": [selected_kwh]})).mark_rule(
+        color=COLORS["warning"], strokeDash=[4, 4]).encode(x="capacity_kwh:Q")
+    return lines + rule
+
+
+def display_storage_section(results, params: dict):
+    """Sezione accumulo: batteria selezionata, sweep di capacità e flussi con la rete"""
+    try:
+        sweep, selected, elapsed = run_storage_sweep(results, params)
+    except (ValueError, OSError) as e:
+        st.warning(f"Profilo di carico non valido: {e}")
+        return
+    row = sweep.iloc[selected]
+    no_battery = sweep.iloc[0]
+
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Accumulo a Batteria'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    display_card_group([
+        create_metric_card("Autoconsumo", format_value(row["self_consumption_pct"], "%", 1),
+                           f"Quota della produzione usata in azienda (senza batteria "
+                           f"{no_battery['self_consumption_pct']:.1f}%)"),
+        create_metric_card("Autosufficienza", format_value(row["self_sufficiency_pct"], "%", 1),
+                           f"Quota del carico coperta da PV e batteria (senza batteria "
+                           f"{no_battery['self_sufficiency_pct']:.1f}%)"),
+        create_metric_card("Immissione / Prelievo",
+                           f"{format_value(row['export_kwh'], 'kWh', 0)}<br>{format_value(row['import_kwh'], 'kWh', 0)}",
+                           f"Scambi con la rete con batteria da {row['capacity_kwh']:.0f} kWh / {row['power_kw']:.0f} kW"),
+        create_metric_card("Cicli equivalenti", format_value(row["cycles"], "", 0),
+                           "Energia scaricata / capacità utile nel periodo"),
+    ])
+
+    st.altair_chart(sweep_chart(sweep, row["capacity_kwh"]), use_container_width=True)
+    st.caption(f"Sweep di {len(sweep)} taglie calcolato in {elapsed * 1000:.0f} ms")
+    st.dataframe(pd.DataFrame({
+        "Capacità [kWh]": sweep["capacity_kwh"],
+        "Potenza [kW]": sweep["power_kw"],
+        "Autoconsumo [%]": sweep["self_consumption_pct"],
+        "Autosufficienza [%]": sweep["self_sufficiency_pct"],
+        "Immissione [kWh]": sweep["export_kwh"],
+        "Prelievo [kWh]": sweep["import_kwh"],
+        "Cicli": sweep["cycles"],
+    }).round(1), width="stretch", hide_index=True)
@@ -0,0 +1,257 @@
+"""
+Modulo Archivio - Scenari calcolati salvati su disco tra riavvii
+Indirizzamento per contenuto: la chiave è l'hash canonico degli input
+(lo stesso della cache in memoria). Un indice SQLite conserva parametri,
+scalari e data di ultimo utilizzo; le serie temporali stanno in un file
+Parquet per scenario. Oltre STORE_CONFIG["max_mb"] si eliminano per primi
+gli scenari senza nome usati meno di recente.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from config import STORE_CONFIG, TIMEZONE_OBJ
+from results import PVResults, AgriResults
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    hash TEXT PRIMARY KEY,
+    name TEXT,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    bytes INTEGER NOT NULL,
+    n_steps INTEGER NOT NULL,
+    energy_kwh REAL,
+    dli REAL,
+    params TEXT NOT NULL,
+    scalars TEXT NOT NULL
+)
+"""
+
+AGRI_PREFIX = "agri:"  # colonne Parquet delle serie agronomiche
+
+
+def _json_default(value):
+    """Scalari numpy -> tipi Python nativi, altri oggetti come stringa"""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_json_default, ensure_ascii=False)
+
+
+# ==================== ARCHIVIO ====================
+
+class ScenarioStore:
+    """
+    Archivio persistente degli scenari (indice SQLite + blob Parquet).
+    Ogni operazione apre una propria connessione: sicuro tra thread e tra
+    processi (worker del server) grazie al journal WAL.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(root, "index.sqlite")
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """Connessione con commit all'uscita (rollback in caso di errore) e chiusura"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def blob_path(self, key: str) -> str:
+        return os.path.join(self.root, "blobs", key[:2], f"{key}.parquet")
+
+    # --- scrittura ---
+
+    def put(self, key: str, params: dict, results: PVResults, name: str = None):
+        """
+        Salva uno scenario (se già presente aggiorna solo l'ultimo utilizzo)
+
+        Args:
+            key: hash canonico degli input
+            params: parametri che determinano i risultati (serializzabili in JSON)
+            results: risultati PV con agri_results collegati
+        """
+        if self.touch(key):
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        agri = results.agri_results
+        columns = {"time": pa.array(results.times)}
+        columns.update({name_: results.values(name_) for name_ in results.SERIES})
+        columns.update({AGRI_PREFIX + name_: agri.values(name_) for name_ in agri.SERIES})
+
+        path = self.blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(pa.table(columns), tmp)
+        os.replace(tmp, path)  # il blob è visibile solo se completo
+
+        scalars = {
+            "pv": {k: getattr(results, k) for k in results.SCALARS if k != "agri_results"},
+            "agri": {k: getattr(agri, k) for k in agri.SCALARS},
+        }
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO scenarios VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET accessed = excluded.accessed",
+                (key, name, now, now, os.path.getsize(path), len(results.times),
+                 results["energy_total_Wh"] / 1000, agri.DLI_mol_m2_day,
+                 _dumps(params), _dumps(scalars))
+            )
+        self.gc()
+
+    def touch(self, key: str) -> bool:
+        """Aggiorna l'ultimo utilizzo; False se lo scenario non è archiviato"""
+        with self._connect() as conn:
+            return conn.execute("UPDATE scenarios SET accessed = ? WHERE hash = ?",
+                                (time.time(), key)).rowcount > 0
+
+    def rename(self, key: str, name: str):
+        """Assegna un nome (gli scenari con nome vengono eliminati per ultimi)"""
+        with self._connect() as conn:
+            conn.execute("UPDATE scenarios SET name = ? WHERE hash = ?", (name or None, key))
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM scenarios WHERE hash = ?", (key,))
+        try:
+            os.remove(self.blob_path(key))
+        except FileNotFoundError:
+            pass
+
+    def gc(self, max_bytes: int = None) -> int:
+        """
+        Elimina scenari finché l'archivio non rientra nel limite: prima quelli
+        senza nome, poi in ordine di ultimo utilizzo. Restituisce quanti ne ha eliminati.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM scenarios").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            candidates = conn.execute(
+                "SELECT hash, bytes FROM scenarios ORDER BY name IS NOT NULL, accessed"
+            ).fetchall()
+
+        removed = 0
+        for key, nbytes in candidates:
+            if total <= max_bytes:
+                break
+            self.delete(key)
+            total -= nbytes
+            removed += 1
+        return removed
+
+    # --- lettura ---
+
+    def get(self, key: str):
+        """Risultati archiviati (PVResults con agri_results) o None se assenti"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT scalars FROM scenarios WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            table = pq.read_table(self.blob_path(key))
+            scalars = json.loads(row[0])
+            times = pd.DatetimeIndex(table.column("time").to_pandas()).rename(None)
+            block = np.stack([table.column(name).to_numpy() for name in PVResults.SERIES])
+            agri_block = np.stack([table.column(AGRI_PREFIX + name).to_numpy() for name in AgriResults.SERIES])
+            results = PVResults.from_block(times, block, **scalars["pv"])
+            results.agri_results = AgriResults.from_block(times, agri_block, **scalars["agri"])
+        except FileNotFoundError:
+            self.delete(key)  # indice senza blob (es. cartella ripulita a mano)
+            return None
+        except (KeyError, TypeError, ValueError, pa.ArrowException):
+            self.delete(key)  # blob illeggibile o con serie/scalari di un'altra versione
+            return None
+        self.touch(key)
+        return results
+
+    def load_params(self, key: str) -> dict:
+        """Parametri di uno scenario archiviato (data e fuso orario come oggetti)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT params FROM scenarios WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+
+        params = json.loads(row[0])
+        params["data"] = date.fromisoformat(params["data"])
+        tz = params.get("timezone")
+        params["timezone"] = TIMEZONE_OBJ if tz in (None, str(TIMEZONE_OBJ)) else ZoneInfo(tz)
+        return params
+
+    def list(self, limit: int = None) -> pd.DataFrame:
+        """Scenari archiviati, dal più recente (una riga per scenario)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT hash, name, created, accessed, bytes, n_steps, energy_kwh, dli, params "
+                "FROM scenarios ORDER BY accessed DESC LIMIT ?",
+                (limit if limit is not None else -1,)
+            ).fetchall()
+
+        records = []
+        for key, name, created, accessed, nbytes, n_steps, energy, dli, params in rows:
+            params = json.loads(params)
+            records.append({
+                "hash": key, "name": name,
+                "created": pd.Timestamp(created, unit="s"), "accessed": pd.Timestamp(accessed, unit="s"),
+                "bytes": nbytes, "n_steps": n_steps, "energy_kwh": energy, "dli": dli,
+                "lat": params.get("lat"), "lon": params.get("lon"),
+                "data": params.get("data"), "periodo": params.get("periodo", "Giorno"),
+            })
+        return pd.DataFrame(records, columns=[
+            "hash", "name", "created", "accessed", "bytes", "n_steps",
+            "energy_kwh", "dli", "lat", "lon", "data", "periodo",
+        ])
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, nbytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM scenarios"
+            ).fetchone()
+        return {"entries": entries, "bytes": nbytes, "max_bytes": self.max_bytes}
+
+
+# ==================== ISTANZA CONDIVISA ====================
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_scenario_store():
+    """Archivio del processo (None se disabilitato con APV_STORE=0)"""
+    global _store
+    if not STORE_CONFIG["enabled"]:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ScenarioStore(STORE_CONFIG["path"], int(STORE_CONFIG["max_mb"] * 1024 * 1024))
+        return _store
@@ -0,0 +1,216 @@
+"""
+Modulo Tile - Piramide XYZ di PNG per i risultati regionali sulla mappa
+Il raster del potenziale (regional.py) non viene mai inviato al browser:
+ogni tile 256×256 (Web Mercator) è campionato dal raster alla prima
+richiesta, salvato su disco e poi servito dalla cache. La cache è
+separata per versione del raster, quindi un nuovo calcolo non riusa
+tile vecchi.
+
+URL: /tiles/<livello>/<z>/<x>/<y>.png, livelli "energy" e "level".
+Servito da un piccolo server HTTP locale avviato dall'app
+(start_tile_server) e anche da server.py.
+"""
+
+import hashlib
+import io
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from config import REGIONAL_CONFIG, TILES_CONFIG
+from agri_calculations import SUITABILITY_LEVELS
+from regional import load_raster, NODATA_LEVEL
+
+TILE_SIZE = 256
+TILE_PATH = re.compile(r"^/tiles/(energy|level)/(\d+)/(\d+)/(\d+)\.png$")
+
+LEVEL_RGB = {"green": (46, 139, 87), "orange": (255, 165, 0), "darkorange": (255, 140, 0), "red": (200, 40, 40)}
+ENERGY_RAMP = (np.array([255, 237, 160]), np.array([189, 0, 38]))  # da basso ad alto
+
+
+# ==================== COLORI ====================
+
+def colorize(values: np.ndarray, layer: str, value_range: tuple = None) -> np.ndarray:
+    """
+    Pixel RGBA (uint8) di un livello: classi di idoneità con i colori di
+    SUITABILITY_LEVELS, energia su rampa lineare in value_range (trasparente fuori dati)
+    """
+    if layer == "level":
+        palette = np.zeros((256, 4), dtype=np.uint8)
+        for i, (_, _, color) in enumerate(SUITABILITY_LEVELS):
+            palette[i] = (*LEVEL_RGB[color], 255)
+        return palette[values]
+
+    lo, hi = value_range
+    valid = np.isfinite(values)
+    t = np.clip((np.nan_to_num(values) - lo) / max(hi - lo, 1e-9), 0, 1)[..., None]
+    low, high = ENERGY_RAMP
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = (low + (high - low) * t).astype(np.uint8)
+    rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, mode="RGBA").save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+# ==================== PIRAMIDE ====================
+
+def tile_lonlat(z: int, x: int, y: int) -> tuple:
+    """Lon/lat dei centri dei pixel di un tile XYZ (Web Mercator), array (256,) ciascuno"""
+    n = 2 ** z * TILE_SIZE
+    pixels = np.arange(TILE_SIZE) + 0.5
+    lon = (x * TILE_SIZE + pixels) / n * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y * TILE_SIZE + pixels) / n))))
+    return lon, lat
+
+
+class TileRenderer:
+    """Tile PNG del raster regionale, generati al primo accesso e conservati su disco"""
+
+    def __init__(self, raster_path: str, cache_dir: str):
+        self.raster_path = raster_path
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._raster = None
+        self._version = None
+
+    def _load(self):
+        """Raster e versione correnti (ricaricati se il file è cambiato); None se assente"""
+        try:
+            stat = os.stat(self.raster_path)
+        except FileNotFoundError:
+            return None, None
+        version = hashlib.sha256(f"{self.raster_path}:{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:16]
+        with self._lock:
+            if version != self._version:
+                raster = load_raster(self.raster_path)
+                energy = raster["energy_kwh_ha"]
+                raster["energy_range"] = (tuple(np.nanpercentile(energy, [2, 98]))
+                                          if np.isfinite(energy).any() else (0.0, 1.0))
+                self._raster, self._version = raster, version
+            return self._raster, self._version
+
+    @property
+    def version(self):
+        """Versione del raster corrente (None se non calcolato)"""
+        return self._load()[1]
+
+    def render(self, raster: dict, layer: str, z: int, x: int, y: int) -> bytes:
+        """Campionamento al vicino più prossimo del raster sui pixel del tile"""
+        lon, lat = tile_lonlat(z, x, y)
+        (south, west), (north, east) = raster["meta"]["bounds"]
+        shape = raster["level"].shape
+        rows = np.floor((north - lat) / (north - south) * shape[0]).astype(int)
+        cols = np.floor((lon - west) / (east - west) * shape[1]).astype(int)
+        inside = (rows[:, None] >= 0) & (rows[:, None] < shape[0]) & (cols >= 0) & (cols < shape[1])
+        rows, cols = np.clip(rows, 0, shape[0] - 1), np.clip(cols, 0, shape[1] - 1)
+
+        if layer == "level":
+            values = np.where(inside, raster["level"][rows[:, None], cols], NODATA_LEVEL)
+        else:
+            values = np.where(inside, raster["energy_kwh_ha"][rows[:, None], cols], np.nan)
+        return encode_png(colorize(values, layer, raster["energy_range"]))
+
+    def tile(self, layer: str, z: int, x: int, y: int):
+        """PNG del tile (dalla cache se già generato); None se il raster non esiste"""
+        raster, version = self._load()
+        if raster is None or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return None
+
+        path = os.path.join(self.cache_dir, version, layer, str(z), str(x), f"{y}.png")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        data = self.render(raster, layer, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)  # richieste concorrenti vedono solo tile completi
+        return data
+
+    def handle(self, url_path: str):
+        """(stato HTTP, PNG) per un percorso /tiles/...; None se il percorso non è un tile"""
+        match = TILE_PATH.match(url_path.split("?")[0])
+        if match is None:
+            return None
+        layer, z, x, y = match.group(1), *map(int, match.groups()[1:])
+        data = self.tile(layer, z, x, y)
+        return (200, data) if data is not None else (404, b"")
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_tile_renderer() -> TileRenderer:
+    """Renderer condiviso del raster regionale di REGIONAL_CONFIG"""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = TileRenderer(os.path.join(REGIONAL_CONFIG["path"], "potenziale.npz"), TILES_CONFIG["path"])
+        return _renderer
+
+
+# ==================== SERVER LOCALE ====================
+
+def send_tile(handler: BaseHTTPRequestHandler, status: int, data: bytes):
+    handler.send_response(status)
+    handler.send_header("Content-Type", "image/png")
+    handler.send_header("Content-Length", str(len(data)))
+    handler.send_header("Cache-Control", "public, max-age=3600")
+    handler.send_header("Access-Control-Allow-Origin", "*")
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    server_version = "APVTiles/1.0"
+
+    def do_GET(self):
+        response = get_tile_renderer().handle(self.path)
+        send_tile(self, *(response or (404, b"")))
+
+    def log_message(self, format, *args):
+        pass  # una richiesta per tile: niente log su stderr
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_tile_server() -> str:
+    """
+    Avvia (una volta per processo) il server dei tile in un thread in
+    background e restituisce l'URL base visto dal browser
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((TILES_CONFIG["host"], TILES_CONFIG["port"]), TileHandler)
+            except OSError:  # porta occupata (es. altra istanza dell'app): porta libera
+                _server = ThreadingHTTPServer((TILES_CONFIG["host"], 0), TileHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="tile-server", daemon=True).start()
+    if TILES_CONFIG["public_url"]:
+        return TILES_CONFIG["public_url"].rstrip("/")
+    return f"http://{TILES_CONFIG['host']}:{_server.server_port}"
+
+
+def tile_url(base_url: str, layer: str, version: str = None) -> str:
+    """Modello di URL XYZ per Leaflet (la versione evita tile vecchi nella cache del browser)"""
+    url = f"{base_url}/tiles/{layer}/{{z}}/{{x}}/{{y}}.png"
+    return f"{url}?v={version}" if version else url
@@ -0,0 +1,180 @@
+"""
+Modulo Inseguitore - Ricerca di strategie di rotazione agrivoltaiche
+Attorno al mezzogiorno solare l'inseguitore monoassiale può essere deviato
+dalla posizione ottimale verso il taglio, cedendo energia in cambio di luce
+per le colture. Tutte le strategie candidate (programmi orari di deviazione)
+sono valutate in un'unica operazione su array (strategie × tempo) riusando
+posizione solare, cielo sereno e rotazioni già calcolate dalla pipeline.
+"""
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import pvlib
+import streamlit as st
+
+from config import TRACKER_SEARCH, HECTARE_M2, COLORS
+from calculations import (
+    steering_schedule,
+    steer_rotation,
+    tracker_pitch,
+    calculate_tracker_shaded_fraction,
+    calculate_array_shaded_fraction,
+    calculate_cell_temperature,
+)
+from agri_calculations import (
+    calculate_shadow_projection,
+    calculate_shaded_fraction,
+    TRANSMISSION_COEFF,
+    PAR_FRACTION,
+)
+from results import time_step_hours
+
+
+# ==================== STRATEGIE CANDIDATE ====================
+
+def candidate_strategies(search: dict = TRACKER_SEARCH) -> pd.DataFrame:
+    """Strategie: riga 0 = solo backtracking, poi finestra × deviazione"""
+    rows = [{"window_h": 0.0, "fraction": 0.0}]
+    rows += [{"window_h": float(w), "fraction": float(f)}
+             for w in search["windows_h"] for f in search["fractions"]]
+    return pd.DataFrame(rows)
+
+
+# ==================== VALUTAZIONE VETTORIALE ====================
+
+def evaluate_strategies(params: dict, stages: dict, strategies: pd.DataFrame) -> pd.DataFrame:
+    """
+    Energia totale [Wh] e DLI medio giornaliero [mol/m²/d] di ogni strategia:
+    programmi orari (n_strategie, 24) -> rotazioni (n_strategie, n_tempi)
+    """
+    orientation, solpos, clearsky = stages["orientation"], stages["solpos"], stages["clearsky"]
+    elevation, sun_azimuth = solpos["elevation"].to_numpy(), solpos["azimuth"].to_numpy()
+    ghi = clearsky["ghi"].to_numpy()
+    step_hours = time_step_hours(stages["times"])
+    n_days = max(len(ghi) * step_hours / 24, 1.0)
+
+    schedules = steering_schedule(strategies["window_h"].to_numpy(), strategies["fraction"].to_numpy())
+    deviation = schedules[:, orientation["hour_index"].to_numpy()]
+    theta = steer_rotation(orientation["theta_track"].to_numpy(), orientation["theta_true"].to_numpy(),
+                           deviation, params["max_angle"])
+    surface = pvlib.tracking.calc_surface_orientation(theta, axis_tilt=0,
+                                                      axis_azimuth=params["azimuth_pannello"])
+
+    # Irradianza sul piano e ombreggiamento tra file
+    poa = pvlib.irradiance.get_total_irradiance(
+        surface["surface_tilt"], surface["surface_azimuth"],
+        solpos["zenith"].to_numpy(), sun_azimuth,
+        clearsky["dni"].to_numpy(), ghi, clearsky["dhi"].to_numpy(),
+        albedo=params["albedo"]
+    )
+    row_fraction = calculate_tracker_shaded_fraction(
+        solpos, theta, params["azimuth_pannello"], params["lato_minore"], tracker_pitch(params)
+    )
+    beam_factor = 1 - calculate_array_shaded_fraction(row_fraction, params["num_rows"])
+    poa_global = poa["poa_direct"] * beam_factor + poa["poa_diffuse"]
+
+    # Produzione
+    T_cell = calculate_cell_temperature(params, poa_global, stages["temperature"].to_numpy(), step_hours)
+    eff_corr = params["eff"] * (1 + params["temp_coeff"] * (T_cell - 25))
+    power_total = poa_global * params["area_pannello"] * eff_corr * (1 - params["losses"]) * params["num_panels_total"]
+    energy = power_total.sum(axis=1) * step_hours
+
+    # DLI
+    shadow = calculate_shadow_projection(
+        params["lato_maggiore"], params["lato_minore"], surface["surface_tilt"],
+        surface["surface_azimuth"], elevation, sun_azimuth, params["altezza_suolo"]
+    )
+    shaded_fraction = calculate_shaded_fraction(
+        shadow, params["num_panels_total"], params["hectares"] * HECTARE_M2, params["pitch_laterale"]
+    )
+    transmission = shaded_fraction * TRANSMISSION_COEFF["under_panel"] + (1 - shaded_fraction)
+    dli = PAR_FRACTION * 4.6 * 3600 * step_hours / 1e6 / n_days * (ghi * transmission).sum(axis=1)
+
+    return strategies.assign(energy_Wh=energy, DLI=dli)
+
+
+def pareto_front(evaluated: pd.DataFrame) -> pd.Series:
+    """Strategie non dominate (nessun'altra ha più energia e più DLI)"""
+    order = evaluated.sort_values(["energy_Wh", "DLI"], ascending=False)
+    best_dli = order["DLI"].cummax().shift(fill_value=-np.inf)
+    return (order["DLI"] > best_dli).reindex(evaluated.index)
+
+
+def recommend_strategy(evaluated: pd.DataFrame, dli_target: float) -> pd.Series:
+    """Massima energia con DLI ≥ obiettivo (se nessuna lo raggiunge: massimo DLI)"""
+    feasible = evaluated[evaluated["DLI"] >= dli_target]
+    if feasible.empty:
+        return evaluated.loc[evaluated["DLI"].idxmax()]
+    return feasible.loc[feasible["energy_Wh"].idxmax()]
+
+
+def run_strategy_search(params: dict, stages: dict) -> pd.DataFrame:
+    """Ricerca completa: valutazione batch, fronte di Pareto e variazioni rispetto al backtracking"""
+    evaluated = evaluate_strategies(params, stages, candidate_strategies())
+    base = evaluated.iloc[0]
+    return evaluated.assign(
+        pareto=pareto_front(evaluated),
+        energy_delta_pct=(evaluated["energy_Wh"] / base["energy_Wh"] - 1) * 100 if base["energy_Wh"] else np.nan,
+        dli_delta_pct=(evaluated["DLI"] / base["DLI"] - 1) * 100 if base["DLI"] else np.nan,
+    )
+
+
+# ==================== VISUALIZZAZIONE ====================
+
+def strategy_chart(evaluated: pd.DataFrame, dli_target: float) -> alt.Chart:
+    """Energia contro DLI per ogni strategia, fronte di Pareto evidenziato"""
+    data = evaluated.assign(
+        energia_kwh=evaluated["energy_Wh"] / 1000,
+        fronte=np.where(evaluated["pareto"], "Fronte di Pareto", "Dominata"),
+        deviazione_pct=evaluated["fraction"] * 100,
+    )
+    points = alt.Chart(data).mark_circle(size=80).encode(
+        x=alt.X("DLI:Q", title="DLI [mol/m²·d]", scale=alt.Scale(zero=False)),
+        y=alt.Y("energia_kwh:Q", title="Energia [kWh]", scale=alt.Scale(zero=False)),
+        color=alt.Color("fronte:N", title=None, scale=alt.Scale(
+            domain=["Fronte di Pareto", "Dominata"], range=[COLORS["primary"], COLORS["info"]])),
+        tooltip=[
+            alt.Tooltip("window_h:Q", title="Finestra [h]"),
+            alt.Tooltip("deviazione_pct:Q", title="Deviazione [%]"),
+            alt.Tooltip("energia_kwh:Q", title="Energia [kWh]", format=".1f"),
+            alt.Tooltip("DLI:Q", format=".2f"),
+        ],
+    )
+    target = alt.Chart(pd.DataFrame({"DLI": [dli_target]})).mark_rule(
+        color=COLORS["warning"], strokeDash=[4, 4]).encode(x="DLI:Q")
+    return points + target
+
+
+def display_tracker_section(params: dict, stages: dict):
+    """Sezione inseguitore: strategie energia/DLI e strategia consigliata per la coltura"""
+    if stages.get("orientation") is None:
+        return
+
+    evaluated = run_strategy_search(params, stages)
+    dli_target = stages["crop"]["DLI_min"]
+    best = recommend_strategy(evaluated, dli_target)
+
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Strategie Inseguitore'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    st.altair_chart(strategy_chart(evaluated, dli_target), use_container_width=True)
+    st.caption(
+        f"Strategia consigliata (DLI minimo {params.get('crops', 'Cereali')}: {dli_target} mol/m²·d): "
+        f"deviazione {best['fraction'] * 100:.0f}% per {best['window_h']:.0f} h attorno al mezzogiorno solare "
+        f"({best['energy_delta_pct']:+.1f}% energia, {best['dli_delta_pct']:+.1f}% DLI rispetto al backtracking)"
+    )
+
+    front = evaluated[evaluated["pareto"]].sort_values("DLI")
+    st.dataframe(pd.DataFrame({
+        "Finestra [h]": front["window_h"],
+        "Deviazione [%]": front["fraction"] * 100,
+        "Energia [kWh]": front["energy_Wh"] / 1000,
+        "Δ Energia [%]": front["energy_delta_pct"],
+        "DLI [mol/m²·d]": front["DLI"],
+        "Δ DLI [%]": front["dli_delta_pct"],
+    }).round(2), width="stretch", hide_index=True)
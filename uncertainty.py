@@ -0,0 +1,225 @@
+"""
+Modulo Incertezza - Analisi Monte Carlo vettoriale di produzione e DLI
+I parametri incerti vengono campionati tutti insieme (seed riproducibile)
+e valutati come un'unica operazione su array (campioni × tempo) a partire
+dalle serie solari/POA già calcolate dalla pipeline (in float32, a
+blocchi di campioni dimensionati su un budget di memoria).
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import MONTE_CARLO_CONFIG, UNCERTAINTY_DISTRIBUTIONS
+from calculations import calculate_array_shaded_fraction, calculate_cell_temperature
+from agri_calculations import TRANSMISSION_COEFF, PAR_FRACTION
+from results import time_step_hours
+from pipeline import scenario_key
+from metrics import create_metric_card, display_card_group, format_value
+
+
+# ==================== CAMPIONAMENTO ====================
+
+def sample_parameters(nominal: dict, n: int, seed: int,
+                      distributions: dict = UNCERTAINTY_DISTRIBUTIONS) -> dict:
+    """
+    Campiona n valori per ogni parametro incerto attorno al valore nominale
+
+    Distribuzioni (scostamenti assoluti rispetto al nominale):
+        normal: sd | uniform: half_width | triangular: low, high (moda = nominale)
+    """
+    rng = np.random.default_rng(seed)
+    samples = {}
+
+    for name, spec in distributions.items():
+        center = nominal[name]
+        if spec["dist"] == "normal":
+            values = rng.normal(center, spec["sd"], n)
+        elif spec["dist"] == "uniform":
+            values = rng.uniform(center - spec["half_width"], center + spec["half_width"], n)
+        elif spec["dist"] == "triangular":
+            values = rng.triangular(center + spec["low"], center, center + spec["high"], n)
+        else:
+            raise ValueError(f"Distribuzione non supportata: '{spec['dist']}'")
+
+        low, high = spec.get("clip", (-np.inf, np.inf))
+        samples[name] = np.clip(values, low, high)
+
+    return samples
+
+
+# ==================== VALUTAZIONE VETTORIALE ====================
+
+def shared_series(params: dict, stages: dict) -> dict:
+    """
+    Serie condivise da tutti i campioni (dagli output delle fasi della pipeline),
+    in float32. La componente riflessa dal suolo è lineare nell'albedo: si
+    conserva quella ad albedo unitario, con il tilt della superficie per
+    istante se c'è un inseguitore (tilt_pannello vale 0 in quel caso).
+    """
+    poa, _ = stages["poa"]
+    _, shaded_fraction = stages["shadow"]
+    ghi = stages["clearsky"]["ghi"].to_numpy()
+    step_hours = time_step_hours(stages["times"])
+
+    orientation = stages.get("orientation")
+    tilt = orientation["surface_tilt"].to_numpy() if orientation is not None else params["tilt_pannello"]
+
+    beam_factor = 1 - calculate_array_shaded_fraction(
+        stages["row_shading"].to_numpy(), params["num_rows"]
+    )
+
+    return {
+        "poa_direct": (poa["poa_direct"].to_numpy() * beam_factor
+                       + poa["poa_sky_diffuse"].to_numpy()).astype(np.float32),
+        "poa_ground_unit": (ghi * 0.5 * (1 - np.cos(np.radians(tilt)))).astype(np.float32),
+        "T_amb": stages["temperature"].to_numpy().astype(np.float32),
+        "ghi": ghi,
+        "shaded_fraction": shaded_fraction.to_numpy(),
+        "step_hours": step_hours,
+        "n_days": max(len(ghi) * step_hours / 24, 1.0),
+    }
+
+
+def evaluate_samples(params: dict, series: dict, samples: dict) -> dict:
+    """
+    Energia totale [Wh] e DLI medio giornaliero [mol/m²/d] per ogni campione,
+    con broadcasting (n_campioni, 1) × (n_tempi,). Le matrici sono float32 e
+    aggiornate sul posto (due sole matrici vive per blocco); somme in float64.
+    """
+    step_hours = series["step_hours"]
+    col = {name: values.astype(np.float32)[:, None] for name, values in samples.items()}
+
+    poa = col["albedo"] * series["poa_ground_unit"]
+    poa += series["poa_direct"]
+    T_cell = calculate_cell_temperature(params, poa, series["T_amb"], step_hours)
+
+    # eff·(1 + γ·(T_cell − 25)), sul posto
+    T_cell -= 25
+    T_cell *= col["temp_coeff"]
+    T_cell += 1
+    T_cell *= col["eff"]
+    poa *= T_cell
+
+    # Fattori costanti nel tempo fuori dalla somma
+    energy = (poa.sum(axis=1, dtype=np.float64) * step_hours * params["area_pannello"]
+              * (1 - samples["losses"]) * params["num_panels_total"])
+
+    # DLI lineare nella trasmissione sotto pannello: DLI = A + t·B
+    k = PAR_FRACTION * 4.6 * 3600 * step_hours / 1e6 / series["n_days"]
+    sf = series["shaded_fraction"]
+    dli_free = k * np.sum(series["ghi"] * (1 - sf))
+    dli_shaded = k * np.sum(series["ghi"] * sf)
+    dli = dli_free + samples["transmission_under"] * dli_shaded
+
+    return {"energy_Wh": energy, "DLI": dli}
+
+
+def chunk_size(n_steps: int, chunk_bytes: int = MONTE_CARLO_CONFIG["chunk_bytes"]) -> int:
+    """Campioni per blocco tali che una matrice campioni × tempi (float32) stia nel budget"""
+    return max(1, chunk_bytes // (4 * max(n_steps, 1)))
+
+
+def run_monte_carlo(params: dict, stages: dict, n: int = None, seed: int = None,
+                    chunk: int = None) -> dict:
+    """
+    Analisi Monte Carlo completa: campionamento + valutazione a blocchi di
+    campioni (memoria limitata da MONTE_CARLO_CONFIG["chunk_bytes"] anche
+    su serie annuali, se chunk non è indicato)
+    """
+    n = n or MONTE_CARLO_CONFIG["samples"]
+    seed = MONTE_CARLO_CONFIG["seed"] if seed is None else seed
+
+    nominal = {
+        "eff": params["eff"],
+        "losses": params["losses"],
+        "temp_coeff": params["temp_coeff"],
+        "albedo": params["albedo"],
+        "transmission_under": TRANSMISSION_COEFF["under_panel"],
+    }
+    samples = sample_parameters(nominal, n, seed)
+    series = shared_series(params, stages)
+    chunk = chunk or chunk_size(len(series["ghi"]))
+
+    # Controllo di coerenza: il campione nominale deve riprodurre l'energia della pipeline
+    nominal_energy = evaluate_samples(params, series, {k: np.atleast_1d(v) for k, v in nominal.items()})["energy_Wh"][0]
+    pipeline_energy = stages["production"]["power_total_W"].to_numpy().sum() * series["step_hours"]
+
+    energy, dli = np.empty(n), np.empty(n)
+    for start in range(0, n, chunk):
+        block = {name: values[start:start + chunk] for name, values in samples.items()}
+        out = evaluate_samples(params, series, block)
+        energy[start:start + chunk] = out["energy_Wh"]
+        dli[start:start + chunk] = out["DLI"]
+
+    return {
+        "samples": samples,
+        "energy_Wh": energy,
+        "DLI": dli,
+        "percentiles": exceedance_table(energy, dli),
+        "nominal_Wh": float(nominal_energy),
+        "pipeline_Wh": float(pipeline_energy),
+    }
+
+
+@st.cache_data(show_spinner="Analisi Monte Carlo...", max_entries=8)
+def _cached_monte_carlo(key: str, n: int, seed: int, _params: dict, _stages: dict) -> dict:
+    """Monte Carlo in cache per scenario (scenario_key) e impostazioni: non si ripete a ogni rerun"""
+    return run_monte_carlo(_params, _stages, n, seed)
+
+
+def exceedance_table(energy: np.ndarray, dli: np.ndarray,
+                     levels: tuple = MONTE_CARLO_CONFIG["levels"]) -> pd.DataFrame:
+    """
+    Valori Pxx di superamento: P90 = valore superato nel 90% dei campioni
+    (cioè il 10° percentile)
+    """
+    return pd.DataFrame({
+        "Energia [kWh]": [np.percentile(energy, 100 - p) / 1000 for p in levels],
+        "DLI [mol/m²·d]": [np.percentile(dli, 100 - p) for p in levels],
+    }, index=[f"P{p}" for p in levels])
+
+
+# ==================== VISUALIZZAZIONE ====================
+
+def display_uncertainty_section(params: dict, stages: dict):
+    """Sezione risultati Monte Carlo: card P50/P90 e tabella bande"""
+    if not params.get("monte_carlo"):
+        return
+
+    mc = _cached_monte_carlo(scenario_key(params), params.get("mc_samples"), params.get("mc_seed"),
+                             params, stages)
+    table = mc["percentiles"]
+    mismatch = abs(mc["nominal_Wh"] / max(mc["pipeline_Wh"], 1e-9) - 1)
+    if mismatch > MONTE_CARLO_CONFIG["nominal_tolerance"]:
+        st.warning(f"Il campione nominale si discosta del {mismatch * 100:.2f}% dall'energia "
+                   f"della simulazione: bande di incertezza non affidabili")
+
+    st.markdown(
+        '<p class="section-header" style="margin-top: 1rem;">'
+        'Analisi di Incertezza (Monte Carlo)'
+        '</p>',
+        unsafe_allow_html=True
+    )
+
+    display_card_group([
+        create_metric_card(
+            "Energia P50 / P90",
+            f"{format_value(table.loc['P50', 'Energia [kWh]'], 'kWh', 1)}<br>"
+            f"{format_value(table.loc['P90', 'Energia [kWh]'], 'kWh', 1)}",
+            f"Produzione totale superata nel 50% / 90% di {len(mc['energy_Wh'])} campioni"
+        ),
+        create_metric_card(
+            "DLI P50 / P90",
+            f"{format_value(table.loc['P50', 'DLI [mol/m²·d]'], 'mol/m²·day', 1)}<br>"
+            f"{format_value(table.loc['P90', 'DLI [mol/m²·d]'], 'mol/m²·day', 1)}",
+            "DLI superato nel 50% / 90% dei campioni"
+        ),
+        create_metric_card(
+            "Dispersione Energia",
+            f"{format_value(np.std(mc['energy_Wh']) / max(np.mean(mc['energy_Wh']), 1) * 100, '%', 1)}",
+            "Coefficiente di variazione della produzione totale"
+        ),
+    ])
+
+    st.dataframe(table.round(2), width="stretch")